@@ -1,13 +1,37 @@
-import threading
+import os
+import sys
+
 from django.apps import AppConfig
 
+
+def serving() -> bool:
+    """
+    Whether this process serves requests: `manage.py runserver` (its reloaded
+    child) or a standalone ASGI server. Other manage.py commands (migrate,
+    ingest_worker, ...) are not, so they skip the warm-up. Under gunicorn the
+    hooks in gunicorn.conf.py do the startup instead, since the app is loaded
+    in the master.
+    """
+    prog = os.path.basename(sys.argv[0]) if sys.argv else ""
+    if prog in ("uvicorn", "daphne", "hypercorn"):
+        return True
+    return sys.argv[1:2] == ["runserver"] and (os.environ.get("RUN_MAIN") == "true" or "--noreload" in sys.argv)
+
+
 class ChatbotConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "chatbot"
 
     def ready(self):
-        def preload():
-            from .utils.embedder import get_index
-            get_index()
-            print(" FAISS index preloaded in background.")
-        threading.Thread(target=preload, daemon=True).start()
+        from . import signals  # noqa: F401  (index upkeep on document save/delete)
+
+        if not serving():
+            return
+
+        # Embedding model + vector index (+ local generator if enabled); see utils/warmup.py
+        from .utils import warmup
+        warmup.start()
+
+        # Pick up documents left pending or half-processed by a previous process
+        from .tasks import start_worker
+        start_worker()
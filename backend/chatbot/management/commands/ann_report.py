@@ -0,0 +1,116 @@
+from django.core.management.base import BaseCommand, CommandError
+from chatbot.utils import ann_index
+from chatbot.utils.embedding_store import get_store
+import faiss
+import json
+import time
+import numpy as np
+
+class Command(BaseCommand):
+    help = (
+        "Compare recall, latency and bytes per vector of each ANN index type and vector storage "
+        "(float32 / float16 / int8 / PQ) against exact float32 search on the current corpus"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--queries", type=int, default=200, help="Corpus vectors held out as queries")
+        parser.add_argument("--k", type=int, default=10, help="Neighbours per query for recall@k")
+        parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 8, 16, 32])
+        parser.add_argument("--ef-search", type=int, nargs="+", default=[16, 32, 64, 128])
+        parser.add_argument("--index", nargs="+", choices=ann_index.INDEX_TYPES, default=list(ann_index.INDEX_TYPES))
+        parser.add_argument("--storage", nargs="+", choices=ann_index.STORAGE_TYPES, default=list(ann_index.STORAGE_TYPES))
+        parser.add_argument("--json", action="store_true", help="Print results as JSON")
+
+    def _time_search(self, search, queries, k):
+        latencies = []
+        found = []
+        for q in queries:
+            t0 = time.perf_counter()
+            _, I = search(q[None, :], k)
+            latencies.append((time.perf_counter() - t0) * 1000)
+            found.append(I[0])
+        return np.array(found), np.array(latencies)
+
+    def handle(self, *args, **options):
+        snap = get_store().snapshot()
+        if snap is None:
+            raise CommandError("Vector store is empty; run build_index first")
+
+        vectors = np.ascontiguousarray(snap.vectors, dtype="float32")
+        total, dim = vectors.shape
+        if total < 2:
+            raise CommandError("Need at least two vectors to hold out queries")
+        # Queries are held out of the indexed corpus; otherwise each one finds
+        # itself at distance 0 and recall@k is inflated
+        rows = np.random.default_rng(0).choice(total, min(options["queries"], total // 2), replace=False)
+        queries = vectors[rows]
+        vectors = np.delete(vectors, rows, axis=0)
+        n = vectors.shape[0]
+        k = min(options["k"], n)
+        metric = ann_index.faiss_metric(snap.metric)
+        print(f"Corpus: {n} vectors, dim={dim}, metric={snap.metric}, {len(rows)} held-out queries, k={k}")
+
+        # Ground truth from exact search over the uncompressed matrix
+        truth, flat_lat = self._time_search(lambda q, kk: faiss.knn(q, vectors, kk, metric=metric), queries, k)
+        results = [{
+            "index": "flat", "storage": "float32", "param": None, "recall": 1.0,
+            "p50_ms": float(np.percentile(flat_lat, 50)), "p95_ms": float(np.percentile(flat_lat, 95)),
+            "build_s": 0.0, "bytes_per_vector": float(vectors.itemsize * dim),
+        }]
+
+        # ivf_pq always stores PQ codes; every other type runs once per storage
+        combos = [
+            (kind, storage)
+            for kind in options["index"]
+            for storage in (["pq"] if kind == "ivf_pq" else options["storage"])
+            if ann_index.enabled(kind, storage)
+        ]
+
+        for kind, storage in combos:
+            t0 = time.perf_counter()
+            try:
+                # min_vectors=0: report on small corpora too
+                index = ann_index.build(vectors, kind, storage, snap.metric, min_vectors=0)
+            except Exception as e:
+                print(f"Skipping {kind}/{storage}: {e}")
+                continue
+            if index is None:
+                print(f"Skipping {kind}/{storage}: corpus too small to train")
+                continue
+            build_s = time.perf_counter() - t0
+            bytes_per_vector = len(faiss.serialize_index(index)) / n
+
+            if kind == "hnsw":
+                sweep = [("efSearch", v) for v in options["ef_search"]]
+            elif kind == "flat":
+                sweep = [(None, None)]
+            else:
+                sweep = [("nprobe", v) for v in options["nprobe"]]
+
+            for name, value in sweep:
+                if name == "nprobe":
+                    ann_index.set_search_params(index, nprobe=value)
+                elif name == "efSearch":
+                    ann_index.set_search_params(index, ef_search=value)
+                found, lat = self._time_search(index.search, queries, k)
+                hits = sum(len(set(f) & set(t)) for f, t in zip(found, truth))
+                results.append({
+                    "index": kind, "storage": storage, "param": f"{name}={value}" if name else None,
+                    "recall": hits / float(truth.size),
+                    "p50_ms": float(np.percentile(lat, 50)), "p95_ms": float(np.percentile(lat, 95)),
+                    "build_s": build_s, "bytes_per_vector": bytes_per_vector,
+                })
+
+        if options["json"]:
+            print(json.dumps(results, indent=2))
+            return
+
+        print(
+            f"{'index':<10} {'storage':<8} {'param':<14} {'recall@' + str(k):>10} {'p50 ms':>9} {'p95 ms':>9} "
+            f"{'build s':>9} {'bytes/vec':>10}"
+        )
+        for r in results:
+            print(
+                f"{r['index']:<10} {r['storage']:<8} {r['param'] or '-':<14} {r['recall']:>10.3f} "
+                f"{r['p50_ms']:>9.3f} {r['p95_ms']:>9.3f} {r['build_s']:>9.2f} {r['bytes_per_vector']:>10.1f}"
+            )
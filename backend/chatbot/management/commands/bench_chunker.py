@@ -0,0 +1,78 @@
+from django.core.management.base import BaseCommand
+from chatbot.utils.text_chunker import iter_chunks, model_token_counter, approx_token_counts, chunk_token_limit, CHUNK_OVERLAP_TOKENS
+from chatbot.utils.model_registry import rss_bytes
+import json
+import random
+import time
+
+MB = 1024 * 1024
+
+
+def _synthetic(total_bytes, seed=0):
+    """Paragraphs of sentences of varying length, generated as they are consumed."""
+    rng = random.Random(seed)
+    produced, n = 0, 0
+    while produced < total_bytes:
+        sentences = []
+        for _ in range(rng.randint(1, 8)):
+            # Mostly normal sentences, occasionally a run-on far above the chunk size
+            length = rng.randint(4, 40) if rng.random() > 0.02 else rng.randint(300, 800)
+            sentences.append(" ".join(f"w{n + i}" for i in range(length)) + ".")
+            n += length
+        paragraph = " ".join(sentences) + "\n\n"
+        produced += len(paragraph)
+        yield paragraph
+
+
+class Command(BaseCommand):
+    help = "Measure chunker throughput and memory on a synthetic stream or a text file"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--mb", type=float, default=50.0, help="Synthetic input size")
+        parser.add_argument("--file", help="Chunk this text file instead")
+        parser.add_argument("--chunk-tokens", type=int, help="Default: CHUNK_TOKENS capped to the model input")
+        parser.add_argument("--overlap-tokens", type=int, default=CHUNK_OVERLAP_TOKENS)
+        parser.add_argument("--approx", action="store_true", help="Count tokens without the model tokenizer")
+        parser.add_argument("--json", action="store_true", help="Print results as JSON")
+
+    def handle(self, *args, **options):
+        count = approx_token_counts if options["approx"] else model_token_counter()
+        size, overlap = options["chunk_tokens"] or chunk_token_limit(), options["overlap_tokens"]
+
+        if options["file"]:
+            source = open(options["file"], "r", encoding="utf-8", errors="ignore")
+        else:
+            source = _synthetic(int(options["mb"] * MB))
+
+        rss_start = rss_bytes()
+        peak_rss = rss_start
+        chunks = 0
+        in_bytes = 0
+
+        t0 = time.perf_counter()
+        for chunk in iter_chunks(source, size, overlap, count):
+            chunks += 1
+            if chunks % 1000 == 0:
+                peak_rss = max(peak_rss, rss_bytes())
+            if options["file"]:
+                in_bytes += len(chunk)
+        elapsed = time.perf_counter() - t0
+
+        if options["file"]:
+            source.close()
+        else:
+            in_bytes = int(options["mb"] * MB)
+
+        results = {
+            "input_mb": in_bytes / MB,
+            "seconds": elapsed,
+            "mb_per_s": in_bytes / MB / elapsed if elapsed else 0.0,
+            "chunks": chunks,
+            "chunks_per_s": chunks / elapsed if elapsed else 0.0,
+            "rss_growth_mb": (max(peak_rss, rss_bytes()) - rss_start) / MB,
+        }
+        if options["json"]:
+            print(json.dumps(results, indent=2))
+        else:
+            for key, value in results.items():
+                print(f"{key:<24} {value:.3f}" if isinstance(value, float) else f"{key:<24} {value}")
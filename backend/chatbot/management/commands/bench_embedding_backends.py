@@ -0,0 +1,155 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from chatbot.utils.embedding_store import get_model, get_store, ENCODE_BATCH_SIZE
+from chatbot.utils.model_registry import rss_bytes
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+
+MB = 1024 * 1024
+
+SYNTHETIC = [
+    "Our agency builds marketing websites, e-commerce stores and custom web applications.",
+    "Pricing starts with a fixed-scope discovery phase followed by a project estimate.",
+    "Support plans include uptime monitoring, security patches and monthly reports.",
+    "We use Django and React for most client projects and deploy to managed cloud hosting.",
+    "Search engine optimisation covers technical audits, content strategy and link building.",
+    "Projects are delivered in two-week sprints with a demo at the end of each sprint.",
+]
+
+
+def _unit(m):
+    return m / np.clip(np.linalg.norm(m, axis=1, keepdims=True), 1e-12, None)
+
+
+def _top_k(queries, corpus, k):
+    return np.argsort(-(_unit(queries) @ _unit(corpus).T), axis=1)[:, :k]
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the torch and ONNX int8 embedding backends: cold load, throughput, RSS, "
+        "embedding agreement and retrieval quality. Each backend runs in its own process."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--texts", type=int, default=2000, help="Corpus size (stored chunks, else synthetic)")
+        parser.add_argument("--queries", type=int, default=200)
+        parser.add_argument("--top-k", type=int, default=5)
+        parser.add_argument("--min-cosine", type=float, default=0.98, help="Minimum per-text cosine torch vs onnx")
+        parser.add_argument("--min-overlap", type=float, default=0.9, help="Minimum mean top-k overlap")
+        parser.add_argument("--json", action="store_true", help="Print results as JSON")
+        # Internal: run one backend and write its results
+        parser.add_argument("--worker", choices=["torch", "onnx"], help="(internal)")
+        parser.add_argument("--input", help="(internal)")
+        parser.add_argument("--output", help="(internal)")
+
+    # -- child process --------------------------------------------------------
+
+    def _run_worker(self, options):
+        with open(options["input"], "r", encoding="utf-8") as f:
+            payload = json.load(f)
+
+        rss_start = rss_bytes()
+        t0 = time.perf_counter()
+        model = get_model()
+        if model is None:
+            raise CommandError("Embedding model unavailable")
+        model.encode(["warm up"], show_progress_bar=False, convert_to_numpy=True)
+        load_seconds = time.perf_counter() - t0
+        rss_loaded = rss_bytes()
+
+        t0 = time.perf_counter()
+        corpus = model.encode(payload["corpus"], batch_size=ENCODE_BATCH_SIZE, show_progress_bar=False, convert_to_numpy=True)
+        encode_seconds = time.perf_counter() - t0
+        queries = model.encode(payload["queries"], batch_size=ENCODE_BATCH_SIZE, show_progress_bar=False, convert_to_numpy=True)
+
+        np.savez(options["output"], corpus=corpus.astype("float32"), queries=queries.astype("float32"))
+        print(json.dumps({
+            "cold_load_s": load_seconds,
+            "texts_per_s": len(payload["corpus"]) / encode_seconds if encode_seconds else 0.0,
+            "model_rss_mb": (rss_loaded - rss_start) / MB,
+            "peak_rss_mb": rss_bytes() / MB,
+        }))
+
+    # -- parent ---------------------------------------------------------------
+
+    def _spawn(self, backend, input_path, workdir):
+        output = os.path.join(workdir, f"{backend}.npz")
+        env = dict(os.environ, EMBEDDING_BACKEND=backend, QUERY_BATCHING_ENABLED="false")
+        proc = subprocess.run(
+            [sys.executable, os.path.join(settings.BASE_DIR, "manage.py"), "bench_embedding_backends",
+             "--worker", backend, "--input", input_path, "--output", output],
+            env=env, capture_output=True, text=True,
+        )
+        if proc.returncode != 0:
+            raise CommandError(f"{backend} run failed:\n{proc.stderr.strip()}")
+        stats = json.loads(proc.stdout.strip().splitlines()[-1])
+        with np.load(output) as data:
+            return stats, data["corpus"], data["queries"]
+
+    def handle(self, *args, **options):
+        if options["worker"]:
+            return self._run_worker(options)
+
+        corpus = [d["text"] for d in get_store().chunks.head(options["texts"])]
+        if not corpus:
+            corpus = [f"{SYNTHETIC[i % len(SYNTHETIC)]} (variant {i})" for i in range(options["texts"])]
+        # A query is the opening words of a chunk; that chunk is the expected hit
+        rng = np.random.default_rng(0)
+        query_ids = rng.choice(len(corpus), size=min(options["queries"], len(corpus)), replace=False)
+        queries = [" ".join(corpus[i].split()[:12]) for i in query_ids]
+
+        k = options["top_k"]
+        with tempfile.TemporaryDirectory() as workdir:
+            input_path = os.path.join(workdir, "texts.json")
+            with open(input_path, "w", encoding="utf-8") as f:
+                json.dump({"corpus": corpus, "queries": queries}, f)
+            runs = {b: self._spawn(b, input_path, workdir) for b in ("torch", "onnx")}
+
+        (_, t_corpus, t_queries), (_, o_corpus, o_queries) = runs["torch"], runs["onnx"]
+        cosine = np.sum(_unit(t_corpus) * _unit(o_corpus), axis=1)
+        t_top, o_top = _top_k(t_queries, t_corpus, k), _top_k(o_queries, o_corpus, k)
+        overlap = float(np.mean([len(set(a) & set(b)) / k for a, b in zip(t_top, o_top)]))
+        hit_rate = {
+            "torch": float(np.mean([qid in row for qid, row in zip(query_ids, t_top)])),
+            "onnx": float(np.mean([qid in row for qid, row in zip(query_ids, o_top)])),
+        }
+
+        results = {
+            "texts": len(corpus),
+            "queries": len(queries),
+            "backends": {b: {**runs[b][0], f"hit_rate@{k}": hit_rate[b]} for b in runs},
+            "cosine_mean": float(cosine.mean()),
+            "cosine_min": float(cosine.min()),
+            f"overlap@{k}": overlap,
+        }
+        failures = []
+        if results["cosine_min"] < options["min_cosine"]:
+            failures.append(f"min cosine {results['cosine_min']:.4f} < {options['min_cosine']}")
+        if overlap < options["min_overlap"]:
+            failures.append(f"top-{k} overlap {overlap:.3f} < {options['min_overlap']}")
+        if hit_rate["onnx"] < hit_rate["torch"] - 0.02:
+            failures.append(f"hit rate dropped {hit_rate['torch']:.3f} -> {hit_rate['onnx']:.3f}")
+        results["passed"] = not failures
+
+        if options["json"]:
+            print(json.dumps(results, indent=2))
+        else:
+            print(f"texts={len(corpus)} queries={len(queries)} k={k}")
+            print(f"{'backend':<8} {'cold load s':>11} {'texts/s':>9} {'model MiB':>10} {'peak MiB':>9} {'hit@k':>7}")
+            for b, r in results["backends"].items():
+                print(
+                    f"{b:<8} {r['cold_load_s']:>11.2f} {r['texts_per_s']:>9.1f} {r['model_rss_mb']:>10.1f} "
+                    f"{r['peak_rss_mb']:>9.1f} {r[f'hit_rate@{k}']:>7.3f}"
+                )
+            print(f"cosine torch vs onnx: mean={results['cosine_mean']:.4f} min={results['cosine_min']:.4f}")
+            print(f"top-{k} overlap: {overlap:.3f}")
+        if failures:
+            raise CommandError("Retrieval-quality check failed: " + "; ".join(failures))
+        if not options["json"]:
+            print("✓ Retrieval-quality check passed")
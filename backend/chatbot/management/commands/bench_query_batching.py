@@ -0,0 +1,76 @@
+from django.core.management.base import BaseCommand, CommandError
+from chatbot.utils.embedding_store import get_model
+from chatbot.utils.query_batcher import QueryBatcher, QUERY_BATCH_WINDOW_MS
+import json
+import threading
+import time
+import numpy as np
+
+class Command(BaseCommand):
+    help = "Measure query-embedding QPS and latency with micro-batching at max batch sizes 1-64"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32, 64])
+        parser.add_argument("--clients", type=int, default=64, help="Concurrent callers")
+        parser.add_argument("--duration", type=float, default=10.0, help="Seconds per batch size")
+        parser.add_argument("--window-ms", type=float, default=QUERY_BATCH_WINDOW_MS)
+        parser.add_argument("--json", action="store_true", help="Print results as JSON")
+
+    def _drive(self, encode, clients, duration):
+        latencies = [[] for _ in range(clients)]
+        stop_at = time.perf_counter() + duration
+
+        def client(n):
+            i = 0
+            while time.perf_counter() < stop_at:
+                t0 = time.perf_counter()
+                encode(f"client {n} question {i}: what does the agency charge for a website?")
+                latencies[n].append(time.perf_counter() - t0)
+                i += 1
+
+        threads = [threading.Thread(target=client, args=(n,)) for n in range(clients)]
+        started = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - started
+
+        lat = np.array([x for per in latencies for x in per]) * 1000
+        return {
+            "qps": lat.size / elapsed if elapsed else 0.0,
+            "p50_ms": float(np.percentile(lat, 50)),
+            "p95_ms": float(np.percentile(lat, 95)),
+            "p99_ms": float(np.percentile(lat, 99)),
+        }
+
+    def handle(self, *args, **options):
+        model = get_model()
+        if model is None:
+            raise CommandError("Embedding model unavailable")
+
+        def encode_batch(texts):
+            return model.encode(texts, show_progress_bar=False, convert_to_numpy=True).astype("float32")
+
+        encode_batch(["warm up"])
+        results = []
+
+        r = self._drive(lambda t: encode_batch([t]), options["clients"], options["duration"])
+        results.append({"mode": "unbatched", "max_batch": 1, "mean_batch": 1.0, **r})
+
+        for size in options["batch_sizes"]:
+            batcher = QueryBatcher(encode_batch, window_ms=options["window_ms"], max_batch=size)
+            r = self._drive(batcher.encode, options["clients"], options["duration"])
+            results.append({"mode": "batched", "max_batch": size, "mean_batch": batcher.mean_batch_size, **r})
+
+        if options["json"]:
+            print(json.dumps(results, indent=2))
+            return
+
+        print(f"clients={options['clients']} window={options['window_ms']}ms duration={options['duration']}s")
+        print(f"{'mode':<10} {'max':>4} {'mean':>6} {'qps':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+        for r in results:
+            print(
+                f"{r['mode']:<10} {r['max_batch']:>4} {r['mean_batch']:>6.1f} {r['qps']:>9.1f} "
+                f"{r['p50_ms']:>8.1f} {r['p95_ms']:>8.1f} {r['p99_ms']:>8.1f}"
+            )
@@ -0,0 +1,315 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import zlib
+import numpy as np
+
+MB = 1024 * 1024
+CHUNK_WORDS = 120
+CHUNKS_PER_DOC = 10
+STUB_DIM = 384
+
+# Metrics compared by --compare: (path, higher is better)
+TRACKED = [
+    ("build_index.chunks_per_s", True),
+    ("add_documents.chunks_per_s", True),
+    ("query.p50_ms", False),
+    ("query.p95_ms", False),
+    ("query.p99_ms", False),
+    ("chat.p95_ms", False),
+    ("peak_rss_mb", False),
+    ("disk_mb", False),
+]
+
+
+class HashEncoder:
+    """
+    Offline stand-in for the sentence-transformer: signed feature hashing of
+    the words, so texts sharing words land close together and a query made
+    of a chunk's words retrieves that chunk. Same encode() as the real model.
+    """
+
+    def __init__(self, dim=STUB_DIM):
+        self.dim = dim
+
+    def encode(self, texts, **kwargs):
+        out = np.zeros((len(texts), self.dim), dtype="float32")
+        for row, text in enumerate(texts):
+            for word in text.lower().split():
+                h = zlib.crc32(word.encode())
+                out[row, h % self.dim] += 1.0 if h & 0x80000000 else -1.0
+        return out
+
+
+def stub_generate(prompt, max_length=200):
+    """Offline stand-in for the generator: the first sentence of the context."""
+    context = prompt.split("Context:\n", 1)[-1]
+    return context.split(". ", 1)[0][:max_length]
+
+
+class Corpus:
+    """Deterministic synthetic documents: Zipf-distributed words from a fixed vocabulary."""
+
+    def __init__(self, seed, vocabulary=20000):
+        rng = np.random.default_rng(seed)
+        letters = np.array(list("abcdefghijklmnopqrstuvwxyz"))
+        self.words = ["".join(rng.choice(letters, size=rng.integers(3, 10))) for _ in range(vocabulary)]
+        self.rng = rng
+
+    def documents(self, first_doc, chunks):
+        """(texts, metadatas) for `chunks` chunks in documents of CHUNKS_PER_DOC, ids from first_doc."""
+        ranks = np.minimum(self.rng.zipf(1.3, size=chunks * CHUNK_WORDS), len(self.words)) - 1
+        texts, metas = [], []
+        for i in range(chunks):
+            words = [self.words[r] for r in ranks[i * CHUNK_WORDS : (i + 1) * CHUNK_WORDS]]
+            texts.append(" ".join(words) + ".")
+            doc_id = first_doc + i // CHUNKS_PER_DOC
+            metas.append({
+                "doc_id": doc_id, "filename": f"bench-{doc_id}.txt",
+                "chunk_index": i % CHUNKS_PER_DOC, "page": 1, "page_end": 1,
+            })
+        return texts, metas
+
+
+def _dir_bytes(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+def _latency(samples):
+    lat = np.array(samples or [0.0]) * 1000
+    return {
+        "n": len(samples),
+        "p50_ms": float(np.percentile(lat, 50)),
+        "p95_ms": float(np.percentile(lat, 95)),
+        "p99_ms": float(np.percentile(lat, 99)),
+        "mean_ms": float(lat.mean()),
+    }
+
+
+def _get(results, path):
+    value = results
+    for key in path.split("."):
+        value = value.get(key) if isinstance(value, dict) else None
+    return value
+
+
+def _git_commit():
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=settings.BASE_DIR,
+                             capture_output=True, text=True, timeout=10)
+        return out.stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark the RAG pipeline on synthetic corpora (default 1k, 10k and 100k chunks): "
+        "build_index time, add_documents throughput, query and chat latency percentiles, "
+        "peak RSS and vector_store size. Runs offline with a hashing encoder and a stub "
+        "generator; each size runs in its own process against a scratch store. "
+        "Writes JSON for diffing between commits."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000], help="Corpus sizes in chunks")
+        parser.add_argument("--append", type=int, default=1000, help="Chunks added with add_documents after the build")
+        parser.add_argument("--queries", type=int, default=300)
+        parser.add_argument("--top-k", type=int, default=3)
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--real-model", action="store_true",
+                            help="Embed with the configured model instead of the offline hashing encoder")
+        parser.add_argument("--output", default="bench_rag.json", help="Where to write the JSON results")
+        parser.add_argument("--compare", help="Earlier results JSON to diff against")
+        parser.add_argument("--keep", action="store_true", help="Keep the scratch store directories")
+        parser.add_argument("--json", action="store_true", help="Print results as JSON")
+        # Internal: benchmark one corpus size inside a child process
+        parser.add_argument("--worker-size", type=int, help="(internal)")
+
+    # -- child process --------------------------------------------------------
+
+    def _run_worker(self, options):
+        from chatbot.utils import embedding_store, tracing, ann_index
+        from chatbot.utils.prompt_context import build_prompt
+
+        if not options["real_model"]:
+            encoder = HashEncoder()
+            embedding_store.get_model = lambda: encoder
+        elif embedding_store.get_model() is None:
+            raise CommandError("Embedding model unavailable")
+
+        size, k = options["worker_size"], options["top_k"]
+        corpus = Corpus(options["seed"])
+        texts, metas = corpus.documents(1, size)
+        appended = corpus.documents(1 + size // CHUNKS_PER_DOC + 1, options["append"])
+        baseline_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+        t0 = time.perf_counter()
+        embedding_store.build_index(texts, metas)
+        build_s = time.perf_counter() - t0
+
+        # One add_documents call per document, as uploads arrive
+        t0 = time.perf_counter()
+        for start in range(0, len(appended[0]), CHUNKS_PER_DOC):
+            embedding_store.add_documents(appended[0][start : start + CHUNKS_PER_DOC],
+                                          appended[1][start : start + CHUNKS_PER_DOC])
+        append_s = time.perf_counter() - t0
+
+        # Queries are runs of words from random chunks; a hit is that chunk in the top k
+        rng = np.random.default_rng(options["seed"] + 1)
+        picks = rng.integers(0, size, size=options["queries"])
+        questions = []
+        for i in picks:
+            words = texts[i].rstrip(".").split()
+            start = int(rng.integers(0, len(words) - 8))
+            questions.append((i, " ".join(words[start : start + 8])))
+
+        embedding_store.query("warm up", top_k=k)
+        tracing.reset()
+        query_lat, chat_lat, hits, prompt_tokens = [], [], 0, []
+        for i, question in questions:
+            t0 = time.perf_counter()
+            results = embedding_store.query(question, top_k=k)
+            query_lat.append(time.perf_counter() - t0)
+            hits += any(r["text"] == texts[i] for r in results)
+
+            t0 = time.perf_counter()
+            results = embedding_store.query(question, top_k=k)
+            assembled = build_prompt(question, results)
+            stub_generate(assembled.prompt)
+            chat_lat.append(time.perf_counter() - t0)
+            prompt_tokens.append(assembled.prompt_tokens)
+
+        store = embedding_store.get_store()
+        return {
+            "chunks": size,
+            "build_index": {"seconds": build_s, "chunks_per_s": size / build_s if build_s else 0.0},
+            "add_documents": {
+                "chunks": len(appended[0]),
+                "seconds": append_s,
+                "chunks_per_s": len(appended[0]) / append_s if append_s else 0.0,
+            },
+            "query": {**_latency(query_lat), f"hit_rate@{k}": hits / len(questions) if questions else 0.0},
+            "chat": {**_latency(chat_lat), "prompt_tokens_mean": float(np.mean(prompt_tokens or [0]))},
+            "stages": {
+                stage: {key: snap[key] for key in ("count", "p50_ms", "p95_ms", "p99_ms")}
+                for stage, snap in tracing.stages().items()
+            },
+            "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024 / MB,
+            "baseline_rss_mb": baseline_rss / MB,  # interpreter, libraries and the generated corpus
+            "disk_mb": _dir_bytes(store.directory) / MB,
+            "ann": f"{ann_index.INDEX_TYPE}/{ann_index.VECTOR_STORAGE}" if ann_index.enabled() else "none",
+        }
+
+    # -- parent ---------------------------------------------------------------
+
+    def _run_size(self, size, options):
+        workdir = tempfile.mkdtemp(prefix=f"bench-rag-{size}-")
+        env = dict(
+            os.environ,
+            VECTOR_STORE_DIR=os.path.join(workdir, "vector_store"),
+            WARMUP_MODE="off",
+            QUERY_BATCHING_ENABLED="false",
+            EMBEDDING_CACHE_ENABLED="false",
+        )
+        if not options["real_model"]:
+            # No downloads: the prompt budget falls back to approximate token counts
+            env.update(HF_HUB_OFFLINE="1", TRANSFORMERS_OFFLINE="1")
+        args = [
+            sys.executable, os.path.join(settings.BASE_DIR, "manage.py"), "bench_rag",
+            "--worker-size", str(size), "--append", str(options["append"]), "--queries", str(options["queries"]),
+            "--top-k", str(options["top_k"]), "--seed", str(options["seed"]),
+        ]
+        if options["real_model"]:
+            args.append("--real-model")
+        try:
+            proc = subprocess.run(args, env=env, capture_output=True, text=True)
+        finally:
+            if not options["keep"]:
+                shutil.rmtree(workdir, ignore_errors=True)
+        if proc.returncode != 0:
+            raise CommandError(f"Benchmark at {size} chunks failed:\n{proc.stderr.strip()[-2000:]}")
+        return json.loads(proc.stdout.strip().splitlines()[-1])
+
+    def _compare(self, results, path):
+        with open(path, "r", encoding="utf-8") as f:
+            before = {r["chunks"]: r for r in json.load(f)["runs"]}
+        deltas = {}
+        for run in results["runs"]:
+            old = before.get(run["chunks"])
+            if old is None:
+                continue
+            for metric, higher_is_better in TRACKED:
+                a, b = _get(old, metric), _get(run, metric)
+                if not a or b is None:
+                    continue
+                change = (b - a) / a
+                deltas.setdefault(str(run["chunks"]), {})[metric] = {
+                    "before": a, "after": b, "change": change,
+                    "worse": change < 0 if higher_is_better else change > 0,
+                }
+        return deltas
+
+    def handle(self, *args, **options):
+        if options["worker_size"]:
+            print(json.dumps(self._run_worker(options)))
+            return
+
+        import faiss
+        results = {
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "faiss": getattr(faiss, "__version__", None),
+            "encoder": "configured model" if options["real_model"] else f"hashing stub (dim={STUB_DIM})",
+            "generator": "stub",
+            "seed": options["seed"],
+            "top_k": options["top_k"],
+            "runs": [],
+        }
+        for size in options["sizes"]:
+            if not options["json"]:
+                print(f"Benchmarking {size} chunks...")
+            results["runs"].append(self._run_size(size, options))
+        if options["compare"]:
+            results["compare"] = {"against": options["compare"], "deltas": self._compare(results, options["compare"])}
+
+        with open(options["output"], "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+        if options["json"]:
+            print(json.dumps(results, indent=2))
+            return
+        k = options["top_k"]
+        print(f"commit={results['commit']} encoder={results['encoder']} generator=stub")
+        print(
+            f"{'chunks':>8} {'build s':>8} {'add/s':>8} {'q p50':>7} {'q p95':>7} {'q p99':>7} "
+            f"{'chat p95':>8} {'hit@' + str(k):>6} {'RSS MB':>7} {'disk MB':>8}"
+        )
+        for r in results["runs"]:
+            q = r["query"]
+            print(
+                f"{r['chunks']:>8} {r['build_index']['seconds']:>8.2f} {r['add_documents']['chunks_per_s']:>8.0f} "
+                f"{q['p50_ms']:>7.2f} {q['p95_ms']:>7.2f} {q['p99_ms']:>7.2f} {r['chat']['p95_ms']:>8.2f} "
+                f"{q[f'hit_rate@{k}']:>6.3f} {r['peak_rss_mb']:>7.0f} {r['disk_mb']:>8.1f}"
+            )
+        for size, metrics in results.get("compare", {}).get("deltas", {}).items():
+            for metric, d in metrics.items():
+                flag = "⚠" if d["worse"] and abs(d["change"]) > 0.1 else " "
+                print(f"{flag} {size:>8} {metric:<28} {d['before']:>10.2f} -> {d['after']:>10.2f} ({d['change']:+.1%})")
+        print(f"✓ Results written to {options['output']}")
@@ -1,34 +1,176 @@
 from django.core.management.base import BaseCommand
 from chatbot.models import UploadedDocument
-from chatbot.utils.text_extractor import extract_text_from_pdf
-from chatbot.utils.text_chunker import chunk_text
-from chatbot.utils.embedding_store import build_index
+from chatbot.utils.text_extractor import iter_pages
+from chatbot.utils.text_chunker import chunk_token_limit, iter_page_chunks
+from chatbot.utils.embedding_store import (
+    IndexBuilder, ENCODE_BATCH_SIZE, build_index, get_store, get_vectors, tenant_owner_ids,
+)
+from concurrent.futures import ProcessPoolExecutor
+from collections import deque
+import hashlib
 import os
+import time
+
+
+def _file_hash(file_path):
+    h = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _prepare_document(doc_id, file_path, known_hash, chunk_tokens):
+    """
+    Runs in a pool worker: hash the file and, if it changed, extract and chunk it.
+    Returns (doc_id, filename, content_hash, chunks or None if unchanged, error),
+    where chunks are (text, first page, last page). Pages are extracted serially
+    here; the pool already runs one document per process. chunk_tokens is
+    resolved in the parent so workers don't each load the embedding model.
+    """
+    filename = os.path.basename(file_path)
+    try:
+        content_hash = _file_hash(file_path)
+        if content_hash == known_hash:
+            return doc_id, filename, content_hash, None, None
+        return doc_id, filename, content_hash, list(iter_page_chunks(iter_pages(file_path, workers=1), chunk_tokens)), None
+    except Exception as e:
+        return doc_id, filename, None, None, str(e)
+
 
 class Command(BaseCommand):
-    help = "Build FAISS index from all uploaded documents"
+    help = "Build FAISS index from all uploaded documents (public shard plus one shard per owner)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=os.cpu_count() or 1,
+            help="Processes used for text extraction and chunking",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=ENCODE_BATCH_SIZE,
+            help="Chunks sent to the encoder per batch",
+        )
+        parser.add_argument(
+            "--only-changed",
+            action="store_true",
+            help="Reuse stored embeddings for documents whose content hash is unchanged",
+        )
+
+    def _results(self, docs, known_hashes, workers, chunk_tokens):
+        """Yield prepared documents in order, keeping at most 2x workers in flight."""
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            in_flight = deque()
+            for doc in docs:
+                in_flight.append(pool.submit(
+                    _prepare_document, doc.id, doc.file.path, known_hashes.get(doc.id), chunk_tokens
+                ))
+                if len(in_flight) >= workers * 2:
+                    yield in_flight.popleft().result()
+            while in_flight:
+                yield in_flight.popleft().result()
 
     def handle(self, *args, **options):
+        started = time.perf_counter()
+
         print("Collecting documents...")
-        all_chunks = []
-        all_meta = []
-        for doc in UploadedDocument.objects.all():
-            if not doc.file:
-                continue
-            try:
-                file_path = doc.file.path
-                text = extract_text_from_pdf(file_path)
-                chunks = chunk_text(text)
-                for i, c in enumerate(chunks):
-                    all_chunks.append(c)
-                    all_meta.append({
-                        "doc_id": doc.id,
-                        "filename": os.path.basename(file_path),
-                        "chunk_index": i
-                    })
-            except Exception as e:
-                print(f"Failed to index doc {doc.id}: {e}")
-
-        print(f"Building index with {len(all_chunks)} chunks...")
-        build_index(all_chunks, all_meta)
+        docs = [doc for doc in UploadedDocument.objects.order_by("id") if doc.file]
+        owners = {doc.id: doc.user_id for doc in docs}
+        paths = {doc.id: doc.file.path for doc in docs}
+        known_hashes = {}
+        if options["only_changed"]:
+            for owner_id in {None, *owners.values()}:
+                store = get_store(owner_id)
+                if store.exists():
+                    # A hash without rows (e.g. a failed or interrupted write) is not
+                    # reusable: those documents are extracted again
+                    shard_hashes = store.chunks.doc_hashes()
+                    indexed = store.chunks.doc_ids()
+                    known_hashes.update(
+                        (doc_id, h) for doc_id, h in shard_hashes.items()
+                        if owners.get(doc_id) == owner_id and doc_id in indexed
+                    )
+
+        chunk_tokens = chunk_token_limit()
+
+        # One builder per shard, opened when its first document arrives
+        builders = {}
+        hashes = {}
+        changed = reused = failed = 0
+        try:
+            for doc_id, filename, content_hash, chunks, error in self._results(
+                docs, known_hashes, max(1, options["workers"]), chunk_tokens
+            ):
+                if error:
+                    failed += 1
+                    print(f"Failed to index doc {doc_id}: {error}")
+                    continue
+
+                owner_id = owners[doc_id]
+                builder = builders.get(owner_id)
+                if builder is None:
+                    builder = builders[owner_id] = IndexBuilder(
+                        batch_size=options["batch_size"], store=get_store(owner_id)
+                    )
+                store = builder.store
+                shard_hashes = hashes.setdefault(owner_id, {})
+                if chunks is None:
+                    # Unchanged since last build: copy rows and vectors as-is
+                    found = store.chunks.get_rows(store.chunks.ids_for_doc(doc_id))
+                    if found:
+                        builder.add(
+                            [row["text"] for _, row in found],
+                            [row["meta"] for _, row in found],
+                            embeddings=get_vectors([i for i, _ in found], store),
+                        )
+                        shard_hashes[doc_id] = content_hash
+                        reused += 1
+                        continue
+                    # Its rows went away since the hashes were read: extract it after all
+                    _, _, content_hash, chunks, error = _prepare_document(doc_id, paths[doc_id], None, chunk_tokens)
+                    if error:
+                        failed += 1
+                        print(f"Failed to index doc {doc_id}: {error}")
+                        continue
+
+                builder.add([text for text, _, _ in chunks], [
+                    {"doc_id": doc_id, "filename": filename, "chunk_index": i, "page": first, "page_end": last}
+                    for i, (_, first, last) in enumerate(chunks)
+                ])
+                # Only documents that produced rows get a hash (committed with them)
+                if chunks:
+                    shard_hashes[doc_id] = content_hash
+                changed += 1
+
+            print(f"Writing index ({len(builders)} shards)...")
+            total = 0
+            committed = []
+            while builders:
+                owner_id, builder = builders.popitem()
+                total += builder.commit(doc_hashes=hashes.get(owner_id))
+                committed.append(builder)
+        except Exception:
+            for builder in builders.values():
+                builder.abort()
+            raise
+
+        # Shards left with no documents are emptied
+        for owner_id in [None, *tenant_owner_ids()]:
+            if owner_id not in hashes:
+                build_index([], [], owner_id=owner_id)
+
+        elapsed = time.perf_counter() - started
+        encoded = sum(b.encoded for b in committed)
+        encode_seconds = sum(b.encode_seconds for b in committed)
+        encode_rate = encoded / encode_seconds if encode_seconds else 0.0
         print("Index build complete.")
+        print(
+            f"  documents: {changed} embedded, {reused} reused, {failed} failed\n"
+            f"  chunks:    {total} indexed, {encoded} encoded "
+            f"({encode_rate:.1f} chunks/s over {encode_seconds:.1f}s)\n"
+            f"  total:     {elapsed:.1f}s ({total / elapsed if elapsed else 0:.1f} chunks/s, "
+            f"{len(docs) / elapsed if elapsed else 0:.2f} docs/s)"
+        )
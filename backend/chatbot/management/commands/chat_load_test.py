@@ -0,0 +1,72 @@
+from django.core.management.base import BaseCommand
+import asyncio
+import json
+import time
+import httpx
+import numpy as np
+
+class Command(BaseCommand):
+    help = "Fire concurrent chat requests at the sync (WSGI) and async (ASGI) endpoints and compare throughput"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--base-url", default="http://127.0.0.1:8000/api/", help="API root the chatbot urls are mounted under")
+        parser.add_argument("--paths", nargs="+", default=["chat/", "chat/async/"], help="Endpoints to compare")
+        parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 10, 50, 200])
+        parser.add_argument("--requests", type=int, default=200, help="Requests per endpoint per concurrency level")
+        parser.add_argument("--message", default="What services does the company offer?")
+        parser.add_argument("--timeout", type=float, default=120.0)
+        parser.add_argument("--json", action="store_true", help="Print results as JSON")
+
+    async def _run(self, url, concurrency, total, message, timeout):
+        latencies = []
+        errors = 0
+        sem = asyncio.Semaphore(concurrency)
+        limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+        async with httpx.AsyncClient(limits=limits, timeout=timeout) as client:
+            async def one():
+                nonlocal errors
+                async with sem:
+                    t0 = time.perf_counter()
+                    try:
+                        resp = await client.post(url, json={"message": message})
+                        if resp.status_code != 200:
+                            errors += 1
+                    except httpx.HTTPError:
+                        errors += 1
+                    latencies.append(time.perf_counter() - t0)
+
+            started = time.perf_counter()
+            await asyncio.gather(*(one() for _ in range(total)))
+            elapsed = time.perf_counter() - started
+
+        lat = np.array(latencies) * 1000
+        return {
+            "url": url,
+            "concurrency": concurrency,
+            "requests": total,
+            "errors": errors,
+            "rps": total / elapsed if elapsed else 0.0,
+            "p50_ms": float(np.percentile(lat, 50)),
+            "p95_ms": float(np.percentile(lat, 95)),
+            "p99_ms": float(np.percentile(lat, 99)),
+        }
+
+    def handle(self, *args, **options):
+        results = []
+        for path in options["paths"]:
+            url = options["base_url"].rstrip("/") + "/" + path.lstrip("/")
+            for concurrency in options["concurrency"]:
+                r = asyncio.run(self._run(
+                    url, concurrency, options["requests"], options["message"], options["timeout"]
+                ))
+                results.append(r)
+                if not options["json"]:
+                    print(
+                        f"{path:<14} c={concurrency:<4} {r['rps']:>8.1f} req/s  "
+                        f"p50={r['p50_ms']:.0f}ms p95={r['p95_ms']:.0f}ms p99={r['p99_ms']:.0f}ms  "
+                        f"errors={r['errors']}"
+                    )
+
+        if options["json"]:
+            print(json.dumps(results, indent=2))
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+from chatbot.utils.embedding_store import compact, get_store, tenant_owner_ids
+import time
+
+class Command(BaseCommand):
+    help = "Drop tombstoned (removed) chunks from the vector store now instead of waiting for background compaction"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--rewrite", action="store_true",
+            help="Rewrite every shard even without tombstones (normalizes older stores, applies VECTOR_STORAGE)",
+        )
+
+    def handle(self, *args, **options):
+        rewrite = options["rewrite"]
+        found = False
+        for owner_id in [None, *tenant_owner_ids()]:
+            store = get_store(owner_id)
+            if not store.exists():
+                continue
+            pending = len(store.chunks.tombstones())
+            if not pending and not rewrite:
+                continue
+            found = True
+            print(f"Compacting {pending} tombstoned chunks in '{store.name}'...")
+            t0 = time.perf_counter()
+            dropped = compact(store, rewrite=rewrite)
+            print(f"✓ Dropped {dropped} rows in {time.perf_counter() - t0:.1f}s")
+        if not found:
+            print("No tombstoned chunks; nothing to compact.")
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+from chatbot.utils.embedding_store import get_embedding_cache
+import json
+
+class Command(BaseCommand):
+    help = "Show hit rate and size of the persistent embedding cache"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--json", action="store_true", help="Print stats as JSON")
+        parser.add_argument("--clear", action="store_true", help="Empty the cache and reset its counters")
+
+    def handle(self, *args, **options):
+        cache = get_embedding_cache()
+        if cache is None:
+            raise CommandError("Embedding cache is disabled (EMBEDDING_CACHE_ENABLED=false)")
+
+        if options["clear"]:
+            cache.clear()
+            print("Embedding cache cleared.")
+            return
+
+        stats = cache.stats()
+        if options["json"]:
+            print(json.dumps(stats, indent=2))
+            return
+
+        print(f"Entries:   {stats['entries']} / {stats['max_entries']}")
+        print(f"Size:      {stats['size_bytes'] / (1024 * 1024):.1f} MiB")
+        print(f"Hits:      {stats['hits']}")
+        print(f"Misses:    {stats['misses']}")
+        print(f"Evictions: {stats['evictions']}")
+        print(f"Hit rate:  {stats['hit_rate']:.1%}")
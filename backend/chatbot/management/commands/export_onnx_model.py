@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from chatbot.utils.embedding_store import _current_model_name
+from chatbot.utils import onnx_backend
+import os
+
+class Command(BaseCommand):
+    help = "Export the embedding model to ONNX with a dynamically int8-quantized copy (for EMBEDDING_BACKEND=onnx)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--model", default=None, help="SentenceTransformer name (default: the configured model)")
+        parser.add_argument("--opset", type=int, default=14)
+
+    def handle(self, *args, **options):
+        name = options["model"] or _current_model_name()
+        print(f"Exporting {name} ...")
+        config = onnx_backend.export(name, opset=options["opset"])
+
+        out_dir = onnx_backend.model_dir(name)
+        for filename in ("model.onnx", "model.int8.onnx"):
+            size = os.path.getsize(os.path.join(out_dir, filename))
+            print(f"  {filename:<16} {size / (1024 * 1024):7.1f} MiB")
+        print(f"  pooling={config['pooling']} normalize={config['normalize']} max_seq_length={config['max_seq_length']}")
+        print(f"✓ Written to {out_dir}; set EMBEDDING_BACKEND=onnx to use it")
@@ -0,0 +1,124 @@
+from django.core.management.base import BaseCommand, CommandError
+from chatbot.utils.embedding_store import encode_query, get_store, query, HYBRID_CANDIDATES
+from chatbot.utils import lexical
+import json
+import time
+import numpy as np
+
+
+def _load_labels(path):
+    """A JSON list or JSON lines of {"query", "doc_id"[, "chunk_index"]} or {"query", "text"}."""
+    with open(path, "r", encoding="utf-8") as f:
+        raw = f.read().strip()
+    if raw.startswith("["):
+        return json.loads(raw)
+    return [json.loads(line) for line in raw.splitlines() if line.strip()]
+
+
+def _matches(label, row):
+    if "text" in label:
+        return label["text"] in row["text"]
+    meta = row["meta"]
+    if meta.get("doc_id") != label["doc_id"]:
+        return False
+    return label.get("chunk_index") is None or meta.get("chunk_index") == label["chunk_index"]
+
+
+def _label_for(row):
+    meta = row["meta"]
+    if meta.get("doc_id") is None:
+        return {"text": row["text"]}
+    return {"doc_id": meta["doc_id"], "chunk_index": meta.get("chunk_index")}
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare vector-only and hybrid (BM25 + vector, RRF) retrieval on a labelled query set: "
+        "hit rate at top_k and the latency BM25 adds."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--labels", help="Labelled queries (JSON / JSON lines); default: sampled from stored chunks")
+        parser.add_argument("--queries", type=int, default=200, help="Queries to sample per kind without --labels")
+        parser.add_argument("--top-k", type=int, default=3)
+        parser.add_argument("--owner", type=int, help="Search this owner's shard (plus the public one)")
+        parser.add_argument("--json", action="store_true", help="Print results as JSON")
+
+    def _sample(self, owner_id, n):
+        """
+        Two kinds of query per sampled chunk, labelled with that chunk:
+        `keyword` is its three rarest terms (names, codes, figures), `opening`
+        its first twelve words.
+        """
+        chunks = get_store(owner_id).chunks
+        rows = chunks.head(100_000)
+        if not rows:
+            raise CommandError("No stored chunks to sample queries from; pass --labels")
+        rng = np.random.default_rng(0)
+        picked = [rows[i] for i in rng.choice(len(rows), size=min(n, len(rows)), replace=False)]
+        terms = sorted({t for row in picked for t in lexical.tokenize(row["text"])})
+        df = {}
+        for start in range(0, len(terms), 500):
+            df.update(chunks.document_frequencies(terms[start : start + 500]))
+        labelled = []
+        for row in picked:
+            rare = sorted(set(lexical.tokenize(row["text"])), key=lambda t: (df.get(t, 0), t))[:3]
+            if rare:
+                labelled.append({"kind": "keyword", "query": " ".join(rare), **_label_for(row)})
+            labelled.append({"kind": "opening", "query": " ".join(row["text"].split()[:12]), **_label_for(row)})
+        return labelled
+
+    def handle(self, *args, **options):
+        owner_id, k = options["owner"], options["top_k"]
+        labelled = _load_labels(options["labels"]) if options["labels"] else self._sample(owner_id, options["queries"])
+        labelled = [q for q in labelled if str(q.get("query", "")).strip()]
+        if not labelled:
+            raise CommandError("No labelled queries")
+        if encode_query("warm up") is None:
+            raise CommandError("Embedding model unavailable")
+
+        per_kind = {}
+        for label in labelled:
+            # One embedding per query, shared by both modes: only retrieval is timed
+            q_emb = encode_query(label["query"])
+            stats = per_kind.setdefault(label.get("kind", "labelled"), {"vector": ([], []), "hybrid": ([], [])})
+            for mode, hybrid in (("vector", False), ("hybrid", True)):
+                t0 = time.perf_counter()
+                results = query(label["query"], top_k=k, q_emb=q_emb, owner_id=owner_id, hybrid=hybrid)
+                stats[mode][0].append((time.perf_counter() - t0) * 1000)
+                stats[mode][1].append(any(_matches(label, r) for r in results))
+
+        results = {"top_k": k, "candidates": max(k, HYBRID_CANDIDATES), "rrf_k": lexical.RRF_K, "kinds": {}}
+        for kind, stats in per_kind.items():
+            modes = {
+                mode: {
+                    f"hit_rate@{k}": float(np.mean(hits)),
+                    "p50_ms": float(np.percentile(lat, 50)),
+                    "p95_ms": float(np.percentile(lat, 95)),
+                }
+                for mode, (lat, hits) in stats.items()
+            }
+            results["kinds"][kind] = {
+                "queries": len(stats["vector"][1]),
+                **modes,
+                "hit_rate_gain": modes["hybrid"][f"hit_rate@{k}"] - modes["vector"][f"hit_rate@{k}"],
+                "added_p50_ms": modes["hybrid"]["p50_ms"] - modes["vector"]["p50_ms"],
+                "added_p95_ms": modes["hybrid"]["p95_ms"] - modes["vector"]["p95_ms"],
+            }
+
+        if options["json"]:
+            print(json.dumps(results, indent=2))
+            return
+        print(f"top_k={k} candidates={results['candidates']} rrf_k={results['rrf_k']}")
+        print(f"{'queries':<10} {'mode':<7} {'n':>5} {'hit@' + str(k):>7} {'p50 ms':>8} {'p95 ms':>8}")
+        for kind, r in results["kinds"].items():
+            for mode in ("vector", "hybrid"):
+                m = r[mode]
+                print(
+                    f"{kind:<10} {mode:<7} {r['queries']:>5} {m[f'hit_rate@{k}']:>7.3f} "
+                    f"{m['p50_ms']:>8.2f} {m['p95_ms']:>8.2f}"
+                )
+            print(
+                f"{kind:<10} hybrid vs vector: hit rate {r['hit_rate_gain']:+.3f}, "
+                f"p50 {r['added_p50_ms']:+.2f} ms, p95 {r['added_p95_ms']:+.2f} ms"
+            )
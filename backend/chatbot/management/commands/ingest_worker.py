@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from chatbot.tasks import drain, requeue_stale
+import time
+
+class Command(BaseCommand):
+    help = "Process pending uploaded documents from the ingestion queue"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true", help="Drain the queue once and exit")
+        parser.add_argument("--interval", type=float, default=2.0, help="Seconds to sleep when the queue is empty")
+
+    def handle(self, *args, **options):
+        print("Ingestion worker started.")
+        while True:
+            close_old_connections()
+            requeued = requeue_stale()
+            if requeued:
+                print(f"Requeued {requeued} stale documents.")
+
+            processed = drain()
+            if processed:
+                print(f"Processed {processed} documents.")
+
+            if options["once"]:
+                break
+            time.sleep(options["interval"])
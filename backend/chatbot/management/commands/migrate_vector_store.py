@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand, CommandError
+from chatbot.utils.embedding_store import INDEX_PATH, VECTOR_STORE_DIR, migrate_legacy_index
+import os
+
+class Command(BaseCommand):
+    help = "Convert the legacy faiss_index.index/documents.json pair into vectors.f32 + chunks.sqlite3"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--remove-legacy",
+            action="store_true",
+            help="Delete faiss_index.index and documents.json after a successful conversion",
+        )
+
+    def handle(self, *args, **options):
+        if not os.path.exists(INDEX_PATH):
+            raise CommandError(f"No legacy index found at {INDEX_PATH}")
+
+        print(f"Converting {INDEX_PATH}...")
+        count = migrate_legacy_index(remove_legacy=options["remove_legacy"])
+        print(f"Migration complete: {count} vectors written to {VECTOR_STORE_DIR}")
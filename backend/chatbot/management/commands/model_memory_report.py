@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+from chatbot.utils.embedding_store import get_model, _current_model_name, DEFAULT_DEV_MODEL, DEFAULT_PROD_MODEL
+from chatbot.utils.model_registry import get_sentence_transformer, loaded_models, rss_bytes
+import gc
+
+MB = 1024 * 1024
+
+class Command(BaseCommand):
+    help = "Report resident memory per embedding model and what the shared registry saves per worker"
+
+    def handle(self, *args, **options):
+        gc.collect()
+        baseline = rss_bytes()
+        print(f"Baseline RSS:                     {baseline / MB:8.1f} MiB")
+
+        name = _current_model_name()
+        get_model()
+        after_first = rss_bytes()
+        print(f"+ {name:<30} {after_first / MB:8.1f} MiB  (+{(after_first - baseline) / MB:.1f})")
+
+        # Every other caller (embedder, views, batcher) now gets the same instance
+        get_model()
+        get_sentence_transformer(name)
+        after_reuse = rss_bytes()
+        print(f"+ repeat lookups (shared)         {after_reuse / MB:8.1f} MiB  (+{(after_reuse - after_first) / MB:.1f})")
+
+        # What the old layout loaded on top: embedder.py always used the dev model
+        other = DEFAULT_DEV_MODEL if name != DEFAULT_DEV_MODEL else DEFAULT_PROD_MODEL
+        get_sentence_transformer(other)
+        after_second = rss_bytes()
+        saved = after_second - after_reuse
+        print(f"+ {other:<30} {after_second / MB:8.1f} MiB  (+{saved / MB:.1f})")
+
+        print()
+        print(f"Models in registry: {', '.join(n for n, _ in loaded_models())}")
+        print(f"Resident set saved per worker by loading one model instead of two: {saved / MB:.1f} MiB")
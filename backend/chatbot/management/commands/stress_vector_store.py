@@ -0,0 +1,301 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from concurrent.futures import ThreadPoolExecutor
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+
+ROLES = ("seed", "writer", "reader", "verify")
+
+TOPICS = [
+    "marketing websites", "e-commerce stores", "uptime monitoring", "security patches",
+    "technical audits", "content strategy", "two-week sprints", "managed cloud hosting",
+    "discovery workshops", "accessibility reviews", "payment integrations", "analytics dashboards",
+]
+
+
+def _anchor_text(i):
+    return f"Anchor {i}: the reference note about {TOPICS[i % len(TOPICS)]} number {i} never changes."
+
+
+def _doc_texts(doc_id, version, chunks):
+    topic = TOPICS[doc_id % len(TOPICS)]
+    return [f"Upload {doc_id} version {version} part {c} describes {topic} for client {doc_id * 7 + c}."
+            for c in range(chunks)]
+
+
+def _doc_metas(doc_id, chunks):
+    return [{"doc_id": doc_id, "filename": f"stress-{doc_id}.txt", "chunk_index": c} for c in range(chunks)]
+
+
+def _doc_id(worker, thread, j, threads):
+    return (worker * threads + thread + 1) * 100000 + j
+
+
+class Command(BaseCommand):
+    help = (
+        "Concurrency stress test for the vector store: parallel uploader processes append, "
+        "replace, remove and compact while reader processes query, all against a scratch store. "
+        "Fails if any update is lost or a reader ever sees rows that don't match their vectors."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--processes", type=int, default=3, help="Uploader processes")
+        parser.add_argument("--threads", type=int, default=2, help="Uploader threads per process")
+        parser.add_argument("--docs", type=int, default=20, help="Documents per uploader thread")
+        parser.add_argument("--chunks", type=int, default=3, help="Chunks per document")
+        parser.add_argument("--replace-every", type=int, default=4, help="Re-upload every Nth document")
+        parser.add_argument("--remove-every", type=int, default=5, help="Delete every Nth document")
+        parser.add_argument("--compact-every", type=int, default=10,
+                            help="Uploader 0 compacts after every N documents (0 = never)")
+        parser.add_argument("--readers", type=int, default=2, help="Reader processes querying throughout")
+        parser.add_argument("--anchors", type=int, default=24, help="Documents seeded up front that readers look up")
+        parser.add_argument("--sample", type=int, default=200, help="Rows whose stored vector is re-checked")
+        parser.add_argument("--keep", action="store_true", help="Keep the scratch store directory")
+        parser.add_argument("--json", action="store_true", help="Print results as JSON")
+        # Internal: one role of the test, run inside a child process
+        parser.add_argument("--role", choices=ROLES, help="(internal)")
+        parser.add_argument("--worker-id", type=int, default=0, help="(internal)")
+        parser.add_argument("--stop-file", help="(internal)")
+        parser.add_argument("--expected", help="(internal)")
+
+    # -- child processes ------------------------------------------------------
+
+    def _seed(self, options):
+        from chatbot.utils.embedding_store import build_index
+        n = options["anchors"]
+        build_index([_anchor_text(i) for i in range(n)],
+                    [{"doc_id": i + 1, "filename": f"anchor-{i}.txt", "chunk_index": 0} for i in range(n)])
+        return {"anchors": n}
+
+    def _writer(self, options):
+        from chatbot.utils.embedding_store import add_documents, replace_document, remove_document, compact
+        worker, threads, chunks = options["worker_id"], options["threads"], options["chunks"]
+
+        def run(thread):
+            expected, errors = {}, []
+            for j in range(1, options["docs"] + 1):
+                doc_id = _doc_id(worker, thread, j, threads)
+                try:
+                    add_documents(_doc_texts(doc_id, 1, chunks), _doc_metas(doc_id, chunks))
+                    expected[doc_id] = 1
+                    if options["replace_every"] and j % options["replace_every"] == 0:
+                        replace_document(doc_id, _doc_texts(doc_id, 2, chunks), _doc_metas(doc_id, chunks))
+                        expected[doc_id] = 2
+                    if options["remove_every"] and j % options["remove_every"] == 0:
+                        remove_document(doc_id)
+                        expected[doc_id] = None
+                    if worker == 0 and thread == 0 and options["compact_every"] and j % options["compact_every"] == 0:
+                        compact()
+                except Exception as e:
+                    errors.append(f"doc {doc_id}: {e!r}")
+            return expected, errors
+
+        t0 = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            results = list(pool.map(run, range(threads)))
+        expected = {str(k): v for r, _ in results for k, v in r.items()}
+        return {
+            "expected": expected,
+            "errors": [e for _, errs in results for e in errs],
+            "seconds": time.perf_counter() - t0,
+        }
+
+    def _reader(self, options):
+        from chatbot.utils.embedding_store import query
+        anchors = [_anchor_text(i) for i in range(options["anchors"])]
+        rng = random.Random(options["worker_id"])
+        queries = mismatches = errors = 0
+        latencies, examples = [], []
+        while not os.path.exists(options["stop_file"]):
+            text = rng.choice(anchors)
+            t0 = time.perf_counter()
+            try:
+                results = query(text, top_k=3)
+            except Exception as e:
+                errors += 1
+                examples.append(repr(e))
+                continue
+            latencies.append(time.perf_counter() - t0)
+            queries += 1
+            # Anchors are never modified, so the exact text must be the top hit;
+            # anything else means ids resolved against the wrong rows
+            if not results or results[0]["text"] != text:
+                mismatches += 1
+                if len(examples) < 5:
+                    examples.append(f"{text!r} -> {results[0]['text'] if results else None!r}")
+        lat = np.array(latencies or [0.0]) * 1000
+        return {
+            "queries": queries,
+            "mismatches": mismatches,
+            "errors": errors,
+            "examples": examples,
+            "p50_ms": float(np.percentile(lat, 50)),
+            "p99_ms": float(np.percentile(lat, 99)),
+        }
+
+    def _verify(self, options):
+        from chatbot.utils import vector_file
+        from chatbot.utils.embedding_store import get_store, get_vectors, encode_query
+        with open(options["expected"], "r", encoding="utf-8") as f:
+            expected = {int(k): v for k, v in json.load(f).items()}
+        store = get_store()
+        problems = []
+
+        header = vector_file.read_header(store.header_path)
+        count = header["count"] if header else 0
+        live = dict(store.chunks.get_rows(range(count)))
+        tombstoned = set(store.chunks.tombstones())
+        if store.chunks.count() != len(live):
+            problems.append(f"{store.chunks.count() - len(live)} chunk rows beyond the published vector count")
+        if len(live) + len(tombstoned) != count or set(live) & tombstoned:
+            problems.append(f"rows ({len(live)} live + {len(tombstoned)} tombstoned) don't cover {count} vectors")
+        if header and header.get("deleted", 0) != len(tombstoned):
+            problems.append(f"header counts {header.get('deleted')} tombstones, table has {len(tombstoned)}")
+
+        by_doc = {}
+        for row in live.values():
+            by_doc.setdefault(row["meta"]["doc_id"], []).append(row)
+        for i in range(options["anchors"]):
+            if [r["text"] for r in by_doc.pop(i + 1, [])] != [_anchor_text(i)]:
+                problems.append(f"anchor {i} missing or duplicated")
+        for doc_id, version in expected.items():
+            rows = sorted(by_doc.pop(doc_id, []), key=lambda r: r["meta"]["chunk_index"])
+            want = [] if version is None else _doc_texts(doc_id, version, options["chunks"])
+            if [r["text"] for r in rows] != want:
+                state = "removed" if version is None else f"version {version}"
+                problems.append(f"doc {doc_id}: expected {state}, found {[r['text'] for r in rows][:2]}")
+        for doc_id in by_doc:
+            problems.append(f"doc {doc_id}: unexpected rows")
+
+        # Every row must still sit on its own vector
+        ids = sorted(live)
+        sample = random.Random(0).sample(ids, min(options["sample"], len(ids)))
+        misaligned = 0
+        vectors = get_vectors(sample, store)
+        for i, vec in zip(sample, vectors):
+            enc = encode_query(live[i]["text"])[0]
+            cos = float(vec @ enc / (np.linalg.norm(vec) * np.linalg.norm(enc) or 1.0))
+            if cos < 0.99:
+                misaligned += 1
+        if misaligned:
+            problems.append(f"{misaligned}/{len(sample)} sampled rows don't match their stored vectors")
+
+        return {
+            "vectors": count,
+            "live_rows": len(live),
+            "tombstoned": len(tombstoned),
+            "epoch": vector_file.epoch_of(header),
+            "checked_vectors": len(sample),
+            "problems": problems,
+        }
+
+    # -- parent ---------------------------------------------------------------
+
+    def _command(self, role, options, **extra):
+        args = [sys.executable, os.path.join(settings.BASE_DIR, "manage.py"), "stress_vector_store", "--role", role]
+        for name in ("threads", "docs", "chunks", "replace_every", "remove_every", "compact_every", "anchors", "sample"):
+            args += [f"--{name.replace('_', '-')}", str(options[name])]
+        for name, value in extra.items():
+            args += [f"--{name.replace('_', '-')}", str(value)]
+        return args
+
+    @staticmethod
+    def _result(proc, role, stdout, stderr):
+        if proc.returncode != 0:
+            raise CommandError(f"{role} process failed:\n{stderr.strip()[-2000:]}")
+        return json.loads(stdout.strip().splitlines()[-1])
+
+    def _run(self, role, options, env, **extra):
+        proc = subprocess.run(self._command(role, options, **extra), env=env, capture_output=True, text=True)
+        return self._result(proc, role, proc.stdout, proc.stderr)
+
+    def _start(self, role, options, env, **extra):
+        return subprocess.Popen(self._command(role, options, **extra), env=env,
+                                stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+
+    def _wait(self, proc, role):
+        stdout, stderr = proc.communicate()
+        return self._result(proc, role, stdout, stderr)
+
+    def handle(self, *args, **options):
+        if options["role"]:
+            handler = {"seed": self._seed, "writer": self._writer, "reader": self._reader, "verify": self._verify}
+            print(json.dumps(handler[options["role"]](options)))
+            return
+
+        workdir = tempfile.mkdtemp(prefix="vector-stress-")
+        store_dir = os.path.join(workdir, "vector_store")
+        env = dict(os.environ, VECTOR_STORE_DIR=store_dir, WARMUP_MODE="off", QUERY_BATCHING_ENABLED="false")
+        stop_file = os.path.join(workdir, "stop")
+        try:
+            self._run("seed", options, env)
+
+            readers = [self._start("reader", options, env, worker_id=i, stop_file=stop_file)
+                       for i in range(options["readers"])]
+            started = time.perf_counter()
+            writers = [self._start("writer", options, env, worker_id=i) for i in range(options["processes"])]
+            try:
+                written = [self._wait(p, "writer") for p in writers]
+            finally:
+                open(stop_file, "w").close()
+                read = [self._wait(p, "reader") for p in readers]
+            elapsed = time.perf_counter() - started
+
+            expected = {k: v for w in written for k, v in w["expected"].items()}
+            expected_path = os.path.join(workdir, "expected.json")
+            with open(expected_path, "w", encoding="utf-8") as f:
+                json.dump(expected, f)
+            verified = self._run("verify", options, env, expected=expected_path)
+        finally:
+            if not options["keep"]:
+                shutil.rmtree(workdir, ignore_errors=True)
+
+        writer_errors = [e for w in written for e in w["errors"]]
+        results = {
+            "uploaders": options["processes"] * options["threads"],
+            "documents": len(expected),
+            "seconds": elapsed,
+            "writer_errors": writer_errors,
+            "reads": {
+                "queries": sum(r["queries"] for r in read),
+                "mismatches": sum(r["mismatches"] for r in read),
+                "errors": sum(r["errors"] for r in read),
+                "p50_ms": max((r["p50_ms"] for r in read), default=0.0),
+                "p99_ms": max((r["p99_ms"] for r in read), default=0.0),
+                "examples": [e for r in read for e in r["examples"]][:5],
+            },
+            "store": verified,
+        }
+        failures = list(verified["problems"])
+        if writer_errors:
+            failures.append(f"{len(writer_errors)} writer errors, e.g. {writer_errors[0]}")
+        if results["reads"]["mismatches"] or results["reads"]["errors"]:
+            failures.append(
+                f"{results['reads']['mismatches']} inconsistent reads and {results['reads']['errors']} read errors"
+            )
+        results["passed"] = not failures
+
+        if options["json"]:
+            print(json.dumps(results, indent=2))
+        else:
+            reads = results["reads"]
+            print(
+                f"{results['uploaders']} uploaders x {options['docs']} docs, {options['readers']} readers, "
+                f"{elapsed:.1f}s"
+            )
+            print(
+                f"  store:  {verified['vectors']} vectors, {verified['live_rows']} live, "
+                f"{verified['tombstoned']} tombstoned, epoch {verified['epoch']}"
+            )
+            print(f"  reads:  {reads['queries']} queries, p50 {reads['p50_ms']:.1f} ms, p99 {reads['p99_ms']:.1f} ms")
+        if failures:
+            raise CommandError("Vector store stress test failed:\n  " + "\n  ".join(failures[:20]))
+        if not options["json"]:
+            print("✓ No lost updates; every read was consistent")
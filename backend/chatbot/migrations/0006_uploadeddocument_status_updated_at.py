@@ -0,0 +1,30 @@
+# Generated by Django 5.2.7 on 2026-10-18 09:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chatbot', '0005_alter_uploadeddocument_user'),
+    ]
+
+    operations = [
+        # Documents uploaded before the ingestion queue were indexed inline
+        migrations.AddField(
+            model_name='uploadeddocument',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('extracting', 'Extracting'), ('embedding', 'Embedding'), ('indexed', 'Indexed'), ('failed', 'Failed')], db_index=True, default='indexed', max_length=20),
+            preserve_default=False,
+        ),
+        migrations.AlterField(
+            model_name='uploadeddocument',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('extracting', 'Extracting'), ('embedding', 'Embedding'), ('indexed', 'Indexed'), ('failed', 'Failed')], db_index=True, default='pending', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='uploadeddocument',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
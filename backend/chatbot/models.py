@@ -2,6 +2,19 @@ from django.db import models
 from django.conf import settings
 
 class UploadedDocument(models.Model):
+    STATUS_PENDING = "pending"
+    STATUS_EXTRACTING = "extracting"
+    STATUS_EMBEDDING = "embedding"
+    STATUS_INDEXED = "indexed"
+    STATUS_FAILED = "failed"
+
+    STATUS_CHOICES = [
+        (STATUS_PENDING, "Pending"),
+        (STATUS_EXTRACTING, "Extracting"),
+        (STATUS_EMBEDDING, "Embedding"),
+        (STATUS_INDEXED, "Indexed"),
+        (STATUS_FAILED, "Failed"),
+    ]
     
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL,
@@ -11,7 +24,9 @@ class UploadedDocument(models.Model):
     )
     file = models.FileField(upload_to='documents/')
     content = models.TextField(blank=True, null=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_PENDING, db_index=True)
     uploaded_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return self.file.name
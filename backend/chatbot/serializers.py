@@ -4,4 +4,18 @@ from .models import UploadedDocument
 class DocumentSerializer(serializers.ModelSerializer):
     class Meta:
         model = UploadedDocument
-        fields = ['id', 'file', 'uploaded_at']
+        fields = ['id', 'file', 'status', 'uploaded_at']
+        read_only_fields = ['status']
+
+
+class DocumentStatusSerializer(serializers.ModelSerializer):
+    error = serializers.SerializerMethodField()
+
+    class Meta:
+        model = UploadedDocument
+        fields = ['id', 'status', 'error', 'uploaded_at', 'updated_at']
+
+    def get_error(self, obj):
+        if obj.status == UploadedDocument.STATUS_FAILED:
+            return obj.content
+        return None
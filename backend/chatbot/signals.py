@@ -0,0 +1,57 @@
+# backend/chatbot/signals.py
+#
+# Keep the vector store in step with UploadedDocument rows: deleting a
+# document tombstones its chunks, and replacing its file sends it back
+# through the ingestion queue, which swaps the old chunks for the new ones.
+# Chunks live in the owner's shard, so a change of owner moves them.
+
+import logging
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .models import UploadedDocument
+
+logger = logging.getLogger(__name__)
+
+
+def _remove_on_commit(doc_id, owner_id):
+    def remove():
+        from .utils.embedding_store import remove_document
+        try:
+            remove_document(doc_id, owner_id=owner_id)
+        except Exception as e:
+            logger.error(f"✗ Failed to remove document {doc_id} from the index: {e}")
+
+    transaction.on_commit(remove)
+
+
+@receiver(pre_save, sender=UploadedDocument)
+def mark_changed_file_for_reindex(sender, instance, update_fields=None, **kwargs):
+    if instance.pk is None or (
+        update_fields is not None and "file" not in update_fields and "user" not in update_fields
+    ):
+        return
+    previous = sender.objects.filter(pk=instance.pk).values_list("file", "user_id").first()
+    if previous is None:
+        return
+    previous_file, previous_owner = previous
+    if previous_owner != instance.user_id:
+        _remove_on_commit(instance.pk, previous_owner)
+    if previous_file != instance.file.name or previous_owner != instance.user_id:
+        instance.status = UploadedDocument.STATUS_PENDING
+        instance._reindex = True
+
+
+@receiver(post_save, sender=UploadedDocument)
+def enqueue_reindex(sender, instance, created, **kwargs):
+    if not created and getattr(instance, "_reindex", False):
+        instance._reindex = False
+        from .tasks import enqueue
+        transaction.on_commit(lambda: enqueue(instance))
+
+
+@receiver(post_delete, sender=UploadedDocument)
+def remove_from_index(sender, instance, **kwargs):
+    _remove_on_commit(instance.pk, instance.user_id)
@@ -0,0 +1,171 @@
+# backend/chatbot/tasks.py
+#
+# Document ingestion queue. The UploadedDocument table is the queue: uploads
+# are saved as `pending` and a worker claims them one at a time with a
+# conditional UPDATE, so any number of workers (the in-process thread or
+# `manage.py ingest_worker`) can drain it without a broker or double work.
+
+import os
+import time
+import logging
+import threading
+from datetime import timedelta
+from typing import Optional
+
+from django.db import close_old_connections
+from django.utils import timezone
+
+from .models import UploadedDocument
+from .utils.text_extractor import iter_pages
+from .utils.text_chunker import iter_page_chunks
+from .utils.embedding_store import replace_document
+from .utils.tracing import record, span
+
+logger = logging.getLogger(__name__)
+
+# thread: drain the queue in a background thread of the web process
+# worker: leave it to `manage.py ingest_worker`
+INGEST_MODE = os.getenv("INGEST_MODE", "thread").lower()
+
+# Documents stuck mid-pipeline this long are assumed to belong to a dead worker
+STALE_AFTER = timedelta(minutes=int(os.getenv("INGEST_STALE_MINUTES", "30")))
+
+
+def _set_status(doc: UploadedDocument, status: str) -> None:
+    doc.status = status
+    doc.save(update_fields=["status", "updated_at"])
+
+
+def ingest_document(doc: UploadedDocument) -> None:
+    """Extract, chunk, embed and index one claimed document, tracking its status."""
+    file_path = doc.file.path
+    try:
+        # --- Extract and chunk page by page: the chunker consumes each page as it is extracted ---
+        _set_status(doc, UploadedDocument.STATUS_EXTRACTING)
+        texts = []
+        extract_ms = 0.0
+
+        def pages():
+            nonlocal extract_ms
+            source = iter_pages(file_path)
+            while True:
+                t0 = time.perf_counter()
+                page = next(source, None)
+                extract_ms += (time.perf_counter() - t0) * 1000
+                if page is None:
+                    return
+                texts.append(page[1])
+                yield page
+
+        # Chunks and metadata (with the pages each chunk spans)
+        filename = os.path.basename(file_path)
+        chunks, metadatas = [], []
+        t0 = time.perf_counter()
+        for i, (chunk, first_page, last_page) in enumerate(iter_page_chunks(pages())):
+            chunks.append(chunk)
+            metadatas.append({
+                "doc_id": doc.id, "filename": filename, "chunk_index": i,
+                "page": first_page, "page_end": last_page,
+            })
+        # Extraction ran inside the chunking loop; report the two stages apart
+        record("ingest.extract", extract_ms)
+        record("ingest.chunk", (time.perf_counter() - t0) * 1000 - extract_ms)
+
+        doc.content = "".join(texts)
+        doc.save(update_fields=["content", "updated_at"])
+
+        # --- Swap in the new chunks (drops any from a previous version) ---
+        _set_status(doc, UploadedDocument.STATUS_EMBEDDING)
+        with span("ingest.index"):
+            replace_document(doc.id, chunks, metadatas, owner_id=doc.user_id)
+        _set_status(doc, UploadedDocument.STATUS_INDEXED)
+        logger.info(f"✓ Indexed document {doc.id} ({len(chunks)} chunks)")
+
+    except Exception as e:
+        logger.error(f"✗ Error processing uploaded document {doc.id}: {e}")
+        doc.content = f"Error: {e}"
+        doc.status = UploadedDocument.STATUS_FAILED
+        doc.save(update_fields=["content", "status", "updated_at"])
+
+
+def claim_next() -> Optional[UploadedDocument]:
+    """Atomically move the oldest pending document to `extracting` and return it."""
+    pending = (
+        UploadedDocument.objects.filter(status=UploadedDocument.STATUS_PENDING)
+        .order_by("uploaded_at")
+        .values_list("pk", flat=True)[:10]
+    )
+    for pk in pending:
+        claimed = UploadedDocument.objects.filter(
+            pk=pk, status=UploadedDocument.STATUS_PENDING
+        ).update(status=UploadedDocument.STATUS_EXTRACTING, updated_at=timezone.now())
+        if claimed:
+            return UploadedDocument.objects.get(pk=pk)
+    return None
+
+
+def requeue_stale() -> int:
+    """Put documents abandoned mid-pipeline back into the queue."""
+    return UploadedDocument.objects.filter(
+        status__in=[UploadedDocument.STATUS_EXTRACTING, UploadedDocument.STATUS_EMBEDDING],
+        updated_at__lt=timezone.now() - STALE_AFTER,
+    ).update(status=UploadedDocument.STATUS_PENDING, updated_at=timezone.now())
+
+
+def drain() -> int:
+    """Process pending documents until the queue is empty. Returns how many ran."""
+    processed = 0
+    while True:
+        doc = claim_next()
+        if doc is None:
+            return processed
+        ingest_document(doc)
+        processed += 1
+
+
+# -----------------------------------------------------------------------------
+# In-process background worker
+# -----------------------------------------------------------------------------
+_wakeup = threading.Event()
+_worker: Optional[threading.Thread] = None
+_worker_lock = threading.Lock()
+
+
+def _run_worker() -> None:
+    while True:
+        close_old_connections()
+        try:
+            # Documents a dead process left mid-pipeline go back in the queue
+            requeued = requeue_stale()
+            if requeued:
+                logger.info(f"Requeued {requeued} stale documents")
+            drain()
+        except Exception as e:
+            logger.error(f"✗ Ingestion worker error: {e}")
+        finally:
+            close_old_connections()
+        _wakeup.wait(timeout=60)
+        _wakeup.clear()
+
+
+def start_worker() -> None:
+    """
+    Start the local worker (thread mode), which first drains whatever is
+    already pending. Called when a server process starts, so documents queued
+    before a restart don't wait for the next upload.
+    """
+    if INGEST_MODE != "thread":
+        return
+    global _worker
+    with _worker_lock:
+        if _worker is None or not _worker.is_alive():
+            _worker = threading.Thread(target=_run_worker, name="ingest-worker", daemon=True)
+            _worker.start()
+
+
+def enqueue(doc: UploadedDocument) -> None:
+    """Signal that `doc` is pending. In thread mode, wake (or start) the local worker."""
+    if INGEST_MODE != "thread":
+        return
+    start_worker()
+    _wakeup.set()
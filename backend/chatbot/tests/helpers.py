@@ -0,0 +1,146 @@
+import os
+import shutil
+import tempfile
+from collections import OrderedDict
+from unittest import mock
+
+from django.apps import apps
+from django.db import connection
+from django.test import modify_settings
+
+from chatbot.management.commands.bench_rag import HashEncoder
+from chatbot.utils import embedding_store
+from chatbot.utils.chunk_store import ChunkStore
+
+
+def doc_chunks(doc_id, texts):
+    """(texts, metadatas) for one document's chunks."""
+    return list(texts), [{"doc_id": doc_id, "filename": f"doc-{doc_id}.txt", "chunk_index": i}
+                         for i in range(len(texts))]
+
+
+class TempVectorStoreMixin:
+    """
+    Point embedding_store at a scratch VECTOR_STORE_DIR (public shard plus
+    tenants/) and encode with HashEncoder, so the real write and query paths
+    run offline. No embedding cache or query batcher.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.store_dir = tempfile.mkdtemp(prefix="vector-store-test-")
+        self.addCleanup(shutil.rmtree, self.store_dir, ignore_errors=True)
+        path = lambda name: os.path.join(self.store_dir, name)  # noqa: E731
+
+        self.store = embedding_store._VectorStore(
+            path("vectors.f32"),
+            path("vectors.json"),
+            ChunkStore(path("chunks.sqlite3")),
+            ann_index_path=path("ann.index"),
+            ann_meta_path=path("ann.json"),
+            legacy_index_path=path("faiss_index.index"),
+            legacy_docs_path=path("documents.json"),
+        )
+        self.encoder = HashEncoder()
+        for name, value in {
+            "_store": self.store,
+            "_tenant_stores": OrderedDict(),
+            "TENANT_SHARDS_DIR": path("tenants"),
+            "VECTORS_PATH": path("vectors.f32"),
+            "VECTORS_HEADER_PATH": path("vectors.json"),
+            "INDEX_PATH": path("faiss_index.index"),
+            "DOCS_PATH": path("documents.json"),
+            "_embedding_cache": None,
+            "_query_batcher": None,
+            "get_model": lambda: self.encoder,
+        }.items():
+            patcher = mock.patch.object(embedding_store, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def texts(self, results):
+        return [r["text"] for r in results]
+
+
+class ChatbotAppMixin:
+    """
+    Install the chatbot app for a TestCase (it is optional in settings.py) and
+    create its table, which the test database was migrated without.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        cls._chatbot_settings = None
+        if not apps.is_installed("chatbot"):
+            cls._chatbot_settings = modify_settings(INSTALLED_APPS={"append": "chatbot"})
+            cls._chatbot_settings.enable()
+            from chatbot.models import UploadedDocument
+            # Outside the class transaction: SQLite can't alter schema inside one
+            with connection.schema_editor() as editor:
+                editor.create_model(UploadedDocument)
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        if cls._chatbot_settings is not None:
+            from chatbot.models import UploadedDocument
+            with connection.schema_editor() as editor:
+                editor.delete_model(UploadedDocument)
+            cls._chatbot_settings.disable()
+
+
+# --- Multi-process stress run ------------------------------------------------
+# Run in spawned children whose VECTOR_STORE_DIR is the parent's scratch
+# directory, so every process writes and maps the same files.
+
+SEED_DOC = 0
+
+
+def stress_chunks(doc_id, version, parts=3):
+    """One version of a document: chunks that name their doc, version and part."""
+    return doc_chunks(doc_id, [
+        f"doc{doc_id} v{version} part{i} " + " ".join(f"w{doc_id * 31 + version * 7 + i + j}" for j in range(6))
+        for i in range(parts)
+    ])
+
+
+def stress_docs(writer, docs_per_writer):
+    return [1 + writer * docs_per_writer + i for i in range(docs_per_writer)]
+
+
+def stress_final_version(doc_id):
+    """Version a document ends at after stress_writer (None: removed)."""
+    if doc_id == SEED_DOC:
+        return 1
+    if doc_id % 3 == 0:
+        return None
+    return 2 if doc_id % 2 == 0 else 1
+
+
+def stress_writer(writer, docs_per_writer):
+    """Add every document, then replace or remove some, through the public write functions."""
+    encoder = HashEncoder()
+    embedding_store.get_model = lambda: encoder
+    docs = stress_docs(writer, docs_per_writer)
+    for doc_id in docs:
+        embedding_store.add_documents(*stress_chunks(doc_id, 1))
+    for doc_id in docs:
+        version = stress_final_version(doc_id)
+        if version is None:
+            embedding_store.remove_document(doc_id)
+        elif version == 2:
+            embedding_store.replace_document(doc_id, *stress_chunks(doc_id, 2))
+
+
+def stress_reader(rounds):
+    """Query the seed document while the writers run; its chunks must keep resolving to themselves."""
+    encoder = HashEncoder()
+    embedding_store.get_model = lambda: encoder
+    texts, _ = stress_chunks(SEED_DOC, 1)
+    for r in range(rounds):
+        text = texts[r % len(texts)]
+        hits = embedding_store.query(text, top_k=1, hybrid=False)
+        if [h["text"] for h in hits] != [text]:
+            raise AssertionError(f"round {r}: query for {text!r} returned {hits!r}")
+    return rounds
@@ -0,0 +1,82 @@
+import math
+from collections import OrderedDict
+from unittest import mock
+
+import numpy as np
+from django.test import SimpleTestCase
+
+from chatbot.utils import answer_cache
+from chatbot.utils.answer_cache import SemanticAnswerCache
+
+
+def at_angle(degrees, scale=1.0):
+    """A 3-d vector `degrees` away from the x axis (cosine distance 1 - cos)."""
+    r = math.radians(degrees)
+    return np.array([math.cos(r), math.sin(r), 0.0], dtype="float32") * scale
+
+
+class SemanticAnswerCacheTests(SimpleTestCase):
+    def setUp(self):
+        # 0.05 cosine distance is about 18 degrees
+        self.cache = SemanticAnswerCache(max_entries=3, ttl=60, max_distance=0.05)
+
+    def test_hit_within_max_distance(self):
+        self.cache.store(at_angle(0), 1, "reply", ["a.pdf"])
+
+        hit = self.cache.lookup(at_angle(10, scale=3.0), 1)
+        self.assertEqual((hit["reply"], hit["sources"]), ("reply", ["a.pdf"]))
+        self.assertAlmostEqual(hit["distance"], 1 - math.cos(math.radians(10)), places=5)
+
+    def test_miss_beyond_max_distance(self):
+        self.cache.store(at_angle(0), 1, "reply", [])
+
+        self.assertIsNone(self.cache.lookup(at_angle(25), 1))
+        self.assertEqual(self.cache.stats()["misses"], 1)
+
+    def test_nearest_entry_wins(self):
+        self.cache.store(at_angle(0), 1, "far", [])
+        self.cache.store(at_angle(12), 1, "near", [])
+
+        self.assertEqual(self.cache.lookup(at_angle(10), 1)["reply"], "near")
+
+    def test_least_recently_used_is_evicted(self):
+        for i, angle in enumerate((0, 90, 180)):
+            self.cache.store(at_angle(angle), 1, f"r{i}", [])
+        self.cache.lookup(at_angle(0), 1)  # r0 is now the most recent
+        self.cache.store(at_angle(270), 1, "r3", [])
+
+        self.assertEqual(self.cache.stats()["entries"], 3)
+        self.assertIsNone(self.cache.lookup(at_angle(90), 1))
+        self.assertEqual([self.cache.lookup(at_angle(a), 1)["reply"] for a in (0, 180, 270)], ["r0", "r2", "r3"])
+
+    def test_new_generation_clears(self):
+        self.cache.store(at_angle(0), (1, 7), "reply", [])
+
+        self.assertIsNone(self.cache.lookup(at_angle(0), (2, 7)))
+        self.assertEqual(self.cache.stats()["entries"], 0)
+        # Storing under the new generation works again
+        self.cache.store(at_angle(0), (2, 7), "fresh", [])
+        self.assertEqual(self.cache.lookup(at_angle(0), (2, 7))["reply"], "fresh")
+
+    def test_entries_expire(self):
+        with mock.patch.object(answer_cache.time, "time", return_value=1000.0):
+            self.cache.store(at_angle(0), 1, "reply", [])
+        with mock.patch.object(answer_cache.time, "time", return_value=1061.0):
+            self.assertIsNone(self.cache.lookup(at_angle(0), 1))
+
+
+class ScopeTests(SimpleTestCase):
+    def setUp(self):
+        patcher = mock.patch.object(answer_cache, "_answer_caches", OrderedDict())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_scopes_are_separate(self):
+        answer_cache.get_answer_cache("public").store(at_angle(0), 1, "public reply", [])
+
+        self.assertIsNone(answer_cache.get_answer_cache("tenant:1").lookup(at_angle(0), 1))
+        self.assertIs(answer_cache.get_answer_cache("public"), answer_cache.get_answer_cache("public"))
+
+    def test_disabled(self):
+        with mock.patch.object(answer_cache, "ANSWER_CACHE_ENABLED", False):
+            self.assertIsNone(answer_cache.get_answer_cache())
@@ -0,0 +1,199 @@
+import asyncio
+import gc
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from chatbot.utils import model_inference
+from chatbot.utils.http_client import CircuitBreaker, CircuitOpenError, backoff_delay, build_session
+
+# setUp patches time.sleep (the module is shared) to record backoff delays
+real_sleep = time.sleep
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, so connection reuse is observable
+
+    def do_POST(self):
+        server = self.server
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        real_sleep(server.delay)
+        with server.lock:
+            server.requests.append(self.client_address[1])
+            status = server.statuses.pop(0) if server.statuses else 200
+        body = json.dumps([{"generated_text": "stub answer"}] if status == 200 else {"error": "busy"}).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class HFClientTests(SimpleTestCase):
+    """_call_hf_api against a local stub server: retries, backoff, circuit breaker, pooling."""
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+        self.server.lock = threading.Lock()
+        self.server.requests = []   # client port of each request
+        self.server.statuses = []   # scripted statuses, then 200
+        self.server.delay = 0.0     # seconds before each response
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+        self.delays = []
+        self.breaker = CircuitBreaker("test", threshold=2, cooldown=0.2)
+        session = build_session(2)
+        self.addCleanup(session.close)
+        for patcher in (
+            mock.patch.object(model_inference, "HF_API_URL", f"http://127.0.0.1:{self.server.server_port}/"),
+            mock.patch.object(model_inference, "HF_MAX_RETRIES", 3),
+            mock.patch.object(model_inference, "HF_TOTAL_TIMEOUT", 10.0),
+            mock.patch.object(model_inference, "_session", session),
+            mock.patch.object(model_inference, "_breaker", self.breaker),
+            mock.patch.object(model_inference.time, "sleep", self.delays.append),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_retries_transient_statuses_then_succeeds(self):
+        self.server.statuses = [503, 429]
+        self.assertEqual(model_inference.generate_answer("q"), "stub answer")
+        self.assertEqual(len(self.server.requests), 3)
+        self.assertEqual(len(self.delays), 2)
+
+    def test_gives_up_after_max_retries(self):
+        self.server.statuses = [503] * 10
+        resp = model_inference._call_hf_api("q", 10)
+        self.assertEqual(resp.status_code, 503)
+        self.assertEqual(len(self.server.requests), 1 + model_inference.HF_MAX_RETRIES)
+
+    def test_client_errors_are_not_retried(self):
+        self.server.statuses = [400]
+        self.assertEqual(model_inference._call_hf_api("q", 10).status_code, 400)
+        self.assertEqual(len(self.server.requests), 1)
+        self.assertEqual(self.breaker.state, "closed")
+
+    def test_backoff_is_jittered_exponential_and_capped(self):
+        for attempt in range(8):
+            for _ in range(50):
+                self.assertTrue(0 <= backoff_delay(attempt, 0.5, 4.0) <= min(4.0, 0.5 * 2 ** attempt))
+        self.server.statuses = [503] * 3
+        with mock.patch.object(model_inference, "HF_BACKOFF_BASE", 0.01), \
+                mock.patch.object(model_inference, "HF_BACKOFF_MAX", 0.02):
+            model_inference._call_hf_api("q", 10)
+        self.assertEqual(len(self.delays), 3)
+        self.assertTrue(all(0 <= d <= 0.02 for d in self.delays))
+
+    def test_breaker_opens_then_half_opens(self):
+        self.server.statuses = [503] * 8  # two exhausted calls: two failures
+        model_inference._call_hf_api("q", 10)
+        model_inference._call_hf_api("q", 10)
+        self.assertEqual(self.breaker.state, "open")
+
+        sent = len(self.server.requests)
+        with self.assertRaises(CircuitOpenError):
+            model_inference._call_hf_api("q", 10)
+        self.assertEqual(len(self.server.requests), sent)  # rejected without a request
+
+        real_sleep(0.25)
+        self.assertEqual(self.breaker.state, "half-open")
+        self.assertTrue(self.breaker.allow())    # the one trial call
+        self.assertFalse(self.breaker.allow())   # everyone else waits for it
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, "open")
+
+        real_sleep(0.25)
+        self.server.statuses = []
+        self.assertEqual(model_inference._call_hf_api("q", 10).status_code, 200)
+        self.assertEqual(self.breaker.state, "closed")
+
+    def open_then_cool_down(self):
+        self.server.statuses = [503] * 8
+        model_inference._call_hf_api("q", 10)
+        model_inference._call_hf_api("q", 10)
+        self.assertEqual(self.breaker.state, "open")
+        real_sleep(0.25)
+        self.assertEqual(self.breaker.state, "half-open")
+        self.server.statuses = []
+
+    def test_cancelled_async_trial_is_released(self):
+        self.open_then_cool_down()
+        self.server.delay = 1.0
+
+        async def cancel_trial():
+            task = asyncio.ensure_future(model_inference._acall_hf_api("q", 10))
+            await asyncio.sleep(0.2)  # the trial request is in flight
+            self.assertFalse(self.breaker.allow())
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+
+        asyncio.run(cancel_trial())
+        self.assertEqual(self.breaker.state, "half-open")
+        self.assertTrue(self.breaker.allow())  # the next caller gets the trial
+
+    def test_unexpected_error_releases_trial(self):
+        self.open_then_cool_down()
+        with mock.patch.object(model_inference._session, "post", side_effect=RuntimeError("boom")):
+            with self.assertRaises(RuntimeError):
+                model_inference._call_hf_api("q", 10)
+        self.server.delay = 0.0
+        self.assertEqual(model_inference._call_hf_api("q", 10).status_code, 200)
+        self.assertEqual(self.breaker.state, "closed")
+
+    def test_session_reuses_one_connection(self):
+        for _ in range(3):
+            self.assertEqual(model_inference._call_hf_api("q", 10).status_code, 200)
+        self.assertEqual(len(set(self.server.requests)), 1)
+
+    def test_retried_stream_responses_are_closed(self):
+        self.server.statuses = [503, 503]
+        responses = []
+        post = model_inference._session.post
+
+        def recording_post(*args, **kwargs):
+            responses.append(post(*args, **kwargs))
+            return responses[-1]
+
+        with mock.patch.object(model_inference._session, "post", recording_post):
+            resp = model_inference._call_hf_api("q", 10, stream=True)
+        with resp:
+            self.assertEqual(resp.status_code, 200)
+            self.assertEqual(len(responses), 3)
+            # Rejected streams were closed before retrying; the returned one is still open
+            self.assertTrue(all(r.raw.closed for r in responses[:-1]))
+            self.assertFalse(resp.raw.closed)
+
+
+class AsyncClientTests(SimpleTestCase):
+    """_get_async_client keeps one client per event loop and closes it with the loop."""
+
+    def test_one_client_per_loop_closed_at_shutdown(self):
+        async def get_twice():
+            first = model_inference._get_async_client()
+            self.assertIs(model_inference._get_async_client(), first)
+            return first
+
+        first = asyncio.run(get_twice())
+        second = asyncio.run(get_twice())
+        self.assertIsNot(first, second)
+        self.assertTrue(first.is_closed)
+        self.assertTrue(second.is_closed)
+
+    def test_closer_survives_garbage_collection(self):
+        async def closers_after_collect():
+            model_inference._get_async_client()
+            await asyncio.sleep(0)  # let the closer park
+            gc.collect()  # ...where only the loop's weak reference reaches it
+            return [t for t in asyncio.all_tasks() if t.get_coro().__name__ == "_close_on_shutdown"]
+
+        self.assertEqual(len(asyncio.run(closers_after_collect())), 1)
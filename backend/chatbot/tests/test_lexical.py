@@ -0,0 +1,140 @@
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+import numpy as np
+from django.test import SimpleTestCase
+
+from chatbot.tests.helpers import TempVectorStoreMixin, doc_chunks
+from chatbot.utils import embedding_store, lexical
+from chatbot.utils.chunk_store import ChunkStore
+
+CORPUS = [
+    "alpha beta gamma",
+    "alpha alpha beta",
+    "beta gamma delta",
+    "epsilon zeta eta",
+]
+NO_IDS = np.empty(0, dtype="int64")
+
+
+def segments_for(texts, start_id=0):
+    by_term, lengths = lexical.build_postings(start_id, texts)
+    return {t: lexical.encode(p) for t, p in by_term.items()}, lengths
+
+
+def search(query, texts=CORPUS, deleted=NO_IDS, limit=10, visible=None):
+    segments, lengths = segments_for(texts)
+    terms = lexical.tokenize(query)
+    ids, scores = lexical.bm25(
+        [(t, segments[t]) for t in terms if t in segments], len(texts), sum(lengths), limit,
+        len(texts) if visible is None else visible, deleted,
+    )
+    return ids.tolist(), scores.tolist()
+
+
+class TokenizeTests(SimpleTestCase):
+    def test_lowercases_and_drops_stopwords_and_punctuation(self):
+        self.assertEqual(lexical.tokenize("What is the Pro_plan price? $49/month"),
+                         ["pro", "plan", "price", "49", "month"])
+
+    def test_drops_overlong_terms(self):
+        self.assertEqual(lexical.tokenize("ok " + "x" * (lexical.MAX_TERM_LENGTH + 1)), ["ok"])
+        self.assertEqual(lexical.tokenize(None), [])
+
+
+class BM25Tests(SimpleTestCase):
+    def test_term_frequency_ranks_higher(self):
+        ids, scores = search("alpha")
+        self.assertEqual(ids, [1, 0])
+        self.assertGreater(scores[0], scores[1])
+
+    def test_rare_terms_outweigh_common_ones(self):
+        # delta is in one row, beta in three: the delta row wins on one match
+        self.assertEqual(search("beta delta")[0][0], 2)
+        self.assertEqual(search("epsilon")[0], [3])
+        self.assertEqual(search("omega")[0], [])
+
+    def test_limit_keeps_the_best(self):
+        self.assertEqual(search("alpha beta gamma delta", limit=2)[0], search("alpha beta gamma delta")[0][:2])
+
+    def test_deleted_and_unpublished_rows_are_excluded(self):
+        self.assertEqual(search("alpha", deleted=np.array([1]))[0], [0])
+        self.assertEqual(sorted(search("beta", visible=2)[0]), [0, 1])
+
+    def test_merged_segments_score_like_one(self):
+        first, _ = segments_for(CORPUS[:2])
+        second, _ = segments_for(CORPUS[2:], start_id=2)
+        merged = lexical.decode(lexical.merge([first["beta"], second["beta"]]))
+        whole, _ = segments_for(CORPUS)
+        self.assertEqual(merged.tolist(), lexical.decode(whole["beta"]).tolist())
+
+
+class RRFTests(SimpleTestCase):
+    def test_items_in_both_rankings_come_first(self):
+        self.assertEqual(lexical.rrf([["a", "b", "c"], ["c", "d"]]), ["c", "a", "b", "d"])
+
+    def test_single_ranking_is_unchanged(self):
+        self.assertEqual(lexical.rrf([[3, 1, 2]]), [3, 1, 2])
+        self.assertEqual(lexical.rrf([]), [])
+
+
+class ChunkStorePostingsTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp(prefix="postings-test-")
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        self.chunks = ChunkStore(os.path.join(directory, "chunks.sqlite3"))
+
+    def test_appends_add_segments_until_merged(self):
+        for i in range(lexical.LEX_MAX_SEGMENTS + 3):
+            self.chunks.append(i, [f"alpha row{i}"], [{"doc_id": i}])
+
+        segments = self.chunks.postings(["alpha"])
+        self.assertLessEqual(len(segments), lexical.LEX_MAX_SEGMENTS)
+        ids = sorted(i for _, blob in segments for i in lexical.decode(blob)["id"].tolist())
+        self.assertEqual(ids, list(range(lexical.LEX_MAX_SEGMENTS + 3)))
+        self.assertEqual(self.chunks.document_frequencies(["alpha", "row0", "omega"]),
+                         {"alpha": lexical.LEX_MAX_SEGMENTS + 3, "row0": 1, "omega": 0})
+
+    def test_tombstoned_rows_are_not_scored(self):
+        texts, metas = doc_chunks(1, CORPUS[:2])
+        more_texts, more_metas = doc_chunks(2, CORPUS[2:])
+        self.chunks.append(0, texts + more_texts, metas + more_metas)
+        self.chunks.tombstone_doc(1)
+
+        docs, total = self.chunks.lexical_stats()
+        ids, _ = lexical.bm25(
+            self.chunks.postings(["alpha", "beta"]), docs, total, 10, 4,
+            np.asarray(self.chunks.tombstones(), dtype="int64"),
+        )
+        self.assertEqual(ids.tolist(), [2])
+
+
+class KeywordOnlySearchTests(TempVectorStoreMixin, SimpleTestCase):
+    """Without an embedding model, hybrid search falls back to BM25 alone (q_emb=None)."""
+
+    def setUp(self):
+        super().setUp()
+        embedding_store.build_index(*doc_chunks(1, ["The Pro plan costs 49 per month", "Refunds take 5 days"]))
+        embedding_store.add_documents(*doc_chunks(2, ["Error code E4471 means the card was declined"]))
+        patcher = mock.patch.object(embedding_store, "get_model", return_value=None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_exact_terms_are_found(self):
+        self.assertEqual(self.texts(embedding_store.query("what does E4471 mean", top_k=1, hybrid=True)),
+                         ["Error code E4471 means the card was declined"])
+        self.assertEqual(self.texts(embedding_store.query("pro plan price", top_k=1, hybrid=True)),
+                         ["The Pro plan costs 49 per month"])
+
+    def test_fusion_of_a_single_ranking_keeps_bm25_order(self):
+        stores = [self.store]
+        hits = embedding_store._keyword_hits(stores, [self.store.snapshot()], "plan refunds days", 10)
+        results = embedding_store._search_shards(stores, None, 10, "plan refunds days")
+        self.assertEqual([(0, i) for i in self.store.chunks.ids_for_doc(1)[::-1]], hits)
+        self.assertEqual(self.texts(results), ["Refunds take 5 days", "The Pro plan costs 49 per month"])
+
+    def test_tombstoned_documents_are_excluded(self):
+        embedding_store.remove_document(2)
+        self.assertEqual(embedding_store.query("E4471", hybrid=True), [])
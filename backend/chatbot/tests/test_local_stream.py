@@ -0,0 +1,49 @@
+from types import SimpleNamespace
+from unittest import mock
+
+import numpy as np
+from django.test import SimpleTestCase
+
+from chatbot.utils import model_inference
+
+
+class FakeTokenizer:
+    def __call__(self, prompt, **kwargs):
+        return {}
+
+    def decode(self, tokens, **kwargs):
+        return " ".join(str(t) for t in tokens)
+
+
+class LocalStreamTests(SimpleTestCase):
+    """_stream_local with a stand-in model: errors and stalls reach the consumer."""
+
+    def stream(self, generate):
+        pipe = SimpleNamespace(tokenizer=FakeTokenizer(), model=SimpleNamespace(generate=generate))
+        with mock.patch.object(model_inference, "_get_local_pipeline", return_value=pipe), \
+                mock.patch.object(model_inference, "LOCAL_STREAM_TIMEOUT", 0.5):
+            return list(model_inference._stream_local("q", 10))
+
+    def test_generate_error_is_raised_in_consumer(self):
+        def generate(**kwargs):
+            raise RuntimeError("out of memory")
+
+        with self.assertRaisesMessage(RuntimeError, "out of memory"):
+            self.stream(generate)
+
+    def test_error_after_partial_output(self):
+        def generate(streamer, **kwargs):
+            streamer.put(np.array([1]))  # the prompt, skipped
+            streamer.put(np.array([2]))
+            raise RuntimeError("device lost")
+
+        with self.assertRaisesMessage(RuntimeError, "device lost"):
+            self.stream(generate)
+
+    def test_completed_generation(self):
+        def generate(streamer, **kwargs):
+            streamer.put(np.array([1]))
+            streamer.put(np.array([2]))
+            streamer.end()
+
+        self.assertEqual("".join(self.stream(generate)).strip(), "2")
@@ -0,0 +1,73 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.test import TestCase, override_settings
+
+from chatbot.tests.helpers import ChatbotAppMixin, TempVectorStoreMixin, doc_chunks
+from chatbot.utils import embedding_store
+
+
+class DocumentSignalTests(ChatbotAppMixin, TempVectorStoreMixin, TestCase):
+    """UploadedDocument saves and deletes reach the owner's shard through chatbot/signals.py."""
+
+    def setUp(self):
+        super().setUp()
+        from chatbot import tasks
+        from chatbot.models import UploadedDocument
+
+        enqueue = mock.patch.object(tasks, "enqueue")
+        self.enqueue = enqueue.start()
+        self.addCleanup(enqueue.stop)
+        settings_patch = override_settings(MEDIA_ROOT=self.store_dir)
+        settings_patch.enable()
+        self.addCleanup(settings_patch.disable)
+        users = get_user_model().objects
+        self.owner = users.create_user("owner@example.com", None, full_name="Owner")
+        self.other = users.create_user("other@example.com", None, full_name="Other")
+        self.doc = UploadedDocument.objects.create(
+            user=self.owner, file=ContentFile(b"first", name="first.txt"),
+            status=UploadedDocument.STATUS_INDEXED,
+        )
+        embedding_store.add_documents(*doc_chunks(self.doc.pk, ["alpha bravo charlie delta"]), owner_id=self.owner.pk)
+
+    def owner_texts(self, owner_id):
+        return self.texts(embedding_store.query("alpha bravo charlie delta", owner_id=owner_id))
+
+    def test_delete_removes_the_chunks(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.doc.delete()
+
+        self.assertEqual(self.owner_texts(self.owner.pk), [])
+        self.assertEqual(embedding_store.get_store(self.owner.pk).chunks.ids_for_doc(self.doc.pk), [])
+        self.enqueue.assert_not_called()
+
+    def test_new_file_is_queued_for_reindex(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.doc.file = ContentFile(b"second", name="second.txt")
+            self.doc.save()
+
+        self.enqueue.assert_called_once_with(self.doc)
+        self.doc.refresh_from_db()
+        self.assertEqual(self.doc.status, self.doc.STATUS_PENDING)
+        # The old chunks stay searchable until the worker replaces them
+        self.assertEqual(self.owner_texts(self.owner.pk), ["alpha bravo charlie delta"])
+
+    def test_new_owner_moves_the_chunks(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.doc.user = self.other
+            self.doc.save()
+
+        self.enqueue.assert_called_once_with(self.doc)
+        self.assertEqual(self.owner_texts(self.owner.pk), [])
+
+    def test_other_field_updates_do_nothing(self):
+        with mock.patch.object(embedding_store, "remove_document") as remove, \
+                self.captureOnCommitCallbacks(execute=True):
+            self.doc.status = self.doc.STATUS_FAILED
+            self.doc.save(update_fields=["status"])
+            self.doc.content = "extracted"
+            self.doc.save()
+
+        remove.assert_not_called()
+        self.enqueue.assert_not_called()
@@ -0,0 +1,82 @@
+import random
+from types import SimpleNamespace
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from chatbot.utils import text_chunker
+from chatbot.utils.text_chunker import approx_token_counts, iter_chunks, iter_page_chunks
+
+
+def numbered_text(seed, paragraphs=60):
+    """Paragraphs of sentences whose words are w0, w1, w2, ..., with a few run-ons."""
+    rng = random.Random(seed)
+    out, n = [], 0
+    for _ in range(paragraphs):
+        sentences = []
+        for _ in range(rng.randint(1, 8)):
+            length = rng.randint(4, 40) if rng.random() > 0.05 else rng.randint(300, 800)
+            sentences.append(" ".join(f"w{n + i}" for i in range(length)) + ".")
+            n += length
+        out.append(" ".join(sentences))
+    return "\n\n".join(out), n
+
+
+class ChunkerPropertyTests(SimpleTestCase):
+    """Chunk size, coverage and overlap on numbered text, for several sizes and seeds."""
+
+    def check(self, seed, chunk_tokens, overlap_tokens):
+        text, total_words = numbered_text(seed)
+        chunks = list(iter_chunks(text, chunk_tokens, overlap_tokens, approx_token_counts))
+        expected = 0  # next w<n> the chunks must contribute
+        prev_words = []
+        for chunk in chunks:
+            self.assertLessEqual(approx_token_counts([chunk])[0], chunk_tokens)
+            words = [w.rstrip(".") for w in chunk.split()]
+            # Leading words repeated from the previous chunk are the overlap
+            shared = next(
+                (k for k in range(min(len(words), len(prev_words)), 0, -1) if words[:k] == prev_words[-k:]), 0
+            )
+            if prev_words:
+                self.assertLessEqual(approx_token_counts([" ".join(words[:shared])])[0], overlap_tokens)
+                # Overlap is only trimmed away when the new text leaves no room for it
+                if overlap_tokens and len(words) - shared <= chunk_tokens - overlap_tokens:
+                    self.assertGreater(shared, 0)
+            self.assertEqual(words[shared:], [f"w{i}" for i in range(expected, expected + len(words) - shared)])
+            expected += len(words) - shared
+            prev_words = words
+        self.assertEqual(expected, total_words)
+
+    def test_sizes_and_overlaps(self):
+        for chunk_tokens, overlap_tokens in ((126, 40), (200, 40), (64, 0), (32, 31)):
+            for seed in range(3):
+                with self.subTest(chunk_tokens=chunk_tokens, overlap_tokens=overlap_tokens, seed=seed):
+                    self.check(seed, chunk_tokens, overlap_tokens)
+
+    def test_page_ranges(self):
+        pages = [(p, numbered_text(p, paragraphs=3)[0]) for p in range(1, 6)]
+        last = 1
+        for _, first, end in iter_page_chunks(pages, 50, 10, approx_token_counts):
+            self.assertLessEqual(first, end)
+            self.assertGreaterEqual(first, last - 1)  # only the carried overlap reaches back
+            last = end
+        self.assertEqual(last, 5)
+
+
+class ChunkTokenLimitTests(SimpleTestCase):
+    """chunk_token_limit() keeps CHUNK_TOKENS within the model's input."""
+
+    def limit(self, chunk_tokens, model):
+        with mock.patch.object(text_chunker, "CHUNK_TOKENS", chunk_tokens), \
+                mock.patch.object(text_chunker, "_token_limit", None), \
+                mock.patch("chatbot.utils.embedding_store.get_model", return_value=model):
+            return text_chunker.chunk_token_limit()
+
+    def test_clamped_to_max_seq_length_minus_special_tokens(self):
+        model = SimpleNamespace(max_seq_length=128, tokenizer=SimpleNamespace(num_special_tokens_to_add=lambda: 2))
+        with self.assertLogs(text_chunker.logger, "WARNING"):
+            self.assertEqual(self.limit(200, model), 126)
+        self.assertEqual(self.limit(100, model), 100)
+
+    def test_unchanged_without_a_model(self):
+        self.assertEqual(self.limit(200, None), 200)
@@ -0,0 +1,296 @@
+import json
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from unittest import mock
+
+import faiss
+import numpy as np
+from django.test import SimpleTestCase
+
+from chatbot.tests import helpers
+from chatbot.tests.helpers import TempVectorStoreMixin, doc_chunks
+from chatbot.utils import embedding_store, vector_file
+
+OLD = ["alpha bravo charlie delta", "echo foxtrot golf hotel"]
+NEW = ["india juliet kilo lima", "mike november oscar papa"]
+OTHER = ["quebec romeo sierra tango", "uniform victor whiskey xray"]
+
+
+class ReplaceDocumentTests(TempVectorStoreMixin, SimpleTestCase):
+    def query(self, text, top_k=4):
+        return self.texts(embedding_store.query(text, top_k=top_k, hybrid=False))
+
+    def test_replaces_rows_of_a_legacy_store(self):
+        # A store from before the mapped matrix: faiss_index.index + documents.json
+        texts, metas = doc_chunks(1, OLD)
+        index = faiss.IndexFlatL2(self.encoder.dim)
+        index.add(self.encoder.encode(texts))
+        faiss.write_index(index, embedding_store.INDEX_PATH)
+        with open(embedding_store.DOCS_PATH, "w", encoding="utf-8") as f:
+            json.dump([{"text": t, "meta": m} for t, m in zip(texts, metas)], f)
+
+        embedding_store.replace_document(1, *doc_chunks(1, NEW))
+
+        self.assertEqual(self.store.chunks.ids_for_doc(1), [2, 3])
+        self.assertEqual(self.store.chunks.tombstones(), [0, 1])
+        for text in OLD:
+            self.assertNotIn(text, self.query(text))
+        self.assertEqual(self.query(NEW[0], top_k=1), [NEW[0]])
+
+    def test_rebuild_keeps_the_new_rows(self):
+        # Chunk rows but no matrix (e.g. it was removed): nothing to append to
+        embedding_store.build_index(*doc_chunks(1, OLD))
+        vector_file.remove_matrix(self.store.vectors_path, self.store.header_path)
+
+        embedding_store.replace_document(1, *doc_chunks(1, NEW))
+
+        self.assertEqual(self.store.chunks.ids_for_doc(1), [0, 1])
+        self.assertEqual(self.store.chunks.tombstones(), [])
+        self.assertEqual(sorted(self.query(NEW[0])), sorted(NEW))
+
+    def test_replaces_only_that_document(self):
+        embedding_store.build_index(*[a + b for a, b in zip(doc_chunks(1, OLD), doc_chunks(2, OTHER))])
+
+        embedding_store.replace_document(1, *doc_chunks(1, NEW))
+
+        self.assertEqual(sorted(self.query(NEW[0])), sorted(NEW + OTHER))
+
+
+
+class RemovalTests(TempVectorStoreMixin, SimpleTestCase):
+    """Tombstoned rows stay out of results until compact() drops them from disk."""
+
+    def setUp(self):
+        super().setUp()
+        # Doc 1's chunks share most words with the query, so they fill the top k
+        self.near = [f"red green blue cyan part{i}" for i in range(8)]
+        texts, metas = doc_chunks(1, self.near)
+        for doc_id, words in ((2, OLD), (3, NEW), (4, OTHER)):
+            more_texts, more_metas = doc_chunks(doc_id, words)
+            texts, metas = texts + more_texts, metas + more_metas
+        embedding_store.build_index(texts, metas)
+
+    def test_removed_document_never_comes_back(self):
+        self.assertEqual(embedding_store.remove_document(1), len(self.near))
+
+        for hybrid in (False, True):
+            with self.subTest(hybrid=hybrid):
+                results = embedding_store.query("red green blue cyan part0", top_k=5, hybrid=hybrid)
+                self.assertTrue(results)
+                self.assertNotIn(1, {r["meta"]["doc_id"] for r in results})
+        # Nor after an append re-maps the store
+        embedding_store.add_documents(*doc_chunks(5, ["red green blue cyan again"]))
+        results = embedding_store.query("red green blue cyan part0", top_k=5)
+        self.assertNotIn(1, {r["meta"]["doc_id"] for r in results})
+
+    def test_search_over_fetches_past_tombstones(self):
+        embedding_store.remove_document(1)
+        snap = self.store.snapshot()
+        q_emb = embedding_store.encode_query("red green blue cyan part0")
+
+        D, I = embedding_store._search(snap, q_emb, 3)
+        self.assertEqual(I.shape, (1, 3))
+        self.assertTrue((I >= 0).all())
+        self.assertFalse(np.isin(I, snap.deleted).any())
+        self.assertTrue(np.isfinite(D).all())
+
+    def test_drop_deleted_keeps_order_and_pads(self):
+        D = np.array([[0.1, 0.2, 0.3, 0.4]], dtype="float32")
+        I = np.array([[7, 3, 9, 5]])
+
+        D2, I2 = embedding_store._drop_deleted(D, I, np.array([3, 5]), 3)
+        self.assertEqual(I2.tolist(), [[7, 9, -1]])
+        self.assertEqual(D2[0, :2].tolist(), [D[0, 0], D[0, 2]])
+        self.assertEqual(D2[0, 2], np.inf)
+
+    def test_compact_keeps_rows_aligned_with_vectors(self):
+        embedding_store.remove_document(1)
+        embedding_store.remove_document(3)
+
+        self.assertEqual(embedding_store.compact(self.store), len(self.near) + len(NEW))
+        snap = self.store.snapshot()
+        self.assertEqual(len(snap.deleted), 0)
+        rows = self.store.chunks.get_rows(range(snap.vectors.shape[0]), epoch=snap.epoch)
+        self.assertEqual([i for i, _ in rows], list(range(snap.vectors.shape[0])))
+        self.assertEqual(sorted(r["text"] for _, r in rows), sorted(OLD + OTHER))
+        texts = [r["text"] for _, r in rows]
+        np.testing.assert_allclose(
+            snap.vectors, embedding_store._normalize(self.encoder.encode(texts)), atol=1e-6
+        )
+        for text in texts:
+            self.assertEqual(self.texts(embedding_store.query(text, top_k=1, hybrid=False)), [text])
+
+
+class RecoverTests(TempVectorStoreMixin, SimpleTestCase):
+    """A rebuild that died between prepare() and publish() is finished or undone by the next writer."""
+
+    def setUp(self):
+        super().setUp()
+        embedding_store.build_index(*doc_chunks(1, OLD))
+        self.epoch = vector_file.epoch_of(vector_file.read_header(self.store.header_path))
+
+    def crash_rebuild(self, target, attribute):
+        builder = embedding_store.IndexBuilder(store=self.store)
+        builder.add(*doc_chunks(1, NEW))
+        with mock.patch.object(target, attribute, side_effect=RuntimeError("killed")):
+            with self.assertRaises(RuntimeError):
+                builder.commit()
+        self.assertIsNotNone(vector_file.read_pending(self.store.header_path))
+
+    def current(self):
+        with embedding_store._writing(self.store):
+            pass
+        self.assertIsNone(vector_file.read_pending(self.store.header_path))
+        return vector_file.read_header(self.store.header_path)
+
+    def test_rolls_forward_when_the_chunk_table_committed(self):
+        self.crash_rebuild(vector_file.MatrixWriter, "publish")
+
+        header = self.current()
+        self.assertEqual(vector_file.epoch_of(header), self.epoch + 1)
+        self.assertEqual(self.store.chunks.epoch(), self.epoch + 1)
+        self.assertFalse(os.path.exists(vector_file.epoch_data_path(self.store.vectors_path, self.epoch)))
+        self.assertEqual(self.texts(embedding_store.query(NEW[0], top_k=1, hybrid=False)), [NEW[0]])
+
+    def test_rolls_back_when_the_chunk_table_did_not(self):
+        self.crash_rebuild(self.store.chunks, "commit_staging")
+
+        header = self.current()
+        self.assertEqual(vector_file.epoch_of(header), self.epoch)
+        self.assertEqual(self.store.chunks.epoch(), self.epoch)
+        self.assertFalse(os.path.exists(vector_file.epoch_data_path(self.store.vectors_path, self.epoch + 1)))
+        self.assertEqual(self.texts(embedding_store.query(OLD[0], top_k=1, hybrid=False)), [OLD[0]])
+
+
+class EpochTests(TempVectorStoreMixin, SimpleTestCase):
+    """Chunk rows resolve against the epoch a snapshot was opened at, or not at all."""
+
+    def rebuild(self, texts):
+        embedding_store.build_index(*doc_chunks(1, texts))
+        return self.store.chunks.epoch()
+
+    def test_get_rows_keeps_the_current_and_previous_epoch(self):
+        first = self.rebuild(OLD)
+        second = self.rebuild(NEW)
+        self.assertEqual([r["text"] for _, r in self.store.chunks.get_rows([0], epoch=first)], [OLD[0]])
+        self.assertEqual([r["text"] for _, r in self.store.chunks.get_rows([0], epoch=second)], [NEW[0]])
+
+        self.rebuild(OTHER)
+        self.assertIsNone(self.store.chunks.get_rows([0], epoch=first))
+        self.assertEqual([r["text"] for _, r in self.store.chunks.get_rows([0], epoch=second)], [NEW[0]])
+
+    def test_query_drops_hits_of_an_epoch_no_longer_kept(self):
+        self.rebuild(OLD)
+        stale = self.store.snapshot()
+        self.rebuild(NEW)
+        self.rebuild(OTHER)
+
+        q_emb = embedding_store.encode_query(OLD[0])
+        with mock.patch.object(self.store, "snapshot", return_value=stale):
+            self.assertEqual(embedding_store._search_shards([self.store], q_emb, 2), [])
+
+
+class MultiProcessStressTests(TempVectorStoreMixin, SimpleTestCase):
+    """
+    Writer processes add, replace and remove documents (compacting as they go)
+    while reader processes query, all against one VECTOR_STORE_DIR.
+    """
+
+    WRITERS = 3
+    READERS = 2
+    DOCS_PER_WRITER = 12
+    READER_ROUNDS = 200
+
+    def assert_consistent(self, expected):
+        self.store.invalidate()
+        snap = self.store.snapshot()
+        rows = self.store.chunks.get_rows(range(snap.vectors.shape[0]), epoch=snap.epoch)
+        self.assertEqual(sorted(r["text"] for _, r in rows), sorted(expected))
+        live = [i for i, _ in rows]
+        self.assertFalse(np.isin(live, snap.deleted).any())
+        # Every live row's vector is its own text's embedding
+        expected_vectors = embedding_store._normalize(self.encoder.encode([r["text"] for _, r in rows]))
+        np.testing.assert_allclose(snap.vectors[live], expected_vectors, atol=1e-6)
+
+    def test_concurrent_writers_and_readers(self):
+        # Seed first so every writer appends instead of rebuilding
+        embedding_store.build_index(*helpers.stress_chunks(helpers.SEED_DOC, 1))
+
+        env = {
+            "VECTOR_STORE_DIR": self.store_dir,
+            "EMBEDDING_CACHE_ENABLED": "false",
+            "QUERY_BATCHING_ENABLED": "false",
+            "TOMBSTONE_COMPACT_MIN": "4",
+            "TOMBSTONE_COMPACT_RATIO": "0",
+        }
+        with mock.patch.dict(os.environ, env), ProcessPoolExecutor(
+            self.WRITERS + self.READERS, mp_context=multiprocessing.get_context("spawn")
+        ) as pool:
+            futures = [pool.submit(helpers.stress_writer, w, self.DOCS_PER_WRITER) for w in range(self.WRITERS)]
+            futures += [pool.submit(helpers.stress_reader, self.READER_ROUNDS) for _ in range(self.READERS)]
+            for future in futures:
+                future.result(timeout=300)
+
+        expected = list(helpers.stress_chunks(helpers.SEED_DOC, 1)[0])
+        for w in range(self.WRITERS):
+            for doc_id in helpers.stress_docs(w, self.DOCS_PER_WRITER):
+                version = helpers.stress_final_version(doc_id)
+                if version is not None:
+                    expected += helpers.stress_chunks(doc_id, version)[0]
+
+        with embedding_store._writing(self.store):
+            pass  # finish or undo a compaction cut off when its process exited
+        self.assert_consistent(expected)
+        embedding_store.compact(self.store)
+        self.assert_consistent(expected)
+        self.assertEqual(len(self.store.snapshot().deleted), 0)
+
+
+class MixedMetricTests(SimpleTestCase):
+    """Shards still holding raw l2 vectors rank against normalized ip shards by cosine."""
+
+    def test_vector_hits_compare_cosines_across_metrics(self):
+        q_emb = np.array([[1.0, 0.0, 0.0]], dtype="float32")
+        # Raw row at cosine 0.8 but far away in L2 (squared distance 85)
+        raw = embedding_store.StoreSnapshot(np.array([[8.0, 6.0, 0.0]], dtype="float32"), metric="l2")
+        # Normalized row at cosine 0.6 (distance -0.6)
+        unit = embedding_store.StoreSnapshot(np.array([[0.6, 0.8, 0.0]], dtype="float32"), metric="ip")
+
+        self.assertEqual(embedding_store._vector_hits([unit, raw], q_emb, 2), [(1, 0), (0, 0)])
+        self.assertEqual(embedding_store._vector_hits([raw, unit], q_emb, 1), [(0, 0)])
+
+
+class TenantIsolationTests(TempVectorStoreMixin, SimpleTestCase):
+    """Owners search the public shard plus their own, never another owner's."""
+
+    def setUp(self):
+        super().setUp()
+        # Same words in every shard, so only the shard decides what is returned
+        self.words = "shared secret plan"
+        embedding_store.add_documents(*doc_chunks(1, [f"{self.words} public"]))
+        embedding_store.add_documents(*doc_chunks(2, [f"{self.words} of owner a"]), owner_id=10)
+        embedding_store.add_documents(*doc_chunks(3, [f"{self.words} of owner b"]), owner_id=20)
+
+    def visible(self, owner_id):
+        texts = set()
+        for hybrid in (False, True):
+            texts.update(self.texts(embedding_store.query(self.words, top_k=10, owner_id=owner_id, hybrid=hybrid)))
+        return texts
+
+    def test_owner_sees_public_and_own_chunks_only(self):
+        self.assertEqual(self.visible(10), {f"{self.words} public", f"{self.words} of owner a"})
+        self.assertEqual(self.visible(20), {f"{self.words} public", f"{self.words} of owner b"})
+
+    def test_anonymous_and_unknown_owners_see_public_only(self):
+        self.assertEqual(self.visible(None), {f"{self.words} public"})
+        self.assertEqual(self.visible(30), {f"{self.words} public"})
+        self.assertEqual(embedding_store.visible_stores(30), [self.store])
+
+    def test_shards_are_separate_stores(self):
+        a, b = embedding_store.get_store(10), embedding_store.get_store(20)
+        self.assertIsNot(a, b)
+        self.assertNotIn(b, embedding_store.visible_stores(10))
+        self.assertEqual(a.chunks.ids_for_doc(3), [])
+        self.assertEqual(embedding_store.remove_document(3, owner_id=10), 0)
+        self.assertEqual(self.visible(20), {f"{self.words} public", f"{self.words} of owner b"})
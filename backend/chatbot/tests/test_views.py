@@ -0,0 +1,119 @@
+import json
+import tempfile
+from types import SimpleNamespace
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.test import AsyncRequestFactory, RequestFactory, TestCase, override_settings
+from rest_framework.test import APIRequestFactory, force_authenticate
+from rest_framework_simplejwt.tokens import AccessToken
+from users.authentication import CookieJWTAuthentication
+
+from chatbot.tests.helpers import ChatbotAppMixin
+from chatbot.utils import tracing
+
+
+class DocumentStatusViewTests(ChatbotAppMixin, TestCase):
+    """Callers only see the status of their own uploads (anonymous: anonymous uploads)."""
+
+    def setUp(self):
+        from chatbot.models import UploadedDocument
+        from chatbot.views import DocumentStatusView
+
+        self.enterContext(override_settings(MEDIA_ROOT=self.enterContext(tempfile.TemporaryDirectory())))
+        users = get_user_model().objects
+        self.alice = users.create_user("alice@example.com", None, full_name="Alice")
+        self.bob = users.create_user("bob@example.com", None, full_name="Bob")
+        upload = lambda user: UploadedDocument.objects.create(  # noqa: E731
+            user=user, file=ContentFile(b"text", name="doc.txt")
+        )
+        self.alice_doc, self.bob_doc, self.anonymous_doc = upload(self.alice), upload(self.bob), upload(None)
+        self.view = DocumentStatusView.as_view()
+
+    def get(self, doc, user=None):
+        request = APIRequestFactory().get(f"/documents/{doc.pk}/status/")
+        if user is not None:
+            force_authenticate(request, user=user)
+        return self.view(request, pk=doc.pk)
+
+    def test_owner_sees_own_document(self):
+        response = self.get(self.alice_doc, self.alice)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["id"], self.alice_doc.pk)
+
+    def test_other_users_documents_are_not_found(self):
+        self.assertEqual(self.get(self.bob_doc, self.alice).status_code, 404)
+        self.assertEqual(self.get(self.anonymous_doc, self.alice).status_code, 404)
+
+    def test_anonymous_caller_sees_anonymous_uploads_only(self):
+        self.assertEqual(self.get(self.anonymous_doc).status_code, 200)
+        self.assertEqual(self.get(self.alice_doc).status_code, 404)
+
+
+class MetricsTests(ChatbotAppMixin, TestCase):
+    def get(self, **headers):
+        from chatbot.views import metrics
+        return metrics(RequestFactory().get("/metrics/", {"format": "json"}, headers=headers))
+
+    def test_open_in_development_without_token(self):
+        with mock.patch.object(tracing, "ENVIRONMENT", "development"), mock.patch.object(tracing, "METRICS_TOKEN", ""):
+            self.assertEqual(self.get().status_code, 200)
+
+    def test_refused_in_production_without_token(self):
+        with mock.patch.object(tracing, "ENVIRONMENT", "production"), mock.patch.object(tracing, "METRICS_TOKEN", ""):
+            self.assertEqual(self.get().status_code, 403)
+
+    def test_token_required_when_set(self):
+        with mock.patch.object(tracing, "ENVIRONMENT", "production"), \
+                mock.patch.object(tracing, "METRICS_TOKEN", "s3cret"):
+            self.assertEqual(self.get().status_code, 401)
+            self.assertEqual(self.get(Authorization="Bearer wrong").status_code, 401)
+            self.assertEqual(self.get(Authorization="Bearer s3cret").status_code, 200)
+
+
+class ChatAsyncAuthTests(ChatbotAppMixin, TestCase):
+    """chat_async authenticates like the DRF views: bad credentials are a 401, not an anonymous chat."""
+
+    def setUp(self):
+        from chatbot import views
+
+        self.views = views
+        prepare = mock.patch.object(views, "_prepare_chat", return_value={"reply": "hi", "sources": []})
+        self.prepare_chat = prepare.start()
+        self.addCleanup(prepare.stop)
+        get_user = mock.patch.object(
+            CookieJWTAuthentication, "get_user", side_effect=lambda token: SimpleNamespace(id=int(token["user_id"]))
+        )
+        get_user.start()
+        self.addCleanup(get_user.stop)
+
+    async def post(self, **headers):
+        request = AsyncRequestFactory().post(
+            "/chat/async/", {"message": "hello"}, content_type="application/json", headers=headers
+        )
+        return await self.views.chat_async(request)
+
+    async def test_anonymous_caller_searches_public_shard(self):
+        response = await self.post()
+        self.assertEqual(response.status_code, 200)
+        self.prepare_chat.assert_called_once_with("hello", None)
+
+    async def test_valid_token_searches_owner_shard(self):
+        token = AccessToken.for_user(SimpleNamespace(id=42))
+        response = await self.post(Authorization=f"Bearer {token}")
+        self.assertEqual(response.status_code, 200)
+        self.prepare_chat.assert_called_once_with("hello", 42)
+
+    async def test_malformed_credentials_are_rejected(self):
+        response = await self.post(Authorization="Bearer two parts")
+        self.assertEqual(response.status_code, 401)
+        self.assertIn("WWW-Authenticate", response)
+        self.assertIn("detail", json.loads(response.content))
+        self.prepare_chat.assert_not_called()
+
+    async def test_unexpected_errors_are_not_swallowed(self):
+        with mock.patch.object(CookieJWTAuthentication, "authenticate", side_effect=RuntimeError("db down")):
+            with self.assertRaises(RuntimeError):
+                await self.post(Authorization="Bearer token")
+        self.prepare_chat.assert_not_called()
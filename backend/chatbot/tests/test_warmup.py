@@ -0,0 +1,45 @@
+import importlib.util
+import os
+from unittest import mock
+
+from django.conf import settings
+from django.test import SimpleTestCase
+
+from chatbot.utils import warmup
+
+
+def load_gunicorn_conf():
+    path = os.path.join(settings.BASE_DIR, "gunicorn.conf.py")
+    spec = importlib.util.spec_from_file_location("gunicorn_conf", path)
+    module = importlib.util.module_from_spec(spec)
+    with mock.patch.dict(os.environ):  # it sets a WARMUP_MODE default
+        spec.loader.exec_module(module)
+    return module
+
+
+class ReadinessTests(SimpleTestCase):
+    def setUp(self):
+        patcher = mock.patch.dict(warmup._state, {"status": "pending", "steps": {}})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_only_finished_or_skipped_is_ready(self):
+        for status, ready in (("pending", False), ("running", False), ("failed", False),
+                              ("ready", True), ("skipped", True)):
+            with self.subTest(status=status):
+                warmup._state["status"] = status
+                self.assertIs(warmup.is_ready(), ready)
+
+    def test_gunicorn_master_warms_up_inline_in_background_mode(self):
+        conf = load_gunicorn_conf()
+        with mock.patch.object(warmup, "WARMUP_MODE", "background"), \
+                mock.patch("django.apps.apps.is_installed", return_value=True), \
+                mock.patch.object(warmup, "_load_model"), mock.patch.object(warmup, "_load_index"), \
+                mock.patch.object(warmup, "_load_prompt_tokenizer"), mock.patch("gc.freeze"), \
+                mock.patch.object(warmup.threading, "Thread") as thread:
+            conf.when_ready(server=None)
+
+        # Finished before when_ready returns, so forked workers inherit "ready"
+        thread.assert_not_called()
+        self.assertEqual(warmup.status()["status"], "ready")
+        self.assertTrue(warmup.is_ready())
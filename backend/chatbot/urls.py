@@ -1,7 +1,14 @@
 from django.urls import path
-from .views import ChatView, DocumentUploadView
+from .views import (
+    ChatView, ChatStreamView, chat_async, DocumentUploadView, DocumentStatusView, ReadinessView, metrics,
+)
 
 urlpatterns = [
     path('chat/', ChatView.as_view(), name='chat'),
+    path('chat/stream/', ChatStreamView.as_view(), name='chat-stream'),
+    path('chat/async/', chat_async, name='chat-async'),
     path('upload/', DocumentUploadView.as_view(), name='upload'),
+    path('documents/<int:pk>/status/', DocumentStatusView.as_view(), name='document-status'),
+    path('ready/', ReadinessView.as_view(), name='ready'),
+    path('metrics/', metrics, name='metrics'),
 ]
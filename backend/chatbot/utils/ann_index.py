@@ -0,0 +1,201 @@
+# backend/chatbot/utils/ann_index.py
+#
+# Approximate nearest-neighbour index factory for the vector store.
+#
+# The raw vector matrix (vectors.f32) stays the source of truth. An ANN index
+# is trained and filled from it at build time and covers its first `count`
+# rows; rows appended later are scanned exactly until the next rebuild.
+# Each build is written to its own file, named in ann.json together with the
+# matrix epoch it was built from, so a reader never pairs an index with the
+# wrong metadata or with another epoch's rows.
+#
+# VECTOR_STORAGE picks how the index stores vectors: float32, or compressed
+# as float16 / int8 (scalar quantization) or PQ codes. A compressed index is
+# built even with VECTOR_INDEX_TYPE=flat (an exhaustive scan over the codes),
+# so searches touch 2-4x (SQ) or ~30x (PQ) less memory than the float32
+# matrix, which is then only read for the tail, rebuilds and compaction.
+
+import os
+import json
+import logging
+from typing import Dict, Any, Optional
+
+import numpy as np
+import faiss
+
+logger = logging.getLogger(__name__)
+
+# flat | ivf_flat | ivf_pq | hnsw
+INDEX_TYPE = os.getenv("VECTOR_INDEX_TYPE", "flat").lower()
+INDEX_TYPES = ("flat", "ivf_flat", "ivf_pq", "hnsw")
+
+# float32 | float16 | int8 | pq
+VECTOR_STORAGE = os.getenv("VECTOR_STORAGE", "float32").lower()
+STORAGE_TYPES = ("float32", "float16", "int8", "pq")
+
+# Build-time parameters (0 = pick from corpus size)
+IVF_NLIST = int(os.getenv("IVF_NLIST", "0"))
+PQ_M = int(os.getenv("PQ_M", "16"))
+HNSW_M = int(os.getenv("HNSW_M", "32"))
+HNSW_EF_CONSTRUCTION = int(os.getenv("HNSW_EF_CONSTRUCTION", "80"))
+TRAIN_SAMPLE_SIZE = int(os.getenv("ANN_TRAIN_SAMPLE_SIZE", "50000"))
+
+# Query-time tuning
+IVF_NPROBE = int(os.getenv("IVF_NPROBE", "8"))
+HNSW_EF_SEARCH = int(os.getenv("HNSW_EF_SEARCH", "64"))
+
+# Smallest corpus worth an ANN index; below this a flat scan is faster anyway
+MIN_ANN_VECTORS = int(os.getenv("ANN_MIN_VECTORS", "1000"))
+
+
+def _auto_nlist(n: int) -> int:
+    return max(1, min(int(4 * np.sqrt(n)), n // 39))
+
+
+def enabled(kind: str = INDEX_TYPE, storage: str = VECTOR_STORAGE) -> bool:
+    """Whether this configuration builds an index at all (plain float32 flat search does not)."""
+    return kind != "flat" or storage != "float32"
+
+
+def _pq(dim: int) -> str:
+    if dim % PQ_M:
+        raise ValueError(f"PQ_M={PQ_M} must divide the embedding dim {dim}")
+    return f"PQ{PQ_M}x8"
+
+
+def _codec(storage: str, dim: int) -> str:
+    if storage == "float32":
+        return "Flat"
+    if storage == "float16":
+        return "SQfp16"
+    if storage == "int8":
+        return "SQ8"
+    if storage == "pq":
+        return _pq(dim)
+    raise ValueError(f"Unknown VECTOR_STORAGE '{storage}', expected one of {STORAGE_TYPES}")
+
+
+def factory_string(kind: str, dim: int, n: int, storage: str = VECTOR_STORAGE) -> Optional[str]:
+    """FAISS index_factory spec for `kind` over `storage`, or None for exact float32 search."""
+    nlist = IVF_NLIST or _auto_nlist(n)
+    if kind == "flat":
+        return _codec(storage, dim) if storage != "float32" else None
+    if kind == "ivf_flat":
+        return f"IVF{nlist},{_codec(storage, dim)}"
+    if kind == "ivf_pq":
+        return f"IVF{nlist},{_pq(dim)}"
+    if kind == "hnsw":
+        return f"HNSW{HNSW_M},{_codec(storage, dim)}"
+    raise ValueError(f"Unknown VECTOR_INDEX_TYPE '{kind}', expected one of {INDEX_TYPES}")
+
+
+def faiss_metric(metric: str) -> int:
+    """FAISS metric for "ip" (inner product over normalized vectors) or "l2"."""
+    return faiss.METRIC_INNER_PRODUCT if metric == "ip" else faiss.METRIC_L2
+
+
+def set_search_params(index: faiss.Index, nprobe: Optional[int] = None, ef_search: Optional[int] = None) -> None:
+    """Apply nprobe / efSearch where the index type supports them."""
+    params = faiss.ParameterSpace()
+    if faiss.try_extract_index_ivf(index) is not None:
+        params.set_index_parameter(index, "nprobe", nprobe or IVF_NPROBE)
+    elif hasattr(index, "hnsw"):
+        params.set_index_parameter(index, "efSearch", ef_search or HNSW_EF_SEARCH)
+
+
+def build(vectors: np.ndarray, kind: str = INDEX_TYPE, storage: str = VECTOR_STORAGE,
+          metric: str = "l2", min_vectors: Optional[int] = None) -> Optional[faiss.Index]:
+    """
+    Train on a random sample of `vectors` and add all of them.
+    Returns None for plain float32 flat search or when the corpus is smaller
+    than `min_vectors` (default MIN_ANN_VECTORS) or too small to train on.
+    """
+    n, dim = vectors.shape
+    min_vectors = MIN_ANN_VECTORS if min_vectors is None else min_vectors
+    if not enabled(kind, storage) or n < min_vectors:
+        return None
+    if (kind == "ivf_pq" or storage == "pq") and n < 256:
+        logger.warning("⚠ Too few vectors to train PQ codebooks; using flat search")
+        return None
+
+    spec = factory_string(kind, dim, n, storage)
+    index = faiss.index_factory(dim, spec, faiss_metric(metric))
+    if kind == "hnsw":
+        index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+
+    if not index.is_trained:
+        sample = vectors
+        if n > TRAIN_SAMPLE_SIZE:
+            rows = np.sort(np.random.default_rng(0).choice(n, TRAIN_SAMPLE_SIZE, replace=False))
+            sample = vectors[rows]
+        index.train(np.ascontiguousarray(sample, dtype="float32"))
+
+    # Add in slices so a mapped matrix is never copied into RAM all at once
+    step = 65536
+    for start in range(0, n, step):
+        index.add(np.ascontiguousarray(vectors[start : start + step], dtype="float32"))
+
+    set_search_params(index)
+    logger.info(f"✓ Built {spec} ({metric}) over {n} vectors")
+    return index
+
+
+def matches(meta: Optional[Dict[str, Any]], kind: str = INDEX_TYPE, storage: str = VECTOR_STORAGE) -> bool:
+    """Whether index metadata describes an index of the configured type and storage."""
+    return bool(meta) and meta.get("kind") == kind and meta.get("storage", "float32") == storage
+
+
+def index_file(index_path: str, meta: Optional[Dict[str, Any]]) -> str:
+    """The index file `meta` describes (`index_path` itself for older metadata)."""
+    if meta and meta.get("file"):
+        return os.path.join(os.path.dirname(index_path), meta["file"])
+    return index_path
+
+
+def write(index: faiss.Index, index_path: str, meta_path: str, kind: str, epoch: int = 0,
+          storage: str = VECTOR_STORAGE, metric: str = "l2") -> None:
+    stem, ext = os.path.splitext(index_path)
+    path = f"{stem}.{epoch}.{int(index.ntotal)}{ext}"
+    old = index_file(index_path, read_meta(meta_path))
+
+    tmp_path = f"{path}.tmp.{os.getpid()}"
+    faiss.write_index(index, tmp_path)
+    os.replace(tmp_path, path)
+
+    tmp_meta = f"{meta_path}.tmp.{os.getpid()}"
+    count = int(index.ntotal)
+    bytes_per_vector = os.path.getsize(path) / count if count else 0.0
+    with open(tmp_meta, "w", encoding="utf-8") as f:
+        json.dump({
+            "kind": kind, "storage": storage, "metric": metric, "count": count, "epoch": epoch,
+            "file": os.path.basename(path), "bytes_per_vector": round(bytes_per_vector, 1),
+        }, f)
+    os.replace(tmp_meta, meta_path)
+    logger.info(f"✓ Wrote {kind}/{storage} index: {count} vectors, {bytes_per_vector:.1f} bytes/vector")
+    if old != path and os.path.exists(old):
+        os.remove(old)
+
+
+def read_meta(meta_path: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(meta_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def load(index_path: str) -> faiss.Index:
+    """Open with mmap where FAISS supports it (IVF lists), else a normal read."""
+    try:
+        index = faiss.read_index(index_path, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+    except Exception:
+        index = faiss.read_index(index_path)
+    set_search_params(index)
+    return index
+
+
+def remove(index_path: str, meta_path: str) -> None:
+    current = index_file(index_path, read_meta(meta_path))
+    for path in (meta_path, current, index_path):
+        if os.path.exists(path):
+            os.remove(path)
@@ -0,0 +1,119 @@
+# backend/chatbot/utils/answer_cache.py
+#
+# Semantic answer cache for the chat endpoint. A new question whose embedding
+# is within ANSWER_CACHE_MAX_DISTANCE (cosine) of one answered before gets the
+# stored reply and sources back without a retrieval or generation call.
+# Entries expire after a TTL, the least recently used are evicted at the size
+# cap, and everything is dropped when the index generation changes.
+# There is one cache per retrieval scope (public, or public + one tenant's
+# shard), so an answer built from a tenant's documents is never served to
+# anyone else; the least recently used scopes are dropped.
+
+import os
+import time
+import threading
+from collections import OrderedDict
+from typing import List, Dict, Any, Hashable, Optional, Tuple
+
+import numpy as np
+
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "true").lower() == "true"
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "512"))
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", "3600"))
+ANSWER_CACHE_MAX_DISTANCE = float(os.getenv("ANSWER_CACHE_MAX_DISTANCE", "0.05"))
+ANSWER_CACHE_SCOPES = int(os.getenv("ANSWER_CACHE_SCOPES", "64"))
+
+
+def _unit(vec: np.ndarray) -> np.ndarray:
+    vec = np.asarray(vec, dtype="float32").reshape(-1)
+    norm = np.linalg.norm(vec)
+    return vec / norm if norm else vec
+
+
+class SemanticAnswerCache:
+    def __init__(self, max_entries: int, ttl: float, max_distance: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_distance = max_distance
+        self._lock = threading.Lock()
+        # key -> (unit query vector, reply, sources, expires_at); order = recency
+        self._entries: "OrderedDict[int, Tuple[np.ndarray, str, List[str], float]]" = OrderedDict()
+        self._next_key = 0
+        self._generation: Optional[Hashable] = None
+        self.hits = 0
+        self.misses = 0
+
+    def _check_generation(self, generation: Hashable) -> None:
+        if generation != self._generation:
+            self._entries.clear()
+            self._generation = generation
+
+    def _expire(self, now: float) -> None:
+        expired = [k for k, e in self._entries.items() if e[3] <= now]
+        for k in expired:
+            del self._entries[k]
+
+    def lookup(self, q_emb: np.ndarray, generation: Hashable) -> Optional[Dict[str, Any]]:
+        """Return {"reply", "sources", "distance"} for the nearest live entry within range."""
+        q = _unit(q_emb)
+        with self._lock:
+            self._check_generation(generation)
+            self._expire(time.time())
+            if not self._entries:
+                self.misses += 1
+                return None
+
+            keys = list(self._entries.keys())
+            matrix = np.stack([self._entries[k][0] for k in keys])
+            distances = 1.0 - matrix @ q
+            best = int(np.argmin(distances))
+            if distances[best] > self.max_distance:
+                self.misses += 1
+                return None
+
+            key = keys[best]
+            self._entries.move_to_end(key)
+            _, reply, sources, _ = self._entries[key]
+            self.hits += 1
+            return {"reply": reply, "sources": list(sources), "distance": float(distances[best])}
+
+    def store(self, q_emb: np.ndarray, generation: Hashable, reply: str, sources: List[str]) -> None:
+        with self._lock:
+            self._check_generation(generation)
+            self._entries[self._next_key] = (_unit(q_emb), reply, list(sources), time.time() + self.ttl)
+            self._next_key += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+_answer_caches: "OrderedDict[str, SemanticAnswerCache]" = OrderedDict()
+_scopes_lock = threading.Lock()
+
+
+def get_answer_cache(scope: str = "public") -> Optional[SemanticAnswerCache]:
+    """Process-wide answer cache for one retrieval scope, or None when ANSWER_CACHE_ENABLED=false."""
+    if not ANSWER_CACHE_ENABLED:
+        return None
+    with _scopes_lock:
+        cache = _answer_caches.get(scope)
+        if cache is None:
+            cache = _answer_caches[scope] = SemanticAnswerCache(
+                ANSWER_CACHE_SIZE, ANSWER_CACHE_TTL, ANSWER_CACHE_MAX_DISTANCE
+            )
+        _answer_caches.move_to_end(scope)
+        while len(_answer_caches) > ANSWER_CACHE_SCOPES:
+            _answer_caches.popitem(last=False)
+        return cache
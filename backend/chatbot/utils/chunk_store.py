@@ -0,0 +1,494 @@
+# backend/chatbot/utils/chunk_store.py
+#
+# Row-addressable chunk metadata, keyed by vector id (the row number in the
+# vector matrix). Replaces the monolithic documents.json: appends insert only
+# the new rows and lookups fetch exactly the k rows a search returned.
+# Removed chunks leave their vector id in `tombstones` until a compaction
+# rewrites the store without them.
+#
+# Full rebuilds renumber ids, so each one starts a new epoch (store_meta).
+# The previous epoch's rows stay readable as chunks_prev / tombstones_prev
+# until the next rebuild, letting a reader that mapped the older matrix finish
+# its query against the rows that match it. `changes` logs which documents
+# were appended or removed, so a rebuild that ran meanwhile can keep them.
+#
+# `postings` is the inverted index for keyword search (see lexical.py),
+# written in the same transaction as the rows it covers and swapped with
+# them on rebuilds. Tombstoned rows keep their postings until compaction;
+# searches filter them out like tombstoned vectors.
+
+import os
+import json
+import time
+import sqlite3
+import itertools
+import threading
+from typing import List, Dict, Any, Iterable, Optional, Sequence, Set, Tuple
+
+from . import lexical
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS chunks (
+    id     INTEGER PRIMARY KEY,
+    doc_id INTEGER,
+    text   TEXT NOT NULL,
+    meta   TEXT NOT NULL,
+    length INTEGER
+);
+CREATE INDEX IF NOT EXISTS chunks_doc_id ON chunks (doc_id);
+CREATE TABLE IF NOT EXISTS doc_hashes (
+    doc_id       INTEGER PRIMARY KEY,
+    content_hash TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS tombstones (
+    id INTEGER PRIMARY KEY
+);
+CREATE TABLE IF NOT EXISTS store_meta (
+    key   TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO store_meta (key, value) VALUES ('epoch', 0);
+CREATE TABLE IF NOT EXISTS changes (
+    seq    INTEGER PRIMARY KEY AUTOINCREMENT,
+    doc_id INTEGER NOT NULL,
+    at     REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS terms (
+    id   INTEGER PRIMARY KEY,
+    term TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS postings (
+    term_id  INTEGER NOT NULL,
+    segment  INTEGER NOT NULL,
+    postings BLOB NOT NULL,
+    PRIMARY KEY (term_id, segment)
+) WITHOUT ROWID;
+"""
+
+# Epochs staged before keyword search existed have no postings of their own
+PREV_POSTINGS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS postings_prev (
+    term_id  INTEGER NOT NULL,
+    segment  INTEGER NOT NULL,
+    postings BLOB NOT NULL,
+    PRIMARY KEY (term_id, segment)
+) WITHOUT ROWID;
+"""
+
+# Change-log entries older than this are pruned; no rebuild runs that long
+CHANGE_LOG_SECONDS = 24 * 3600
+
+STAGING_SCHEMA = """
+CREATE TABLE {table} (
+    id     INTEGER PRIMARY KEY,
+    doc_id INTEGER,
+    text   TEXT NOT NULL,
+    meta   TEXT NOT NULL,
+    length INTEGER
+);
+CREATE TABLE {postings} (
+    term_id  INTEGER NOT NULL,
+    segment  INTEGER NOT NULL,
+    postings BLOB NOT NULL,
+    PRIMARY KEY (term_id, segment)
+) WITHOUT ROWID;
+"""
+
+# Staging tables are per builder so concurrent rebuilds never share one
+_staging_ids = itertools.count(1)
+
+TERM_BATCH_SIZE = 500  # terms per id lookup; under SQLite's parameter limit
+
+
+def _rows(start_id: int, texts: Sequence[str], metadatas: Sequence[Dict[str, Any]], lengths: Sequence[int]):
+    for i, (t, m, n) in enumerate(zip(texts, metadatas, lengths)):
+        yield (start_id + i, m.get("doc_id"), t, json.dumps(m, ensure_ascii=False), n)
+
+
+def _postings_table(table: str) -> str:
+    """The postings table staged alongside chunk staging table `table`."""
+    return table.replace("chunks_", "postings_", 1)
+
+
+def _term_ids(conn: sqlite3.Connection, terms: Sequence[str]) -> Dict[str, int]:
+    conn.executemany("INSERT OR IGNORE INTO terms (term) VALUES (?)", ((t,) for t in terms))
+    ids: Dict[str, int] = {}
+    for start in range(0, len(terms), TERM_BATCH_SIZE):
+        batch = terms[start : start + TERM_BATCH_SIZE]
+        placeholders = ",".join("?" * len(batch))
+        ids.update(conn.execute(f"SELECT term, id FROM terms WHERE term IN ({placeholders})", batch))
+    return ids
+
+
+def _index_rows(conn: sqlite3.Connection, chunks: str, postings: str, start_id: int,
+                texts: Sequence[str], metadatas: Sequence[Dict[str, Any]]) -> List[int]:
+    """
+    Insert rows start_id.. into `chunks` and their postings into `postings`
+    as one new segment per term. Returns the term ids written.
+    """
+    by_term, lengths = lexical.build_postings(start_id, texts)
+    # OR REPLACE: rows past the published vector count are leftovers
+    # of an interrupted append and may be overwritten
+    conn.executemany(
+        f"INSERT OR REPLACE INTO {chunks} (id, doc_id, text, meta, length) VALUES (?, ?, ?, ?, ?)",
+        _rows(start_id, texts, metadatas, lengths),
+    )
+    term_ids = _term_ids(conn, list(by_term))
+    conn.executemany(
+        f"INSERT OR REPLACE INTO {postings} (term_id, segment, postings) VALUES (?, ?, ?)",
+        ((term_ids[t], start_id, lexical.encode(p)) for t, p in by_term.items()),
+    )
+    return list(term_ids.values())
+
+
+def _crowded_terms(conn: sqlite3.Connection, term_ids: Sequence[int]) -> List[int]:
+    """Of `term_ids`, those with more than LEX_MAX_SEGMENTS segments in `postings`."""
+    crowded = []
+    for start in range(0, len(term_ids), TERM_BATCH_SIZE):
+        batch = list(term_ids[start : start + TERM_BATCH_SIZE])
+        placeholders = ",".join("?" * len(batch))
+        crowded.extend(r[0] for r in conn.execute(
+            f"SELECT term_id FROM postings WHERE term_id IN ({placeholders}) GROUP BY term_id HAVING COUNT(*) > ?",
+            (*batch, lexical.LEX_MAX_SEGMENTS),
+        ))
+    return crowded
+
+
+def _merge_segments(conn: sqlite3.Connection, postings: str, term_ids: Iterable[int]) -> None:
+    """Rewrite each term's segments as one."""
+    for term_id in term_ids:
+        rows = conn.execute(
+            f"SELECT segment, postings FROM {postings} WHERE term_id = ? ORDER BY segment", (term_id,)
+        ).fetchall()
+        if len(rows) < 2:
+            continue
+        conn.execute(f"DELETE FROM {postings} WHERE term_id = ?", (term_id,))
+        conn.execute(
+            f"INSERT INTO {postings} (term_id, segment, postings) VALUES (?, ?, ?)",
+            (term_id, rows[0][0], lexical.merge(r[1] for r in rows)),
+        )
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class ChunkStore:
+    """
+    SQLite-backed chunk table. Each thread gets its own connection; WAL mode
+    lets readers run while an upload is writing.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(chunks)")}
+            if columns and "doc_id" not in columns:
+                # Tables created before doc_id was tracked
+                conn.execute("ALTER TABLE chunks ADD COLUMN doc_id INTEGER")
+            for table in ("chunks", "chunks_prev"):
+                columns = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+                if columns and "length" not in columns:
+                    # Rows from before keyword search have no postings until
+                    # the next rebuild (build_index / compact_vector_store)
+                    conn.execute(f"ALTER TABLE {table} ADD COLUMN length INTEGER")
+            conn.executescript(SCHEMA)
+            if conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'chunks_prev'").fetchone():
+                conn.executescript(PREV_POSTINGS_SCHEMA)
+            self._local.conn = conn
+        return conn
+
+    def forget_connections(self) -> None:
+        """Drop connections inherited across fork(); each thread reconnects on next use."""
+        self._local = threading.local()
+
+    @staticmethod
+    def _row_to_doc(text: str, meta: str) -> Dict[str, Any]:
+        return {"text": text, "meta": json.loads(meta)}
+
+    def count(self) -> int:
+        return self._conn().execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+
+    def append(self, start_id: int, texts: Sequence[str], metadatas: Sequence[Dict[str, Any]]) -> None:
+        """Insert rows start_id .. start_id + len(texts) - 1 in one transaction."""
+        with self._conn() as conn:
+            if conn.execute("SELECT 1 FROM chunks WHERE id >= ? LIMIT 1", (start_id,)).fetchone():
+                # Leftovers of an interrupted append: drop their postings too
+                conn.execute("DELETE FROM postings WHERE segment >= ?", (start_id,))
+            term_ids = _index_rows(conn, "chunks", "postings", start_id, texts, metadatas)
+            _merge_segments(conn, "postings", _crowded_terms(conn, term_ids))
+            doc_ids = {m.get("doc_id") for m in metadatas} - {None}
+            conn.executemany(
+                "INSERT INTO changes (doc_id, at) VALUES (?, ?)", ((d, time.time()) for d in doc_ids)
+            )
+
+    def replace_all(self, texts: Sequence[str], metadatas: Sequence[Dict[str, Any]]) -> int:
+        """Swap the whole table atomically (used by full rebuilds). Returns the new epoch."""
+        table = self.begin_staging()
+        self.stage(table, 0, texts, metadatas)
+        self.seal_staging(table)
+        return self.commit_staging(table)
+
+    # --- Epochs ---------------------------------------------------------------
+    def epoch(self) -> int:
+        return self._conn().execute("SELECT value FROM store_meta WHERE key = 'epoch'").fetchone()[0]
+
+    def _read_epoch(self, epoch: Optional[int], query):
+        """
+        Run `query(conn, suffix)` in one read transaction against `epoch`'s
+        tables ("" for the current epoch, "_prev" for the one before).
+        Returns None when that epoch is no longer kept.
+        """
+        conn = self._conn()
+        conn.execute("BEGIN")
+        try:
+            current = conn.execute("SELECT value FROM store_meta WHERE key = 'epoch'").fetchone()[0]
+            if epoch is None or epoch == current:
+                return query(conn, "")
+            if epoch == current - 1 and conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'chunks_prev'"
+            ).fetchone():
+                return query(conn, "_prev")
+            return None
+        finally:
+            conn.commit()
+
+    # --- Streaming rebuilds -------------------------------------------------
+    # Rows (and their postings) are written to side tables while queries keep
+    # reading `chunks`, then swapped in with one short transaction that starts
+    # a new epoch.
+    def begin_staging(self) -> str:
+        """Create an empty staging table and return its name."""
+        conn = self._conn()
+        self._drop_orphaned_staging(conn)
+        table = f"chunks_staging_{os.getpid()}_{next(_staging_ids)}"
+        conn.executescript(STAGING_SCHEMA.format(table=table, postings=_postings_table(table)))
+        return table
+
+    @staticmethod
+    def _drop_orphaned_staging(conn: sqlite3.Connection) -> None:
+        """Drop staging tables left behind by builders whose process died."""
+        names = [r[0] for r in conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' "
+            "AND (name LIKE 'chunks\\_staging%' ESCAPE '\\' OR name LIKE 'postings\\_staging%' ESCAPE '\\')"
+        )]
+        for name in names:
+            parts = name.split("_")  # {chunks,postings}_staging_<pid>_<n>
+            if len(parts) == 4 and parts[2].isdigit() and _pid_alive(int(parts[2])):
+                continue
+            conn.execute(f'DROP TABLE IF EXISTS "{name}"')
+        conn.commit()
+
+    def stage(self, table: str, start_id: int, texts: Sequence[str], metadatas: Sequence[Dict[str, Any]]) -> None:
+        with self._conn() as conn:
+            _index_rows(conn, table, _postings_table(table), start_id, texts, metadatas)
+
+    def seal_staging(self, table: str) -> None:
+        """Merge the staged postings into one segment per term (before taking the write lock)."""
+        postings = _postings_table(table)
+        with self._conn() as conn:
+            crowded = [r[0] for r in conn.execute(
+                f"SELECT term_id FROM {postings} GROUP BY term_id HAVING COUNT(*) > 1"
+            )]
+            _merge_segments(conn, postings, crowded)
+
+    def staged_ids_for_docs(self, table: str, doc_ids: Iterable[int]) -> List[int]:
+        doc_ids = [int(d) for d in doc_ids]
+        if not doc_ids:
+            return []
+        placeholders = ",".join("?" * len(doc_ids))
+        rows = self._conn().execute(f"SELECT id FROM {table} WHERE doc_id IN ({placeholders})", doc_ids)
+        return [r[0] for r in rows]
+
+    def abort_staging(self, table: str) -> None:
+        with self._conn() as conn:
+            conn.execute(f"DROP TABLE IF EXISTS {table}")
+            conn.execute(f"DROP TABLE IF EXISTS {_postings_table(table)}")
+
+    def commit_staging(self, table: str, doc_hashes: Optional[Dict[int, str]] = None,
+                       tombstones: Iterable[int] = ()) -> int:
+        """
+        Make `table` the chunk table of a new epoch and return that epoch.
+        The outgoing rows and tombstones are kept as the previous epoch;
+        `tombstones` are ids of the new epoch that are already removed.
+        """
+        with self._conn() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("DROP TABLE IF EXISTS chunks_prev")
+            conn.execute("DROP TABLE IF EXISTS tombstones_prev")
+            conn.execute("DROP TABLE IF EXISTS postings_prev")
+            conn.execute("DROP INDEX IF EXISTS chunks_doc_id")
+            conn.execute("ALTER TABLE chunks RENAME TO chunks_prev")
+            conn.execute("ALTER TABLE tombstones RENAME TO tombstones_prev")
+            conn.execute("ALTER TABLE postings RENAME TO postings_prev")
+            conn.execute(f"ALTER TABLE {table} RENAME TO chunks")
+            conn.execute(f"ALTER TABLE {_postings_table(table)} RENAME TO postings")
+            conn.execute("CREATE INDEX chunks_doc_id ON chunks (doc_id)")
+            # Staged ids are freshly numbered; old tombstones no longer apply
+            conn.execute("CREATE TABLE tombstones (id INTEGER PRIMARY KEY)")
+            conn.executemany("INSERT OR IGNORE INTO tombstones (id) VALUES (?)", ((int(i),) for i in tombstones))
+            conn.execute("DELETE FROM chunks WHERE id IN (SELECT id FROM tombstones)")
+            if doc_hashes is not None:
+                conn.execute("DELETE FROM doc_hashes")
+                conn.executemany(
+                    "INSERT INTO doc_hashes (doc_id, content_hash) VALUES (?, ?)", doc_hashes.items()
+                )
+            conn.execute("DELETE FROM changes WHERE at < ?", (time.time() - CHANGE_LOG_SECONDS,))
+            conn.execute("UPDATE store_meta SET value = value + 1 WHERE key = 'epoch'")
+            return conn.execute("SELECT value FROM store_meta WHERE key = 'epoch'").fetchone()[0]
+
+    # --- Per-document lookups -----------------------------------------------
+    def doc_hashes(self) -> Dict[int, str]:
+        return dict(self._conn().execute("SELECT doc_id, content_hash FROM doc_hashes"))
+
+    def doc_ids(self) -> Set[int]:
+        """Documents with at least one live row."""
+        return {r[0] for r in self._conn().execute("SELECT DISTINCT doc_id FROM chunks WHERE doc_id IS NOT NULL")}
+
+    def rows_for_docs(self, doc_ids: Iterable[int]) -> List[Tuple[int, Dict[str, Any]]]:
+        """(vector id, row) pairs of the given documents, in id order."""
+        doc_ids = [int(d) for d in doc_ids]
+        if not doc_ids:
+            return []
+        placeholders = ",".join("?" * len(doc_ids))
+        rows = self._conn().execute(
+            f"SELECT id, text, meta FROM chunks WHERE doc_id IN ({placeholders}) ORDER BY id", doc_ids
+        )
+        return [(r[0], self._row_to_doc(r[1], r[2])) for r in rows]
+
+    # --- Change log -----------------------------------------------------------
+    def change_seq(self) -> int:
+        return self._conn().execute("SELECT COALESCE(MAX(seq), 0) FROM changes").fetchone()[0]
+
+    def changed_docs(self, since: int) -> Set[int]:
+        """Documents appended to or removed from after change `since`."""
+        return {r[0] for r in self._conn().execute("SELECT DISTINCT doc_id FROM changes WHERE seq > ?", (since,))}
+
+    def ids_for_doc(self, doc_id: int) -> List[int]:
+        rows = self._conn().execute("SELECT id FROM chunks WHERE doc_id = ? ORDER BY id", (doc_id,))
+        return [r[0] for r in rows]
+
+    def get_rows(self, ids: Iterable[int],
+                 epoch: Optional[int] = None) -> Optional[List[Tuple[int, Dict[str, Any]]]]:
+        """
+        (vector id, row) pairs in the order of `ids`, skipping missing ones.
+        With `epoch`, ids are resolved against that epoch's rows; returns None
+        if they are no longer kept.
+        """
+        ids = [int(i) for i in ids]
+        if not ids:
+            return []
+        placeholders = ",".join("?" * len(ids))
+
+        def fetch(conn, suffix):
+            return {
+                row[0]: self._row_to_doc(row[1], row[2])
+                for row in conn.execute(f"SELECT id, text, meta FROM chunks{suffix} WHERE id IN ({placeholders})", ids)
+            }
+
+        found = self._read_epoch(epoch, fetch)
+        if found is None:
+            return None
+        return [(i, found[i]) for i in ids if i in found]
+
+    def get_many(self, ids: Iterable[int]) -> List[Dict[str, Any]]:
+        """Fetch rows by vector id, preserving the order of `ids` and skipping missing ones."""
+        return [row for _, row in self.get_rows(ids)]
+
+    # --- Removal ------------------------------------------------------------
+    def tombstone(self, ids: Iterable[int]) -> int:
+        """Drop rows by vector id and record the ids for compaction. Returns rows removed."""
+        ids = [(int(i),) for i in ids]
+        if not ids:
+            return 0
+        with self._conn() as conn:
+            conn.executemany("INSERT OR IGNORE INTO tombstones (id) VALUES (?)", ids)
+            conn.executemany(
+                "INSERT INTO changes (doc_id, at) SELECT doc_id, ? FROM chunks WHERE id = ? AND doc_id IS NOT NULL",
+                ((time.time(), i) for i, in ids),
+            )
+            conn.executemany("DELETE FROM chunks WHERE id = ?", ids)
+        return len(ids)
+
+    def tombstone_doc(self, doc_id: int) -> int:
+        """Tombstone every chunk of `doc_id` and forget its content hash."""
+        with self._conn() as conn:
+            removed = conn.execute(
+                "INSERT OR IGNORE INTO tombstones (id) SELECT id FROM chunks WHERE doc_id = ?", (doc_id,)
+            ).rowcount
+            conn.execute("DELETE FROM chunks WHERE doc_id = ?", (doc_id,))
+            conn.execute("DELETE FROM doc_hashes WHERE doc_id = ?", (doc_id,))
+            conn.execute("INSERT INTO changes (doc_id, at) VALUES (?, ?)", (doc_id, time.time()))
+        return removed
+
+    def tombstones(self, epoch: Optional[int] = None) -> Optional[List[int]]:
+        """Tombstoned ids (of `epoch` if given; None if it is no longer kept)."""
+        return self._read_epoch(
+            epoch, lambda conn, suffix: [r[0] for r in conn.execute(f"SELECT id FROM tombstones{suffix} ORDER BY id")]
+        )
+
+    # --- Keyword search -------------------------------------------------------
+    def lexical_stats(self, epoch: Optional[int] = None) -> Optional[Tuple[int, int]]:
+        """(rows with postings, their total length in tokens) of `epoch`; None if no longer kept."""
+        return self._read_epoch(
+            epoch,
+            lambda conn, suffix: tuple(conn.execute(
+                f"SELECT COUNT(length), COALESCE(SUM(length), 0) FROM chunks{suffix}"
+            ).fetchone()),
+        )
+
+    def postings(self, terms: Sequence[str],
+                 epoch: Optional[int] = None) -> Optional[List[Tuple[str, bytes]]]:
+        """(term, segment) pairs for `terms` in `epoch`; None if it is no longer kept."""
+        terms = list(dict.fromkeys(terms))[:TERM_BATCH_SIZE]
+        if not terms:
+            return []
+        placeholders = ",".join("?" * len(terms))
+        return self._read_epoch(
+            epoch,
+            lambda conn, suffix: conn.execute(
+                f"SELECT t.term, p.postings FROM terms t JOIN postings{suffix} p ON p.term_id = t.id "
+                f"WHERE t.term IN ({placeholders})",
+                terms,
+            ).fetchall(),
+        )
+
+    def document_frequencies(self, terms: Sequence[str]) -> Dict[str, int]:
+        """Rows containing each term (tombstoned ones included), for the current epoch."""
+        df = dict.fromkeys(terms, 0)
+        for term, blob in self.postings(terms) or []:
+            df[term] += len(blob) // lexical.POSTING_DTYPE.itemsize
+        return df
+
+    def head(self, n: int) -> List[Dict[str, Any]]:
+        rows = self._conn().execute("SELECT text, meta FROM chunks ORDER BY id LIMIT ?", (n,))
+        return [self._row_to_doc(t, m) for t, m in rows]
+
+    def clear(self) -> None:
+        with self._conn() as conn:
+            conn.execute("DELETE FROM chunks")
+            conn.execute("DELETE FROM doc_hashes")
+            conn.execute("DELETE FROM tombstones")
+            conn.execute("DELETE FROM postings")
+
+    def import_json(self, json_path: str) -> int:
+        """One-off import of a legacy documents.json list. Returns rows imported."""
+        if not os.path.exists(json_path):
+            return 0
+        with open(json_path, "r", encoding="utf-8") as f:
+            docs = json.load(f)
+        self.replace_all([d["text"] for d in docs], [d.get("meta", {}) for d in docs])
+        return len(docs)
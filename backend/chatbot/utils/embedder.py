@@ -1,43 +1,12 @@
-import os
-import faiss
-import numpy as np
-from sentence_transformers import SentenceTransformer
-from chatbot.models import UploadedDocument
+from chatbot.utils import embedding_store
 
-_model = None
-index_path = "faiss_index.index"
+# Thin Django-facing wrappers. The model and the index both come from
+# embedding_store, so there is exactly one embedding model per process
+# (via the model registry) and one vector store on disk. Indexes are written
+# by the ingest worker and the build_index command, never from here.
 
 def get_model():
-    global _model
-    if _model is None:
-        from sentence_transformers import SentenceTransformer
-        _model = SentenceTransformer("all-MiniLM-L6-v2", device="cpu")
-    return _model
-
-def build_faiss_index():
-    docs = UploadedDocument.objects.exclude(content__isnull=True)
-    texts = [doc.content for doc in docs]
-    if not texts:
-        return None
-
-    model = get_model()
-    embeddings = model.encode(texts, convert_to_numpy=True)
-    index = faiss.IndexFlatL2(embeddings.shape[1])
-    index.add(embeddings.astype("float32"))
-
-    faiss.write_index(index, index_path)
-    return index
-
-def get_index():
-    if os.path.exists(index_path):
-        return faiss.read_index(index_path)
-    return build_faiss_index()
+    return embedding_store.get_model()
 
 def search_similar(query, k=3):
-    model = get_model()
-    index = get_index()
-    if index is None:
-        return []
-    query_emb = model.encode([query], convert_to_numpy=True)
-    distances, indices = index.search(query_emb.astype("float32"), k)
-    return indices[0].tolist()
+    return embedding_store.search_ids(query, top_k=k)
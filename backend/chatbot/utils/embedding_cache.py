@@ -0,0 +1,202 @@
+# backend/chatbot/utils/embedding_cache.py
+#
+# Disk-backed embedding cache keyed by (model name, sha256 of normalized text).
+# Shared by every worker on a host through one SQLite file; least recently
+# used entries are evicted once the entry cap is exceeded.
+#
+# Lookups are read-only: hit timestamps and hit/miss counters are kept in
+# memory and written in one transaction every FLUSH_EVERY hits or
+# FLUSH_INTERVAL seconds (or with the next put), so the chat path doesn't
+# contend for SQLite's write lock.
+
+import os
+import time
+import atexit
+import sqlite3
+import hashlib
+import threading
+from typing import Dict, Any, Sequence
+
+import numpy as np
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS embeddings (
+    key       TEXT PRIMARY KEY,
+    vec       BLOB NOT NULL,
+    last_used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used);
+CREATE TABLE IF NOT EXISTS stats (
+    name  TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO stats (name, value) VALUES ('hits', 0), ('misses', 0), ('evictions', 0);
+"""
+
+
+# Counting rows is a table scan, so the cap is enforced every N inserts
+EVICT_CHECK_EVERY = 1000
+
+# Pending last_used / stats updates are written after this many hits or seconds
+FLUSH_EVERY = 256
+FLUSH_INTERVAL = 30.0
+
+
+def normalize(text: str) -> str:
+    """Collapse whitespace; the tokenizer ignores it, so the embedding is unchanged."""
+    return " ".join(text.split())
+
+
+def cache_key(model_name: str, text: str) -> str:
+    digest = hashlib.sha256(normalize(text).encode("utf-8")).hexdigest()
+    return f"{model_name}:{digest}"
+
+
+class EmbeddingCache:
+    def __init__(self, path: str, max_entries: int):
+        self.path = path
+        self.max_entries = max_entries
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        # Per-process counters; the cumulative totals live in the `stats` table
+        self.hits = 0
+        self.misses = 0
+        self._puts_since_check = EVICT_CHECK_EVERY
+        # Not yet written: key -> last hit time, and counter increments
+        self._touched: Dict[str, float] = {}
+        self._pending_hits = 0
+        self._pending_misses = 0
+        self._flushed_at = time.monotonic()
+        atexit.register(self.flush)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(SCHEMA)
+            self._local.conn = conn
+        return conn
+
+    def forget_connections(self) -> None:
+        """Drop connections inherited across fork(); each thread reconnects on next use."""
+        self._local = threading.local()
+        # The parent writes its own pending updates; don't count them again here
+        with self._lock:
+            self._touched = {}
+            self._pending_hits = self._pending_misses = 0
+
+    def _take_pending(self):
+        with self._lock:
+            pending = (self._touched, self._pending_hits, self._pending_misses)
+            self._touched = {}
+            self._pending_hits = self._pending_misses = 0
+            self._flushed_at = time.monotonic()
+        return pending
+
+    def _write_pending(self, conn: sqlite3.Connection, pending) -> None:
+        touched, hits, misses = pending
+        if touched:
+            conn.executemany(
+                "UPDATE embeddings SET last_used = ? WHERE key = ? AND last_used < ?",
+                ((t, k, t) for k, t in touched.items()),
+            )
+        if hits:
+            conn.execute("UPDATE stats SET value = value + ? WHERE name = 'hits'", (hits,))
+        if misses:
+            conn.execute("UPDATE stats SET value = value + ? WHERE name = 'misses'", (misses,))
+
+    def flush(self) -> None:
+        """Write pending hit timestamps and counters."""
+        pending = self._take_pending()
+        if not any(pending):
+            return
+        try:
+            with self._conn() as conn:
+                self._write_pending(conn, pending)
+        except sqlite3.Error:
+            pass  # best effort: only recency and statistics are lost
+
+    def get_many(self, model_name: str, texts: Sequence[str]) -> Dict[int, np.ndarray]:
+        """Return {position in texts: vector} for every cached text."""
+        keys = [cache_key(model_name, t) for t in texts]
+        found: Dict[str, np.ndarray] = {}
+        conn = self._conn()
+        # Stay under SQLite's bound-parameter limit
+        for start in range(0, len(keys), 500):
+            batch = keys[start : start + 500]
+            placeholders = ",".join("?" * len(batch))
+            for key, blob in conn.execute(
+                f"SELECT key, vec FROM embeddings WHERE key IN ({placeholders})", batch
+            ):
+                found[key] = np.frombuffer(blob, dtype="float32")
+
+        hits = {i: found[k] for i, k in enumerate(keys) if k in found}
+        misses = len(keys) - len(hits)
+        now = time.time()
+        with self._lock:
+            self.hits += len(hits)
+            self.misses += misses
+            self._pending_hits += len(hits)
+            self._pending_misses += misses
+            self._touched.update((k, now) for k in found)
+            due = (len(self._touched) >= FLUSH_EVERY
+                   or time.monotonic() - self._flushed_at >= FLUSH_INTERVAL)
+        if due:
+            self.flush()
+        return hits
+
+    def put_many(self, model_name: str, texts: Sequence[str], vectors: np.ndarray) -> None:
+        now = time.time()
+        rows = (
+            (cache_key(model_name, t), np.ascontiguousarray(v, dtype="float32").tobytes(), now)
+            for t, v in zip(texts, vectors)
+        )
+        conn = self._conn()
+        with self._lock:
+            self._puts_since_check += len(texts)
+            check = self._puts_since_check >= EVICT_CHECK_EVERY
+            if check:
+                self._puts_since_check = 0
+        pending = self._take_pending()
+        with conn:
+            # Already holding the write lock: pending hit updates go along
+            self._write_pending(conn, pending)
+            conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vec, last_used) VALUES (?, ?, ?)", rows
+            )
+            if not check:
+                return
+            overflow = conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0] - self.max_entries
+            if overflow > 0:
+                conn.execute(
+                    "DELETE FROM embeddings WHERE key IN "
+                    "(SELECT key FROM embeddings ORDER BY last_used LIMIT ?)",
+                    (overflow,),
+                )
+                conn.execute("UPDATE stats SET value = value + ? WHERE name = 'evictions'", (overflow,))
+
+    def stats(self) -> Dict[str, Any]:
+        self.flush()
+        conn = self._conn()
+        totals = dict(conn.execute("SELECT name, value FROM stats"))
+        entries = conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        lookups = totals["hits"] + totals["misses"]
+        process_lookups = self.hits + self.misses
+        return {
+            "entries": entries,
+            "max_entries": self.max_entries,
+            "hits": totals["hits"],
+            "misses": totals["misses"],
+            "evictions": totals["evictions"],
+            "hit_rate": totals["hits"] / lookups if lookups else 0.0,
+            "process_hit_rate": self.hits / process_lookups if process_lookups else 0.0,
+            "size_bytes": os.path.getsize(self.path) if os.path.exists(self.path) else 0,
+        }
+
+    def clear(self) -> None:
+        self._take_pending()
+        with self._conn() as conn:
+            conn.execute("DELETE FROM embeddings")
+            conn.execute("UPDATE stats SET value = 0")
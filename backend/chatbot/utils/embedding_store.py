@@ -1,13 +1,28 @@
 # backend/chatbot/utils/embedding_store.py
 
 import os
-import json
+import time
 import logging
-from typing import List, Dict, Any, Optional, Tuple
+import itertools
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import List, Dict, Any, Optional, Set, Tuple, NamedTuple, TYPE_CHECKING
 
 import numpy as np
 import faiss
-from sentence_transformers import SentenceTransformer
+
+from . import vector_file, ann_index, lexical
+from .chunk_store import ChunkStore
+from .file_lock import lock_for
+from .embedding_cache import EmbeddingCache
+from .query_batcher import QueryBatcher, QUERY_BATCHING_ENABLED
+from .model_registry import get_sentence_transformer, get_onnx_encoder
+from .onnx_backend import ONNX_QUANTIZED
+from .tracing import span
+
+if TYPE_CHECKING:
+    from sentence_transformers import SentenceTransformer
 
 # -----------------------------------------------------------------------------
 # Logging & Environment
@@ -22,22 +37,58 @@ EMBEDDING_ENABLED = os.getenv("EMBEDDING_ENABLED", "true").lower() == "true"
 DEFAULT_DEV_MODEL = "all-MiniLM-L6-v2"
 DEFAULT_PROD_MODEL = os.getenv("EMBEDDING_MODEL_NAME", "paraphrase-MiniLM-L3-v2")
 
+# Embedding backend: "torch" runs SentenceTransformer, "onnx" runs the ONNX Runtime
+# export (int8 unless ONNX_QUANTIZED=false; create it with `manage.py export_onnx_model`)
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch").lower()
+
 # Batch size for encoding (reduce RAM spikes)
 ENCODE_BATCH_SIZE = int(os.getenv("ENCODE_BATCH_SIZE", "64"))
 
+# Persistent embedding cache (~1.5 KB per entry at dim=384)
+EMBEDDING_CACHE_ENABLED = os.getenv("EMBEDDING_CACHE_ENABLED", "true").lower() == "true"
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "200000"))
+
 # Persisted locations
 BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
-VECTOR_STORE_DIR = os.path.join(BASE_DIR, "vector_store")
+VECTOR_STORE_DIR = os.getenv("VECTOR_STORE_DIR", os.path.join(BASE_DIR, "vector_store"))
+VECTORS_PATH = os.path.join(VECTOR_STORE_DIR, "vectors.f32")
+VECTORS_HEADER_PATH = os.path.join(VECTOR_STORE_DIR, "vectors.json")
+CHUNKS_DB_PATH = os.path.join(VECTOR_STORE_DIR, "chunks.sqlite3")
+EMBEDDING_CACHE_PATH = os.path.join(VECTOR_STORE_DIR, "embedding_cache.sqlite3")
+ANN_INDEX_PATH = os.path.join(VECTOR_STORE_DIR, "ann.index")
+ANN_META_PATH = os.path.join(VECTOR_STORE_DIR, "ann.json")
+
+# The files above form the public shard (documents without an owner). Each
+# owner's documents live in the same layout under tenants/<user id>/, loaded
+# on first use and evicted least-recently-used beyond VECTOR_SHARD_CACHE_SIZE.
+TENANT_SHARDS_DIR = os.path.join(VECTOR_STORE_DIR, "tenants")
+VECTOR_SHARD_CACHE_SIZE = int(os.getenv("VECTOR_SHARD_CACHE_SIZE", "32"))
+
+# Embeddings are stored L2-normalized and searched by inner product (cosine).
+# Stores written before this keep L2 on raw vectors until their next rewrite.
+VECTOR_METRIC = "ip"
+
+# Rebuild the ANN index once this fraction of vectors sits in the exact-scan tail
+ANN_REBUILD_TAIL_RATIO = float(os.getenv("ANN_REBUILD_TAIL_RATIO", "0.25"))
+
+# Compact removed (tombstoned) rows away in the background once there are this many
+TOMBSTONE_COMPACT_RATIO = float(os.getenv("TOMBSTONE_COMPACT_RATIO", "0.2"))
+TOMBSTONE_COMPACT_MIN = int(os.getenv("TOMBSTONE_COMPACT_MIN", "256"))
+COMPACT_BATCH_SIZE = 500  # rows per metadata lookup; under SQLite's parameter limit
+
+# Hybrid retrieval: BM25 keyword hits fused with vector hits (reciprocal rank
+# fusion). Each side contributes its best HYBRID_CANDIDATES (at least top_k).
+HYBRID_SEARCH_ENABLED = os.getenv("HYBRID_SEARCH_ENABLED", "true").lower() == "true"
+HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", "20"))
+# Legacy serialized FAISS index + JSON metadata; converted by `manage.py migrate_vector_store`
 INDEX_PATH = os.path.join(VECTOR_STORE_DIR, "faiss_index.index")
 DOCS_PATH = os.path.join(VECTOR_STORE_DIR, "documents.json")
 
 os.makedirs(VECTOR_STORE_DIR, exist_ok=True)
 
 # -----------------------------------------------------------------------------
-# Global model (lazy loaded)
+# Global model (lazy loaded, shared through the model registry)
 # -----------------------------------------------------------------------------
-_model: Optional[SentenceTransformer] = None
-_model_name: Optional[str] = None
 
 
 def _current_model_name() -> str:
@@ -47,28 +98,35 @@ def _current_model_name() -> str:
     return DEFAULT_DEV_MODEL
 
 
-def get_model() -> Optional[SentenceTransformer]:
+def _cache_namespace() -> str:
+    """Embedding-cache key prefix; int8 vectors are close to fp32 ones but not identical."""
+    name = _current_model_name()
+    if EMBEDDING_BACKEND == "onnx":
+        return f"{name}@onnx-int8" if ONNX_QUANTIZED else f"{name}@onnx"
+    return name
+
+
+class EmbeddingUnavailableError(RuntimeError):
+    """Chunks had to be embedded but no embedding model could be loaded."""
+
+
+def get_model() -> Optional["SentenceTransformer"]:
     """
     Lazy load the embedding model. Returns None if embeddings are disabled.
-    Keeps the same signature you use elsewhere.
+    This is the only embedding model the app uses; embedder.py delegates here.
+    With EMBEDDING_BACKEND=onnx this is an OnnxEncoder, which has the same encode().
     """
-    global _model, _model_name
-
     if not EMBEDDING_ENABLED:
         logger.warning("Embeddings are disabled by EMBEDDING_ENABLED=false.")
         return None
 
-    if _model is not None:
-        return _model
-
+    model_name = _current_model_name()
     try:
-        _model_name = _current_model_name()
-        logger.info(f"Loading SentenceTransformer model: {_model_name} (device=cpu)")
-        _model = SentenceTransformer(_model_name, device="cpu")
-        logger.info(f"✓ Embedding model loaded: {_model_name}")
-        return _model
+        if EMBEDDING_BACKEND == "onnx":
+            return get_onnx_encoder(model_name, quantized=ONNX_QUANTIZED)
+        return get_sentence_transformer(model_name, device="cpu")
     except Exception as e:
-        logger.error(f"✗ Failed to load embedding model '{_model_name}': {e}")
+        logger.error(f"✗ Failed to load embedding model '{model_name}': {e}")
         # In production, fail gracefully if model can’t load
         if ENVIRONMENT == "production":
             return None
@@ -77,26 +135,21 @@ def get_model() -> Optional[SentenceTransformer]:
 
 
 # -----------------------------------------------------------------------------
-# Metadata I/O
+# Helper: batched encoding to avoid RAM spikes (cache-aware)
 # -----------------------------------------------------------------------------
-def _save_docs_metadata(docs_meta: List[Dict[str, Any]]) -> None:
-    with open(DOCS_PATH, "w", encoding="utf-8") as f:
-        json.dump(docs_meta, f, ensure_ascii=False, indent=2)
+_embedding_cache: Optional[EmbeddingCache] = (
+    EmbeddingCache(EMBEDDING_CACHE_PATH, EMBEDDING_CACHE_MAX_ENTRIES) if EMBEDDING_CACHE_ENABLED else None
+)
 
 
-def _load_docs_metadata() -> List[Dict[str, Any]]:
-    if os.path.exists(DOCS_PATH):
-        with open(DOCS_PATH, "r", encoding="utf-8") as f:
-            return json.load(f)
-    return []
+def get_embedding_cache() -> Optional[EmbeddingCache]:
+    return _embedding_cache
 
 
-# -----------------------------------------------------------------------------
-# Helper: batched encoding to avoid RAM spikes
-# -----------------------------------------------------------------------------
-def _encode_texts_batched(model: SentenceTransformer, texts: List[str]) -> np.ndarray:
-    if not texts:
-        return np.empty((0, 384), dtype="float32")  # shape placeholder; overwritten anyway
+def _encode_uncached(model: "SentenceTransformer", texts: List[str],
+                     batcher: Optional[QueryBatcher] = None) -> np.ndarray:
+    if batcher is not None:
+        return np.vstack([batcher.encode(t) for t in texts])
 
     all_embs: List[np.ndarray] = []
     for i in range(0, len(texts), ENCODE_BATCH_SIZE):
@@ -111,21 +164,480 @@ def _encode_texts_batched(model: SentenceTransformer, texts: List[str]) -> np.nd
     return np.vstack(all_embs)
 
 
+def _normalize(embs: np.ndarray) -> np.ndarray:
+    """Unit-length float32 rows, so inner product is cosine similarity."""
+    embs = np.asarray(embs, dtype="float32")
+    return embs / np.clip(np.linalg.norm(embs, axis=1, keepdims=True), 1e-12, None)
+
+
+def _encode_texts_batched(model: "SentenceTransformer", texts: List[str],
+                          batcher: Optional[QueryBatcher] = None) -> np.ndarray:
+    """
+    Encode `texts` to L2-normalized rows, serving repeats from the embedding
+    cache. Pass `batcher` for latency-sensitive single queries so concurrent
+    requests share a call.
+    """
+    if not texts:
+        return np.empty((0, 384), dtype="float32")  # shape placeholder; overwritten anyway
+    return _normalize(_encode_cached(model, texts, batcher))
+
+
+def _encode_cached(model: "SentenceTransformer", texts: List[str],
+                   batcher: Optional[QueryBatcher] = None) -> np.ndarray:
+    if not texts:
+        return np.empty((0, 384), dtype="float32")  # shape placeholder; overwritten anyway
+
+    if _embedding_cache is None:
+        return _encode_uncached(model, texts, batcher)
+
+    model_name = _cache_namespace()
+    try:
+        cached = _embedding_cache.get_many(model_name, texts)
+    except Exception as e:
+        logger.warning(f"⚠ Embedding cache read failed, encoding everything: {e}")
+        return _encode_uncached(model, texts, batcher)
+
+    missing = [i for i in range(len(texts)) if i not in cached]
+    if not missing:
+        return np.vstack([cached[i] for i in range(len(texts))])
+
+    new_embs = _encode_uncached(model, [texts[i] for i in missing], batcher)
+    try:
+        _embedding_cache.put_many(model_name, [texts[i] for i in missing], new_embs)
+    except Exception as e:
+        logger.warning(f"⚠ Embedding cache write failed: {e}")
+
+    out = np.empty((len(texts), new_embs.shape[1]), dtype="float32")
+    out[missing] = new_embs
+    for i, vec in cached.items():
+        out[i] = vec
+    return out
+
+
+def _encode_query_batch(texts: List[str]) -> np.ndarray:
+    return get_model().encode(texts, show_progress_bar=False, convert_to_numpy=True).astype("float32")
+
+
+_query_batcher: Optional[QueryBatcher] = QueryBatcher(_encode_query_batch) if QUERY_BATCHING_ENABLED else None
+
+
+def get_query_batcher() -> Optional[QueryBatcher]:
+    """Process-wide micro-batcher for query embeddings (None if disabled)."""
+    return _query_batcher
+
+
+# -----------------------------------------------------------------------------
+# Process-resident store (vectors mapped per worker, metadata row-addressable)
+# -----------------------------------------------------------------------------
+_UNLOADED = ("unloaded",)
+_NO_IDS = np.empty(0, dtype="int64")
+# Generations are unique across every store in the process, so a shard that
+# is evicted and reloaded never repeats a generation a cache has seen
+_generations = itertools.count(1)
+
+
+class StoreSnapshot(NamedTuple):
+    vectors: np.ndarray               # full matrix, rows are vector ids
+    ann: Optional[faiss.Index] = None  # covers rows [0, ann_count)
+    ann_count: int = 0
+    deleted: np.ndarray = _NO_IDS     # tombstoned vector ids, filtered out of results
+    epoch: int = 0                    # chunk rows to resolve ids against
+    lex_docs: int = 0                 # rows with keyword postings (BM25 N)
+    lex_tokens: int = 0               # their total length (BM25 avgdl = lex_tokens / lex_docs)
+    metric: str = "l2"                # "ip" for normalized rows (see VECTOR_METRIC)
+
+
+class _StaleEpoch(Exception):
+    """A writer moved the store on while a snapshot was being opened."""
+
+
+class _VectorStore:
+    """
+    Keeps the vector matrix resident for the whole process and fronts the
+    chunk metadata table. Vectors are memory-mapped from `vectors.f32`, so
+    workers share one page-cache copy. The mapping is re-opened only when the
+    header's (mtime, size) stamp changes, so writes from other workers are
+    picked up without paying a load per query. Metadata is fetched per hit
+    from `chunks`, keyed by vector id.
+
+    The row number is the chunk id, so the matrix is its own id map. Removed
+    chunks are tombstoned (filtered at search time) until compact() rewrites
+    the matrix and renumbers the survivors.
+
+    A snapshot is opened from one read of the header (the generation
+    manifest) and carries its epoch, so the matrix, ANN index, tombstones and
+    chunk rows it resolves always belong together. Readers take no locks;
+    writers serialise on `write_lock`, which also excludes other processes.
+    """
+
+    def __init__(self, vectors_path: str, header_path: str, chunks: ChunkStore,
+                 ann_index_path: Optional[str] = None, ann_meta_path: Optional[str] = None,
+                 legacy_index_path: Optional[str] = None, legacy_docs_path: Optional[str] = None,
+                 name: str = "public"):
+        self.name = name
+        self.directory = os.path.dirname(vectors_path)
+        self.vectors_path = vectors_path
+        self.header_path = header_path
+        self.chunks = chunks
+        self.ann_index_path = ann_index_path
+        self.ann_meta_path = ann_meta_path
+        self.legacy_index_path = legacy_index_path
+        self.legacy_docs_path = legacy_docs_path
+        self._lock = threading.RLock()
+        self.write_lock = lock_for(os.path.join(self.directory, "write.lock"))
+        self._snapshot: Optional[StoreSnapshot] = None
+        self._stamp: Optional[Tuple] = _UNLOADED
+        self.generation = 0
+
+    def _disk_stamp(self) -> Optional[Tuple]:
+        # Headers are only ever replaced (os.replace), so every write gets a new
+        # inode; mtime and size alone miss same-size rewrites within one tick
+        try:
+            h = os.stat(self.header_path)
+        except FileNotFoundError:
+            return None
+        try:
+            a = os.stat(self.ann_meta_path) if self.ann_meta_path else None
+            ann_stamp = (a.st_ino, a.st_mtime_ns, a.st_size) if a else None
+        except FileNotFoundError:
+            ann_stamp = None
+        return (h.st_ino, h.st_mtime_ns, h.st_size, ann_stamp)
+
+    def _load_ann(self, epoch: int, count: int, metric: str) -> Tuple[Optional[faiss.Index], int]:
+        meta = ann_index.read_meta(self.ann_meta_path) if self.ann_meta_path else None
+        if (not ann_index.matches(meta) or int(meta.get("epoch", 0)) != epoch
+                or meta.get("metric", "l2") != metric):
+            return None, 0  # none, or built over another epoch's rows: exact scan
+        try:
+            index = ann_index.load(ann_index.index_file(self.ann_index_path, meta))
+        except Exception as e:
+            # Replaced between reading the metadata and opening it
+            logger.warning(f"⚠ ANN index for '{self.name}' unavailable, using exact search: {e}")
+            return None, 0
+        return index, min(int(index.ntotal), count)
+
+    def _open(self) -> Optional[StoreSnapshot]:
+        header = vector_file.read_header(self.header_path)
+        if header is None:
+            if self.legacy_index_path and os.path.exists(self.legacy_index_path):
+                # Not migrated yet: serve from a private heap copy until it is
+                logger.warning("⚠ Using legacy FAISS index; run `manage.py migrate_vector_store`")
+                index = faiss.read_index(self.legacy_index_path)
+                vectors = index.reconstruct_n(0, index.ntotal) if index.ntotal else None
+                if self.legacy_docs_path and not self.chunks.head(1):
+                    self.chunks.import_json(self.legacy_docs_path)
+                if vectors is not None:
+                    return StoreSnapshot(vectors, epoch=self.chunks.epoch())
+            return None
+
+        epoch = vector_file.epoch_of(header)
+        metric = vector_file.metric_of(header)
+        vectors = vector_file.open_matrix(self.vectors_path, self.header_path, header)
+        if vectors is None:
+            return None
+        deleted = self.chunks.tombstones(epoch)
+        if deleted is None:
+            raise _StaleEpoch(epoch)
+        stats = self.chunks.lexical_stats(epoch)
+        if stats is None:
+            raise _StaleEpoch(epoch)
+        ann, ann_count = self._load_ann(epoch, vectors.shape[0], metric)
+        return StoreSnapshot(
+            vectors, ann, ann_count, np.asarray(deleted, dtype="int64"), epoch, *stats, metric=metric
+        )
+
+    def _reload(self, stamp: Optional[Tuple]) -> None:
+        snap = None
+        for attempt in range(3):
+            try:
+                snap = self._open()
+                break
+            except (FileNotFoundError, _StaleEpoch) as e:
+                # A rewrite replaced the files between reading the header and opening them
+                logger.info(f"Vector store '{self.name}' changed while opening ({e!r}); retrying")
+                stamp = self._disk_stamp()
+            except Exception as e:
+                logger.error(f"✗ Failed to open vector store: {e}")
+                break
+        self._snapshot = snap
+        self._stamp = stamp
+        self.generation = next(_generations)
+        if snap is not None:
+            logger.info(
+                f"✓ Vector store '{self.name}' mapped (generation={self.generation}, epoch={snap.epoch}, "
+                f"vectors={snap.vectors.shape[0]}, deleted={len(snap.deleted)}, metric={snap.metric}, "
+                f"ann={f'{ann_index.INDEX_TYPE}/{ann_index.VECTOR_STORAGE}' if snap.ann is not None else 'none'})"
+            )
+            if snap.metric != VECTOR_METRIC:
+                logger.warning(f"⚠ '{self.name}' holds raw {snap.metric} vectors; normalizing it in the background")
+                _start_background(normalize_store, self)
+
+    def snapshot(self) -> Optional[StoreSnapshot]:
+        """
+        Return the current vectors (+ ANN index), reopening only if the headers
+        changed. The matrix row count is the visibility bound: every id below
+        it has metadata.
+        """
+        stamp = self._disk_stamp()
+        if stamp != self._stamp:
+            with self._lock:
+                # Another thread may have reloaded while we waited on the lock
+                if stamp != self._stamp:
+                    with span("index.load"):
+                        self._reload(stamp)
+        return self._snapshot
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._stamp = _UNLOADED
+
+    def exists(self) -> bool:
+        """Whether anything was ever written to this shard."""
+        return os.path.exists(self.chunks.path)
+
+
+_store = _VectorStore(
+    VECTORS_PATH,
+    VECTORS_HEADER_PATH,
+    ChunkStore(CHUNKS_DB_PATH),
+    ann_index_path=ANN_INDEX_PATH,
+    ann_meta_path=ANN_META_PATH,
+    legacy_index_path=INDEX_PATH,
+    legacy_docs_path=DOCS_PATH,
+)
+
+
+def _tenant_store(owner_id: int) -> _VectorStore:
+    directory = os.path.join(TENANT_SHARDS_DIR, str(int(owner_id)))
+    return _VectorStore(
+        os.path.join(directory, "vectors.f32"),
+        os.path.join(directory, "vectors.json"),
+        ChunkStore(os.path.join(directory, "chunks.sqlite3")),
+        ann_index_path=os.path.join(directory, "ann.index"),
+        ann_meta_path=os.path.join(directory, "ann.json"),
+        name=f"tenant:{owner_id}",
+    )
+
+
+_tenant_stores: "OrderedDict[int, _VectorStore]" = OrderedDict()
+_tenant_lock = threading.Lock()
+
+
+def get_store(owner_id: Optional[int] = None) -> _VectorStore:
+    """
+    The shard holding `owner_id`'s documents, or the public shard for None.
+    Tenant shards are opened on demand; the least recently used are dropped
+    (and their mappings released once no request holds a snapshot).
+    """
+    if owner_id is None:
+        return _store
+    with _tenant_lock:
+        store = _tenant_stores.get(owner_id)
+        if store is None:
+            store = _tenant_stores[owner_id] = _tenant_store(owner_id)
+        _tenant_stores.move_to_end(owner_id)
+        while len(_tenant_stores) > VECTOR_SHARD_CACHE_SIZE:
+            _tenant_stores.popitem(last=False)
+        return store
+
+
+def visible_stores(owner_id: Optional[int] = None) -> List[_VectorStore]:
+    """Shards a caller may search: the public one plus their own, if it exists."""
+    stores = [_store]
+    if owner_id is not None and os.path.isdir(os.path.join(TENANT_SHARDS_DIR, str(int(owner_id)))):
+        stores.append(get_store(owner_id))
+    return stores
+
+
+def tenant_owner_ids() -> List[int]:
+    """Owners with a shard on disk."""
+    if not os.path.isdir(TENANT_SHARDS_DIR):
+        return []
+    return sorted(int(name) for name in os.listdir(TENANT_SHARDS_DIR) if name.isdigit())
+
+
+def loaded_stores() -> List[_VectorStore]:
+    """The public shard plus every tenant shard currently open in this process."""
+    with _tenant_lock:
+        return [_store, *_tenant_stores.values()]
+
+
+def get_vectors(ids: List[int], store: Optional[_VectorStore] = None) -> np.ndarray:
+    """Stored embeddings for the given vector ids, in order (no re-encoding)."""
+    snap = (store or _store).snapshot()
+    if snap is None or not ids:
+        return np.empty((0, 0), dtype="float32")
+    return np.asarray(snap.vectors[ids], dtype="float32")
+
+
 # -----------------------------------------------------------------------------
 # Index builders and appenders
 # -----------------------------------------------------------------------------
-def build_index(text_chunks: List[str], metadatas: List[Dict[str, Any]]) -> None:
+@contextmanager
+def _writing(store: _VectorStore):
+    """Hold the shard's write lock, finishing any rewrite a crashed writer left half-published."""
+    with store.write_lock:
+        _recover(store)
+        yield
+
+
+def _recover(store: _VectorStore) -> None:
     """
-    Build or rebuild FAISS index from scratch.
+    A pending header means a rewrite died between prepare() and publish().
+    The chunk table's epoch says whether its rows were committed: if so the
+    rewrite is rolled forward, otherwise its files are dropped.
+    """
+    pending = vector_file.read_pending(store.header_path)
+    if pending is None:
+        return
+    if store.exists() and store.chunks.epoch() == vector_file.epoch_of(pending):
+        vector_file.publish_pending(store.vectors_path, store.header_path)
+        logger.warning(f"⚠ Finished an interrupted rewrite of '{store.name}' (epoch {pending['epoch']})")
+    else:
+        vector_file.discard_pending(store.vectors_path, store.header_path)
+        logger.warning(f"⚠ Rolled back an interrupted rewrite of '{store.name}'")
+    store.invalidate()
+
+
+class IndexBuilder:
+    """
+    Streams a full rebuild. Rows are encoded in bounded batches and spilled to
+    a temp matrix and a staging table, so memory stays flat regardless of
+    corpus size; commit() swaps both in and retrains the ANN index. Rows with
+    precomputed embeddings (e.g. unchanged documents) skip the encoder.
+
+    Only commit() takes the write lock, so uploads keep landing while a
+    rebuild encodes. Documents uploaded or removed meanwhile keep their live
+    rows in the new epoch instead of the rebuild's copy.
+    """
+
+    def __init__(self, batch_size: int = ENCODE_BATCH_SIZE, store: Optional[_VectorStore] = None):
+        self.store = store or _store
+        self.batch_size = batch_size
+        self.model = None
+        self.count = 0
+        self.encoded = 0
+        self.encode_seconds = 0.0
+        self._pending_texts: List[str] = []
+        self._pending_metas: List[Dict[str, Any]] = []
+        os.makedirs(self.store.directory, exist_ok=True)
+        self._writer = vector_file.MatrixWriter(self.store.vectors_path, self.store.header_path)
+        self._table = self.store.chunks.begin_staging()
+        # Changes after this point are carried over on commit (see _carry_over)
+        self._base_seq = self.store.chunks.change_seq()
+
+    def _write(self, texts: List[str], metadatas: List[Dict[str, Any]], embeddings: np.ndarray) -> None:
+        self.store.chunks.stage(self._table, self.count, texts, metadatas)
+        # Rows copied from a store written before normalization get it here
+        self._writer.write(_normalize(embeddings))
+        self.count += len(texts)
+
+    def flush(self) -> None:
+        if not self._pending_texts:
+            return
+        if self.model is None:
+            self.model = get_model()
+            if self.model is None:
+                raise RuntimeError("Embedding model unavailable")
+        t0 = time.perf_counter()
+        embs = _encode_texts_batched(self.model, self._pending_texts)
+        self.encode_seconds += time.perf_counter() - t0
+        self.encoded += len(self._pending_texts)
+        self._write(self._pending_texts, self._pending_metas, embs)
+        self._pending_texts, self._pending_metas = [], []
+
+    def add(self, texts: List[str], metadatas: List[Dict[str, Any]], embeddings: Optional[np.ndarray] = None) -> None:
+        if embeddings is not None:
+            # Keep ids in arrival order: encode anything queued before these
+            self.flush()
+            self._write(texts, metadatas, embeddings)
+            return
+        self._pending_texts.extend(texts)
+        self._pending_metas.extend(metadatas)
+        if len(self._pending_texts) >= self.batch_size:
+            self.flush()
+
+    def _carry_over(self) -> Tuple[List[int], Set[int]]:
+        """
+        Bring documents changed since the rebuild started up to date: their
+        staged rows are superseded (returned, to tombstone) and their live
+        rows are copied in with the stored vectors. Runs under the write lock.
+        """
+        store = self.store
+        changed = store.chunks.changed_docs(self._base_seq)
+        if not changed:
+            return [], changed
+        stale = store.chunks.staged_ids_for_docs(self._table, changed)
+
+        header = vector_file.read_header(store.header_path)
+        rows = store.chunks.rows_for_docs(changed) if header else []
+        rows = [(i, r) for i, r in rows if i < header["count"]]
+        if rows:
+            vectors = vector_file.open_matrix(store.vectors_path, store.header_path, header)
+            for start in range(0, len(rows), COMPACT_BATCH_SIZE):
+                batch = rows[start : start + COMPACT_BATCH_SIZE]
+                self._write(
+                    [r["text"] for _, r in batch],
+                    [r["meta"] for _, r in batch],
+                    np.asarray(vectors[[i for i, _ in batch]], dtype="float32"),
+                )
+        logger.info(
+            f"Rebuild of '{store.name}': {len(changed)} documents changed meanwhile; "
+            f"kept {len(rows)} live rows, dropped {len(stale)} stale ones"
+        )
+        return stale, changed
+
+    def commit(self, doc_hashes: Optional[Dict[int, str]] = None) -> int:
+        self.flush()
+        store = self.store
+        store.chunks.seal_staging(self._table)
+        with _writing(store):
+            stale, changed = self._carry_over()
+            if doc_hashes is not None and changed:
+                doc_hashes = {d: h for d, h in doc_hashes.items() if d not in changed}
+            # Vectors and pending header first, then the chunk table (the
+            # commit point), then the header swap readers act on
+            epoch = store.chunks.epoch() + 1
+            self._writer.prepare(epoch, deleted=len(stale), metric=VECTOR_METRIC)
+            store.chunks.commit_staging(self._table, doc_hashes, tombstones=stale)
+            self._writer.publish()
+            if store.legacy_index_path and os.path.exists(store.legacy_index_path):
+                os.remove(store.legacy_index_path)  # superseded legacy index
+            vectors = vector_file.open_matrix(store.vectors_path, store.header_path)
+            if vectors is not None:
+                _build_ann(store, vectors, epoch, VECTOR_METRIC)
+            else:
+                ann_index.remove(store.ann_index_path, store.ann_meta_path)
+            store.invalidate()
+        return self.count
+
+    def abort(self) -> None:
+        self._writer.abort()
+        self.store.chunks.abort_staging(self._table)
+
+
+def _clear_store(store: _VectorStore) -> None:
+    with _writing(store):
+        vector_file.remove_matrix(store.vectors_path, store.header_path)
+        for path in (store.legacy_docs_path, store.legacy_index_path):
+            if path and os.path.exists(path):
+                os.remove(path)
+        ann_index.remove(store.ann_index_path, store.ann_meta_path)
+        if store.exists():
+            store.chunks.clear()
+        store.invalidate()
+    logger.info(f"✓ Index '{store.name}' cleared (no documents)")
+
+
+def build_index(text_chunks: List[str], metadatas: List[Dict[str, Any]], owner_id: Optional[int] = None) -> None:
+    """
+    Build or rebuild one owner's shard (the public shard for None) from scratch.
     - Dev: full capability (build in-process).
     - Prod: still allowed with smaller model & batch caps; recommended to precompute offline if data is large.
     """
+    store = get_store(owner_id)
     if not text_chunks:
-        # Clean up if no chunks provided
-        for path in (INDEX_PATH, DOCS_PATH):
-            if os.path.exists(path):
-                os.remove(path)
-        logger.info("✓ Index cleared (no documents)")
+        _clear_store(store)
         return
 
     model = get_model()
@@ -133,31 +645,51 @@ def build_index(text_chunks: List[str], metadatas: List[Dict[str, Any]]) -> None
         logger.warning("Embedding model unavailable. Skipping index build.")
         return
 
+    builder = IndexBuilder(store=store)
     try:
         logger.info(f"Building index for {len(text_chunks)} chunks (batch={ENCODE_BATCH_SIZE})...")
-        embeddings = _encode_texts_batched(model, text_chunks)  # batched to avoid OOM
-
-        dim = embeddings.shape[1]
-        index = faiss.IndexFlatL2(dim)
-        index.add(embeddings)
-
-        faiss.write_index(index, INDEX_PATH)
-        _save_docs_metadata(
-            [{"text": t, "meta": m} for t, m in zip(text_chunks, metadatas)]
-        )
-        logger.info(f"✓ Index built successfully: {len(text_chunks)} chunks indexed, dim={dim}")
+        builder.add(text_chunks, metadatas)  # encoded in batches to avoid OOM
+        count = builder.commit()
+        logger.info(f"✓ Index built successfully: {count} chunks indexed")
     except MemoryError as me:
+        builder.abort()
         logger.error(f"✗ MemoryError during index build: {me}")
         if ENVIRONMENT == "production":
             logger.error("Consider precomputing embeddings offline or upgrading memory.")
         raise
     except Exception as e:
+        builder.abort()
         logger.error(f"✗ Error building index: {e}")
         raise
 
 
-def add_documents(text_chunks: List[str], metadatas: List[Dict[str, Any]]) -> None:
-    """Append to existing FAISS index (creates index if missing)."""
+def _migrate_if_legacy(store: _VectorStore) -> None:
+    """Convert the public shard's legacy index before its first write. Call under the write lock."""
+    if store is _store and not os.path.exists(VECTORS_HEADER_PATH) and os.path.exists(INDEX_PATH):
+        migrate_legacy_index()
+
+
+def _append(store: _VectorStore, text_chunks: List[str], metadatas: List[Dict[str, Any]],
+            new_embs: np.ndarray) -> bool:
+    """Append pre-encoded rows. Returns False when there is no store to append to yet."""
+    with _writing(store):
+        _migrate_if_legacy(store)
+
+        header = vector_file.read_header(store.header_path)
+        if header is None:
+            return False
+        # Metadata first, vectors second: rows only become visible to
+        # queries once the vector header count covers them
+        store.chunks.append(header["count"], text_chunks, metadatas)
+        total = vector_file.append_rows(store.vectors_path, store.header_path, new_embs)
+        _maybe_rebuild_ann(store, total)
+        store.invalidate()
+    logger.info(f"✓ Appended {len(text_chunks)} chunks to '{store.name}' (total: {total})")
+    return True
+
+
+def add_documents(text_chunks: List[str], metadatas: List[Dict[str, Any]], owner_id: Optional[int] = None) -> None:
+    """Append to an owner's shard (the public shard for None); creates it if missing."""
     if not text_chunks:
         logger.info("No chunks to add")
         return
@@ -168,21 +700,11 @@ def add_documents(text_chunks: List[str], metadatas: List[Dict[str, Any]]) -> No
         return
 
     try:
+        # Encode outside the write lock; only the file updates are serialised
         new_embs = _encode_texts_batched(model, text_chunks)
-
-        if os.path.exists(INDEX_PATH):
-            index = faiss.read_index(INDEX_PATH)
-            index.add(new_embs)
-
-            docs = _load_docs_metadata()
-            docs.extend([{"text": t, "meta": m} for t, m in zip(text_chunks, metadatas)])
-            _save_docs_metadata(docs)
-
-            faiss.write_index(index, INDEX_PATH)
-            logger.info(f"✓ Appended {len(text_chunks)} chunks (total: {len(docs)})")
-        else:
+        if not _append(get_store(owner_id), text_chunks, metadatas, new_embs):
             logger.info("No existing index found, building new one...")
-            build_index(text_chunks, metadatas)
+            build_index(text_chunks, metadatas, owner_id=owner_id)
     except MemoryError as me:
         logger.error(f"✗ MemoryError during append: {me}")
         if ENVIRONMENT == "production":
@@ -193,57 +715,409 @@ def add_documents(text_chunks: List[str], metadatas: List[Dict[str, Any]]) -> No
         raise
 
 
+# -----------------------------------------------------------------------------
+# Removal: tombstones + background compaction
+# -----------------------------------------------------------------------------
+_compaction_thread: Optional[threading.Thread] = None
+
+
+def _publish_tombstones(store: _VectorStore) -> None:
+    """Record the tombstone count in the header so every process reloads its snapshot."""
+    header = vector_file.read_header(store.header_path)
+    if header is None:
+        return
+    deleted = len(store.chunks.tombstones())
+    vector_file.update_header(store.header_path, deleted=deleted)
+    store.invalidate()
+    _maybe_compact(store, deleted, header["count"])
+
+
+def remove_document(doc_id: int, owner_id: Optional[int] = None) -> int:
+    """
+    Remove every chunk of a document from its owner's shard. Its rows stop
+    matching immediately and are dropped from disk by a later compaction.
+    Returns chunks removed.
+    """
+    store = get_store(owner_id)
+    if not store.exists():
+        return 0
+    with _writing(store):
+        removed = store.chunks.tombstone_doc(doc_id)
+        if removed:
+            _publish_tombstones(store)
+    if removed:
+        logger.info(f"✓ Removed document {doc_id} ({removed} chunks tombstoned)")
+    return removed
+
+
+def replace_document(doc_id: int, text_chunks: List[str], metadatas: List[Dict[str, Any]],
+                     owner_id: Optional[int] = None) -> None:
+    """
+    Swap a document's chunks for new ones. The new rows are published before
+    the old ones are tombstoned, so the document never disappears from search.
+    Raises EmbeddingUnavailableError (leaving the old chunks in place) when
+    there are chunks to embed and no model.
+    """
+    model = get_model() if text_chunks else None
+    if text_chunks and model is None:
+        raise EmbeddingUnavailableError(f"Embedding model unavailable; document {doc_id} not indexed")
+
+    store = get_store(owner_id)
+    new_embs = _encode_texts_batched(model, text_chunks) if text_chunks else None
+    with _writing(store):
+        # A legacy store only has the document's rows once it is migrated
+        _migrate_if_legacy(store)
+        old_ids = store.chunks.ids_for_doc(doc_id) if store.exists() else []
+        if text_chunks and not _append(store, text_chunks, metadatas, new_embs):
+            # No matrix to append to: the rebuild is a new epoch holding only
+            # these rows, and old_ids would now name some of them
+            build_index(text_chunks, metadatas, owner_id=owner_id)
+            return
+        if old_ids:
+            store.chunks.tombstone(old_ids)
+            _publish_tombstones(store)
+
+
+def compact(store: Optional[_VectorStore] = None, rewrite: bool = False) -> int:
+    """
+    Rewrite a shard without tombstoned rows, reusing the stored vectors (no
+    re-embedding) and retraining the ANN index. Returns rows dropped.
+    `rewrite` rewrites it even with nothing to drop, e.g. to normalize an
+    older store or rebuild its index for a new VECTOR_STORAGE.
+    """
+    store = store or _store
+    if not store.exists():
+        return 0
+    with _writing(store):
+        deleted = np.asarray(store.chunks.tombstones(), dtype="int64")
+        vectors = vector_file.open_matrix(store.vectors_path, store.header_path)
+        if vectors is None or not (len(deleted) or rewrite):
+            return 0
+
+        live = np.setdiff1d(np.arange(vectors.shape[0], dtype="int64"), deleted)
+        if not len(live):
+            _clear_store(store)
+            return int(vectors.shape[0])
+
+        t0 = time.perf_counter()
+        builder = IndexBuilder(store=store)
+        try:
+            for start in range(0, len(live), COMPACT_BATCH_SIZE):
+                rows = store.chunks.get_rows(live[start : start + COMPACT_BATCH_SIZE].tolist())
+                if not rows:
+                    continue
+                ids = [i for i, _ in rows]
+                builder.add(
+                    [r["text"] for _, r in rows],
+                    [r["meta"] for _, r in rows],
+                    embeddings=np.asarray(vectors[ids], dtype="float32"),
+                )
+            kept = builder.commit()
+        except Exception:
+            builder.abort()
+            raise
+    dropped = int(vectors.shape[0]) - kept
+    logger.info(f"✓ Compacted '{store.name}': {dropped} rows dropped, {kept} kept ({time.perf_counter() - t0:.1f}s)")
+    return dropped
+
+
+def normalize_store(store: _VectorStore) -> bool:
+    """
+    Rewrite a shard stored before normalization (raw vectors, L2 search) as
+    normalized rows searched by inner product. Returns whether it did.
+    """
+    with _writing(store):
+        header = vector_file.read_header(store.header_path)
+        if header is None or vector_file.metric_of(header) == VECTOR_METRIC:
+            return False  # nothing mapped yet, or another worker got here first
+        compact(store, rewrite=True)
+    logger.info(f"✓ Normalized '{store.name}' for inner-product search")
+    return True
+
+
+def _run_in_background(task, store: _VectorStore) -> None:
+    try:
+        task(store)
+    except Exception as e:
+        logger.error(f"✗ Background compaction of '{store.name}' failed: {e}")
+
+
+def _start_background(task, store: _VectorStore) -> None:
+    global _compaction_thread
+    if _compaction_thread is not None and _compaction_thread.is_alive():
+        return  # the next removal / reload re-checks this shard
+    _compaction_thread = threading.Thread(
+        target=_run_in_background, args=(task, store), name="vector-compaction", daemon=True
+    )
+    _compaction_thread.start()
+
+
+def _maybe_compact(store: _VectorStore, deleted: int, total: int) -> None:
+    if deleted < max(TOMBSTONE_COMPACT_MIN, TOMBSTONE_COMPACT_RATIO * total):
+        return
+    _start_background(compact, store)
+
+
+def _build_ann(store: _VectorStore, vectors: np.ndarray, epoch: int, metric: str) -> None:
+    """
+    (Re)train the configured ANN / compressed index over `epoch`'s `vectors`,
+    or drop it for plain float32 flat search.
+    """
+    index = ann_index.build(vectors, metric=metric)
+    if index is None:
+        ann_index.remove(store.ann_index_path, store.ann_meta_path)
+        return
+    ann_index.write(index, store.ann_index_path, store.ann_meta_path, ann_index.INDEX_TYPE, epoch, metric=metric)
+
+
+def _maybe_rebuild_ann(store: _VectorStore, total: int) -> None:
+    """Retrain from the stored matrix (no re-embedding) once the exact-scan tail gets large."""
+    if not ann_index.enabled():
+        return
+    header = vector_file.read_header(store.header_path)
+    epoch = vector_file.epoch_of(header)
+    meta = ann_index.read_meta(store.ann_meta_path)
+    current = ann_index.matches(meta) and int(meta.get("epoch", 0)) == epoch
+    covered = int(meta["count"]) if current else 0
+    tail = total - covered
+    if tail >= max(ann_index.MIN_ANN_VECTORS, ANN_REBUILD_TAIL_RATIO * covered):
+        logger.info(f"Rebuilding {ann_index.INDEX_TYPE} index for '{store.name}' ({tail} vectors outside it)...")
+        matrix = vector_file.open_matrix(store.vectors_path, store.header_path, header)
+        _build_ann(store, matrix, epoch, vector_file.metric_of(header))
+
+
+def migrate_legacy_index(remove_legacy: bool = False) -> int:
+    """
+    Convert the serialized `faiss_index.index` + `documents.json` pair into the
+    memory-mapped `vectors.f32` matrix and the `chunks` table. JSON rows already
+    line up with vector ids. Returns the number of vectors converted.
+    """
+    index = faiss.read_index(INDEX_PATH)
+    vectors = index.reconstruct_n(0, index.ntotal) if index.ntotal else np.empty((0, index.d), dtype="float32")
+    vectors = _normalize(vectors)
+    with _store.write_lock:
+        rows = _store.chunks.import_json(DOCS_PATH)
+        epoch = _store.chunks.epoch()
+        vector_file.write_matrix(VECTORS_PATH, VECTORS_HEADER_PATH, vectors, epoch, metric=VECTOR_METRIC)
+        _build_ann(_store, vectors, epoch, VECTOR_METRIC)
+        _store.invalidate()
+    if remove_legacy:
+        for path in (INDEX_PATH, DOCS_PATH):
+            if os.path.exists(path):
+                os.remove(path)
+    logger.info(f"✓ Migrated legacy FAISS index: {index.ntotal} vectors, {rows} chunks, dim={index.d}")
+    return int(index.ntotal)
+
+
 # -----------------------------------------------------------------------------
 # Query
 # -----------------------------------------------------------------------------
-def _safe_read_index() -> Optional[faiss.Index]:
-    if not os.path.exists(INDEX_PATH):
-        logger.warning("⚠ No index found, returning empty results")
+def _search(snap: StoreSnapshot, q_emb: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Search the ANN index (if any) plus an exact scan of rows appended since it
+    was built, merged by distance. Without an ANN index this is an exact scan
+    straight off the mapped matrix; no private copy is made.
+    """
+    n = snap.vectors.shape[0]
+    # Over-fetch by the tombstone count so k live hits survive the filter
+    fetch = min(n, k + len(snap.deleted))
+    if snap.ann is None:
+        D, I = _knn(q_emb, snap.vectors, fetch, snap.metric)
+    else:
+        D, I = snap.ann.search(q_emb, min(fetch, snap.ann_count))
+        if snap.metric == "ip":
+            D = -D
+        if n > snap.ann_count:
+            tail = snap.vectors[snap.ann_count :]
+            Dt, It = _knn(q_emb, tail, min(fetch, tail.shape[0]), snap.metric)
+            D = np.hstack([D, Dt])
+            I = np.hstack([I, It + snap.ann_count])
+            order = np.argsort(D, axis=1)[:, :fetch]
+            D = np.take_along_axis(D, order, axis=1)
+            I = np.take_along_axis(I, order, axis=1)
+    if len(snap.deleted):
+        D, I = _drop_deleted(D, I, snap.deleted, k)
+    return D, I
+
+
+def _knn(q_emb: np.ndarray, vectors: np.ndarray, k: int, metric: str) -> Tuple[np.ndarray, np.ndarray]:
+    """Exact search; distances ascend for either metric (inner products are negated)."""
+    D, I = faiss.knn(q_emb, vectors, k, metric=ann_index.faiss_metric(metric))
+    return (-D if metric == "ip" else D), I
+
+
+def _drop_deleted(D: np.ndarray, I: np.ndarray, deleted: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Keep the first k non-tombstoned hits per query; pad with -1 / inf."""
+    keep = ~np.isin(I, deleted)
+    order = np.argsort(~keep, axis=1, kind="stable")[:, :k]
+    D = np.take_along_axis(D, order, axis=1)
+    I = np.take_along_axis(I, order, axis=1)
+    gone = ~np.take_along_axis(keep, order, axis=1)
+    I[gone] = -1
+    D[gone] = np.inf
+    return D, I
+
+
+def index_generation(owner_id: Optional[int] = None) -> Tuple[int, ...]:
+    """
+    Generations of the shards `owner_id` can see, as seen by this process;
+    changes whenever any of them changes.
+    """
+    stores = visible_stores(owner_id)
+    for store in stores:
+        store.snapshot()
+    return tuple(store.generation for store in stores)
+
+
+def encode_query(query_text: str) -> Optional[np.ndarray]:
+    """Embed a query as a (1, dim) float32 array, or None if the model is unavailable."""
+    query_text = (query_text or "").strip()
+    with span("embed.model"):
+        model = get_model()
+    if not query_text or model is None:
         return None
     try:
-        return faiss.read_index(INDEX_PATH)
+        with span("embed.encode"):
+            return _encode_texts_batched(model, [query_text], batcher=_query_batcher)
     except Exception as e:
-        logger.error(f"✗ Failed to read FAISS index: {e}")
+        logger.error(f"✗ Error encoding query: {e}")
         return None
 
 
-def query(query_text: str, top_k: int = 3) -> List[Dict[str, Any]]:
+def search_ids(query_text: str, top_k: int = 3) -> List[int]:
+    """Vector ids of the nearest public-shard chunks, best first (no metadata lookup)."""
+    snap = _store.snapshot()
+    q_emb = encode_query(query_text)
+    if snap is None or q_emb is None:
+        return []
+    n = snap.vectors.shape[0]
+    _, I = _search(snap, q_emb, min(top_k, n))
+    return [int(i) for i in I[0] if 0 <= i < n]
+
+
+def _cosine(snap: StoreSnapshot, q_unit: np.ndarray, D: np.ndarray, ids: np.ndarray) -> np.ndarray:
+    """
+    Cosine similarity of hits `ids` (distances `D`) to the unit query. "ip"
+    distances are negated cosines already; raw "l2" rows are re-scored, since
+    their distances depend on each row's length and don't compare with "ip".
     """
-    Search for similar documents.
+    if snap.metric == "ip":
+        return -D
+    return _normalize(np.asarray(snap.vectors[ids], dtype="float32")) @ q_unit
+
+
+def _vector_hits(snaps: List[Optional[StoreSnapshot]], q_emb: np.ndarray, k: int) -> List[Tuple[int, int]]:
+    """Nearest k (shard position, vector id) pairs across shards by cosine similarity, best first."""
+    q_unit = _normalize(q_emb)[0]
+    hits: List[Tuple[float, int, int]] = []  # (-cosine, shard position, vector id)
+    for pos, snap in enumerate(snaps):
+        if snap is None:
+            continue
+        n = snap.vectors.shape[0]
+        D, I = _search(snap, q_emb, min(k, n))
+        found = (I[0] >= 0) & (I[0] < n)
+        ids = I[0][found]
+        scores = _cosine(snap, q_unit, D[0][found], ids)
+        hits.extend((-float(s), pos, int(i)) for s, i in zip(scores, ids))
+    hits.sort()
+    return [(p, i) for _, p, i in hits[:k]]
+
+
+def _keyword_hits(stores: List[_VectorStore], snaps: List[Optional[StoreSnapshot]],
+                  query_text: str, k: int) -> List[Tuple[int, int]]:
+    """Best k BM25 (shard position, vector id) pairs across shards, best first."""
+    terms = lexical.tokenize(query_text)
+    if not terms:
+        return []
+    hits: List[Tuple[float, int, int]] = []  # (-score, shard position, vector id)
+    for pos, (store, snap) in enumerate(zip(stores, snaps)):
+        if snap is None or not snap.lex_docs:
+            continue
+        segments = store.chunks.postings(terms, epoch=snap.epoch)
+        if not segments:
+            continue  # no matching terms, or the epoch is gone (caught when rows are fetched)
+        ids, scores = lexical.bm25(
+            segments, snap.lex_docs, snap.lex_tokens, k, snap.vectors.shape[0], snap.deleted
+        )
+        hits.extend((-float(s), pos, int(i)) for i, s in zip(ids, scores))
+    hits.sort()
+    return [(p, i) for _, p, i in hits[:k]]
+
+
+def _search_shards(stores: List[_VectorStore], q_emb: Optional[np.ndarray], top_k: int,
+                   query_text: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    Search each shard, merge by cosine similarity, then fetch metadata per
+    shard. With `query_text` the BM25 ranking is fused in (RRF) and `q_emb`
+    may be None for keyword-only search.
+    """
+    snaps = [store.snapshot() for store in stores]
+    if query_text is None:
+        with span("search.vector"):
+            hits = _vector_hits(snaps, q_emb, top_k)
+    else:
+        depth = max(top_k, HYBRID_CANDIDATES)
+        with span("search.keyword"):
+            rankings = [_keyword_hits(stores, snaps, query_text, depth)]
+        if q_emb is not None:
+            with span("search.vector"):
+                rankings.insert(0, _vector_hits(snaps, q_emb, depth))
+        hits = lexical.rrf(rankings)[:top_k]
+
+    rows: Dict[Tuple[int, int], Dict[str, Any]] = {}
+    for pos, store in enumerate(stores):
+        ids = [i for p, i in hits if p == pos]
+        if not ids:
+            continue
+        with span("search.metadata"):
+            found = store.chunks.get_rows(ids, epoch=snaps[pos].epoch)
+        if found is None:
+            # Two rebuilds landed mid-query; these ids no longer resolve
+            logger.warning(f"⚠ '{store.name}' moved on during the query; dropping its hits")
+            continue
+        rows.update(((pos, i), row) for i, row in found)
+    return [rows[key] for key in hits if key in rows]
+
+
+def query(query_text: str, top_k: int = 3, q_emb: Optional[np.ndarray] = None,
+          owner_id: Optional[int] = None, hybrid: Optional[bool] = None) -> List[Dict[str, Any]]:
+    """
+    Search for similar documents in the public shard plus `owner_id`'s shard.
     Returns: List of dicts with 'text' and 'meta' keys.
+    Pass `q_emb` (from encode_query) to reuse an embedding the caller already has.
+    `hybrid` overrides HYBRID_SEARCH_ENABLED (fuse BM25 keyword hits in).
     Production safety:
     - Uses batched encoding for the query (tiny batch).
-    - If model is unavailable, returns top_k docs (basic fallback) to avoid 500s.
+    - If model is unavailable, falls back to keyword search (hybrid) or the
+      first top_k docs, to avoid 500s.
     """
+    hybrid = HYBRID_SEARCH_ENABLED if hybrid is None else hybrid
     query_text = (query_text or "").strip()
     if not query_text:
         logger.warning("⚠ Empty query provided")
         return []
 
-    index = _safe_read_index()
-    if index is None:
-        return []
-
-    docs = _load_docs_metadata()
-    if not docs:
-        logger.warning("⚠ Index exists but no documents found")
+    stores = [store for store in visible_stores(owner_id) if store.snapshot() is not None]
+    if not stores:
+        logger.warning("⚠ No index found, returning empty results")
         return []
 
-    model = get_model()
-    if model is None:
+    with span("embed.model"):
+        model = get_model()
+    if model is None and not hybrid:
         logger.info("⚠ Model unavailable; returning first N docs as fallback.")
-        return docs[: min(top_k, len(docs))]
+        return stores[0].chunks.head(top_k)
 
     try:
-        q_emb = model.encode([query_text], convert_to_numpy=True).astype("float32")
-        # Limit top_k to available docs
-        k = min(top_k, len(docs))
-        D, I = index.search(q_emb, k)
-
-        results: List[Dict[str, Any]] = []
-        for idx in I[0]:
-            if 0 <= idx < len(docs):
-                results.append(docs[idx])
+        if model is None:
+            logger.info("⚠ Model unavailable; keyword search only.")
+            q_emb = None
+        elif q_emb is None:
+            with span("embed.encode"):
+                q_emb = _encode_texts_batched(model, [query_text], batcher=_query_batcher)
+        results = _search_shards(stores, q_emb, top_k, query_text if hybrid else None)
+        if not results:
+            logger.warning("⚠ Index exists but no documents found")
 
         logger.info(f"✓ Query returned {len(results)} results")
         return results
@@ -0,0 +1,22 @@
+# backend/chatbot/utils/executor.py
+#
+# Bounded thread pool for CPU-bound RAG work (embedding, FAISS search) called
+# from async views. Caps how many encodes run at once per worker so hundreds
+# of in-flight chats queue for CPU instead of oversubscribing it.
+
+import os
+import asyncio
+import functools
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+
+RAG_EXECUTOR_WORKERS = int(os.getenv("RAG_EXECUTOR_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+_executor = ThreadPoolExecutor(max_workers=RAG_EXECUTOR_WORKERS, thread_name_prefix="rag")
+
+
+async def run_blocking(fn, *args, **kwargs):
+    """Run `fn` on the bounded RAG pool and await its result (in the caller's context, e.g. its trace)."""
+    loop = asyncio.get_running_loop()
+    ctx = contextvars.copy_context()
+    return await loop.run_in_executor(_executor, functools.partial(ctx.run, fn, *args, **kwargs))
@@ -0,0 +1,116 @@
+# backend/chatbot/utils/file_lock.py
+#
+# Exclusive write lock shared by every thread and process on a host.
+#
+# Threads in one process queue on an RLock; the first acquisition also takes
+# an flock() on the lock file, so gunicorn workers, the ingest worker and
+# management commands writing the same vector store are serialised. The lock
+# is re-entrant within a thread. flock() locks are released by the kernel if
+# the holder dies, so a crashed writer never leaves the store locked.
+
+import os
+import time
+import threading
+from typing import Dict, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows: threads are still serialised, processes are not
+    fcntl = None
+
+# Seconds a writer waits for the lock before giving up (0 = wait forever)
+WRITE_LOCK_TIMEOUT = float(os.getenv("VECTOR_WRITE_LOCK_TIMEOUT", "300"))
+
+
+class FileLock:
+    def __init__(self, path: str, timeout: float = WRITE_LOCK_TIMEOUT):
+        self.path = path
+        self.timeout = timeout
+        self._thread_lock = threading.RLock()
+        self._depth = 0
+        self._fd: Optional[int] = None
+
+    def _lock_file(self) -> None:
+        if fcntl is None:
+            return
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        deadline = time.monotonic() + self.timeout if self.timeout else None
+        delay = 0.005
+        try:
+            while True:
+                try:
+                    fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    break
+                except BlockingIOError:
+                    if deadline is not None and time.monotonic() >= deadline:
+                        raise TimeoutError(f"Timed out after {self.timeout}s waiting for {self.path}")
+                    time.sleep(delay)
+                    delay = min(delay * 2, 0.1)
+        except BaseException:
+            os.close(fd)
+            raise
+        self._fd = fd
+
+    def _unlock_file(self) -> None:
+        if self._fd is None:
+            return
+        try:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+        finally:
+            os.close(self._fd)
+            self._fd = None
+
+    def acquire(self) -> None:
+        self._thread_lock.acquire()
+        if self._depth == 0:
+            try:
+                self._lock_file()
+            except BaseException:
+                self._thread_lock.release()
+                raise
+        self._depth += 1
+
+    def release(self) -> None:
+        self._depth -= 1
+        if self._depth == 0:
+            self._unlock_file()
+        self._thread_lock.release()
+
+    def forget(self) -> None:
+        """Drop state inherited across fork(); the parent still owns any lock it held."""
+        self._thread_lock = threading.RLock()
+        self._depth = 0
+        self._fd = None
+
+    def __enter__(self) -> "FileLock":
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.release()
+
+
+_locks: Dict[str, FileLock] = {}
+_locks_guard = threading.Lock()
+
+
+def lock_for(path: str) -> FileLock:
+    """
+    The process-wide lock for `path`. Separate flock() handles on one file
+    exclude each other even within a process, so everything locking the same
+    file must share one FileLock for re-entrant use to work.
+    """
+    path = os.path.abspath(path)
+    with _locks_guard:
+        lock = _locks.get(path)
+        if lock is None:
+            lock = _locks[path] = FileLock(path)
+        return lock
+
+
+def forget_all() -> None:
+    """Call in a forked child: locks held by the parent are not the child's."""
+    with _locks_guard:
+        for lock in _locks.values():
+            lock.forget()
@@ -0,0 +1,94 @@
+# backend/chatbot/utils/http_client.py
+#
+# Shared HTTP plumbing for remote inference: a pooled keep-alive session,
+# jittered exponential backoff, and a circuit breaker that fails fast while
+# the remote endpoint is unhealthy.
+
+import time
+import random
+import logging
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a remote endpoint that is known to be down."""
+
+
+def build_session(pool_size: int) -> requests.Session:
+    """Session whose connections (and TLS sessions) are reused across calls."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def backoff_delay(attempt: int, base: float, cap: float) -> float:
+    """Full-jitter exponential backoff: uniform(0, min(cap, base * 2**attempt))."""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+class CircuitBreaker:
+    """
+    closed    -> calls pass; `threshold` consecutive failures open the circuit
+    open      -> calls are rejected until `cooldown` seconds have passed
+    half-open -> one trial call; success closes, failure re-opens
+    """
+
+    def __init__(self, name: str, threshold: int, cooldown: float):
+        self.name = name
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._trial_in_flight = False
+
+    @property
+    def state(self) -> str:
+        if self._opened_at is None:
+            return "closed"
+        if time.monotonic() - self._opened_at >= self.cooldown:
+            return "half-open"
+        return "open"
+
+    def allow(self) -> bool:
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "half-open" and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self._opened_at is not None:
+                logger.info(f"✓ Circuit '{self.name}' closed")
+            self._failures = 0
+            self._opened_at = None
+            self._trial_in_flight = False
+
+    def release_trial(self) -> None:
+        """
+        Give up a half-open trial that ended without a verdict (cancelled, or an
+        unexpected error) so the next caller can make the trial. Outcomes that
+        were already recorded have released it; then this does nothing.
+        """
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            reopen = self._trial_in_flight
+            self._trial_in_flight = False
+            if reopen or (self._opened_at is None and self._failures >= self.threshold):
+                self._opened_at = time.monotonic()
+                logger.warning(f"⚠ Circuit '{self.name}' opened for {self.cooldown:.0f}s after {self._failures} failures")
@@ -0,0 +1,124 @@
+# backend/chatbot/utils/lexical.py
+#
+# BM25 keyword scoring over the chunk store's inverted index, and reciprocal
+# rank fusion (RRF) to merge it with vector search. Embeddings are weak on
+# exact terms (product names, plan names, error codes, prices); BM25 finds
+# those, so fusing both keeps the right chunk in a small top_k.
+#
+# Postings are packed numpy records (vector id, term frequency, chunk
+# length): 8 bytes per posting, decoded zero-copy with np.frombuffer. Each
+# write appends one segment per term; chunk_store merges a term's segments
+# once it has more than LEX_MAX_SEGMENTS.
+
+import os
+import re
+import math
+from collections import Counter
+from typing import Dict, Hashable, Iterable, List, Sequence, Tuple
+
+import numpy as np
+
+BM25_K1 = float(os.getenv("BM25_K1", "1.2"))
+BM25_B = float(os.getenv("BM25_B", "0.75"))
+# Rank constant of reciprocal rank fusion; 60 is the usual choice
+RRF_K = int(os.getenv("RRF_K", "60"))
+LEX_MAX_SEGMENTS = int(os.getenv("LEX_MAX_SEGMENTS", "8"))
+
+POSTING_DTYPE = np.dtype([("id", "<u4"), ("tf", "<u2"), ("dl", "<u2")])
+_U16_MAX = np.iinfo("uint16").max
+
+_TOKEN = re.compile(r"[^\W_]+")
+MAX_TERM_LENGTH = 40
+STOPWORDS = frozenset(
+    "a an and are as at be but by can do does for from had has have how i if in into is it its "
+    "me my no not of on or our so than that the their them then there these they this to us "
+    "was we were what when where which who why will with you your".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    """Lower-cased word and number tokens, stopwords dropped."""
+    return [
+        t for t in _TOKEN.findall((text or "").lower())
+        if t not in STOPWORDS and len(t) <= MAX_TERM_LENGTH
+    ]
+
+
+def build_postings(start_id: int, texts: Sequence[str]) -> Tuple[Dict[str, np.ndarray], List[int]]:
+    """Postings per term for rows start_id.., plus each row's length in tokens."""
+    entries: Dict[str, List[Tuple[int, int, int]]] = {}
+    lengths = []
+    for i, text in enumerate(texts):
+        counts = Counter(tokenize(text))
+        length = sum(counts.values())
+        lengths.append(length)
+        dl = min(length, _U16_MAX)
+        for term, tf in counts.items():
+            entries.setdefault(term, []).append((start_id + i, min(tf, _U16_MAX), dl))
+    return {term: np.array(rows, dtype=POSTING_DTYPE) for term, rows in entries.items()}, lengths
+
+
+def encode(postings: np.ndarray) -> bytes:
+    return postings.astype(POSTING_DTYPE, copy=False).tobytes()
+
+
+def decode(blob: bytes) -> np.ndarray:
+    return np.frombuffer(blob, dtype=POSTING_DTYPE)
+
+
+def merge(blobs: Iterable[bytes]) -> bytes:
+    """One segment from several, in id order."""
+    merged = np.concatenate([decode(b) for b in blobs])
+    return encode(merged[np.argsort(merged["id"], kind="stable")])
+
+
+def bm25(segments: Iterable[Tuple[str, bytes]], docs: int, total_length: int, limit: int,
+         visible: int, deleted: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Top `limit` (ids, scores) for the query terms' posting segments. Only ids
+    below `visible` that are not in `deleted` are scored; document frequency
+    counts every posting, which only matters until the next compaction.
+    """
+    by_term: Dict[str, List[np.ndarray]] = {}
+    for term, blob in segments:
+        by_term.setdefault(term, []).append(decode(blob))
+    if not by_term or docs <= 0:
+        return np.empty(0, dtype="int64"), np.empty(0, dtype="float32")
+
+    avgdl = max(total_length / docs, 1.0)
+    ids_parts, weight_parts = [], []
+    for parts in by_term.values():
+        p = np.concatenate(parts) if len(parts) > 1 else parts[0]
+        df = len(p)
+        n = max(docs, df)
+        idf = math.log(1.0 + (n - df + 0.5) / (df + 0.5))
+        tf = p["tf"].astype("float32")
+        norm = BM25_K1 * (1.0 - BM25_B + BM25_B * p["dl"].astype("float32") / avgdl)
+        ids_parts.append(p["id"].astype("int64"))
+        weight_parts.append(idf * tf * (BM25_K1 + 1.0) / (tf + norm))
+
+    ids = np.concatenate(ids_parts)
+    weights = np.concatenate(weight_parts)
+    keep = ids < visible
+    if len(deleted):
+        keep &= ~np.isin(ids, deleted)
+    ids, weights = ids[keep], weights[keep]
+    if not len(ids):
+        return ids, weights.astype("float32")
+
+    unique, inverse = np.unique(ids, return_inverse=True)
+    scores = np.bincount(inverse, weights=weights).astype("float32")
+    if len(unique) > limit:
+        top = np.argpartition(-scores, limit - 1)[:limit]
+        unique, scores = unique[top], scores[top]
+    order = np.argsort(-scores, kind="stable")
+    return unique[order], scores[order]
+
+
+def rrf(rankings: Sequence[Sequence[Hashable]], k: int = RRF_K) -> List[Hashable]:
+    """Fuse ranked lists: each item scores sum(1 / (k + rank)); ties keep first-seen order."""
+    scores: Dict[Hashable, float] = {}
+    for ranking in rankings:
+        for rank, key in enumerate(ranking, start=1):
+            scores[key] = scores.get(key, 0.0) + 1.0 / (k + rank)
+    return sorted(scores, key=lambda key: -scores[key])
@@ -1,34 +1,150 @@
 import os
+import json
+import time
+import asyncio
+import threading
+import weakref
+import httpx
 import requests
 import logging
+from typing import Iterator, Optional, Set
 from transformers import pipeline, Pipeline
 
+from .http_client import CircuitBreaker, CircuitOpenError, backoff_delay, build_session
+from .executor import run_blocking
+from .tracing import span
+
 logger = logging.getLogger(__name__)
 
-HF_API_URL = "https://api-inference.huggingface.co/models/google/flan-t5-small"
+GENERATOR_MODEL = os.getenv("GENERATOR_MODEL", "google/flan-t5-small")
+HF_API_URL = f"https://api-inference.huggingface.co/models/{GENERATOR_MODEL}"
 HF_API_TOKEN = os.getenv("HF_API_TOKEN")
 ENVIRONMENT = os.getenv("ENVIRONMENT", "development").lower()
 
+# Connection pool / timeouts for the HF API
+HF_POOL_SIZE = int(os.getenv("HF_POOL_SIZE", "10"))
+HF_CONNECT_TIMEOUT = float(os.getenv("HF_CONNECT_TIMEOUT", "3.05"))
+HF_READ_TIMEOUT = float(os.getenv("HF_READ_TIMEOUT", "25"))
+HF_TOTAL_TIMEOUT = float(os.getenv("HF_TOTAL_TIMEOUT", "25"))  # budget across retries
+
+# Retries for transient failures (503 "model loading", 429, 5xx, network errors)
+HF_MAX_RETRIES = int(os.getenv("HF_MAX_RETRIES", "3"))
+HF_BACKOFF_BASE = float(os.getenv("HF_BACKOFF_BASE", "0.5"))
+HF_BACKOFF_MAX = float(os.getenv("HF_BACKOFF_MAX", "8"))
+RETRY_STATUSES = {429, 502, 503, 504}
+
+# Circuit breaker: skip straight to the fallback while the API keeps failing
+HF_BREAKER_THRESHOLD = int(os.getenv("HF_BREAKER_THRESHOLD", "5"))
+HF_BREAKER_COOLDOWN = float(os.getenv("HF_BREAKER_COOLDOWN", "30"))
+
+_session = build_session(HF_POOL_SIZE)
+_breaker = CircuitBreaker("hf-api", HF_BREAKER_THRESHOLD, HF_BREAKER_COOLDOWN)
+
 _local_pipeline: Pipeline | None = None
 
-def _call_hf_api(prompt: str, max_length: int):
-    headers = {"Authorization": f"Bearer {HF_API_TOKEN}"} if HF_API_TOKEN else {}
-    payload = {"inputs": prompt, "parameters": {"max_new_tokens": max_length}}
-    return requests.post(HF_API_URL, headers=headers, json=payload, timeout=25)
+# Longest wait for the next piece from the local model while streaming
+LOCAL_STREAM_TIMEOUT = float(os.getenv("LOCAL_STREAM_TIMEOUT", "60"))
 
-def generate_answer(prompt: str, max_length: int = 200) -> str:
-    """Use HF API in production; fallback to local pipeline in dev."""
+# Canned replies returned when no model produced an answer
+WARMING_UP_REPLY = "Service is warming up. Please try again later."
+FAILED_REPLY = "Sorry, I couldn’t generate an answer right now."
+FALLBACK_REPLIES = (WARMING_UP_REPLY, FAILED_REPLY)
+
+def _call_hf_api(prompt: str, max_length: int, stream: bool = False):
+    """
+    POST to the HF API over the pooled session, retrying transient failures
+    with jittered backoff inside HF_TOTAL_TIMEOUT. Raises CircuitOpenError
+    without touching the network while the breaker is open.
+    """
+    if not _breaker.allow():
+        raise CircuitOpenError("HF API circuit is open")
+
+    try:
+        headers = {"Authorization": f"Bearer {HF_API_TOKEN}"} if HF_API_TOKEN else {}
+        payload = {"inputs": prompt, "parameters": {"max_new_tokens": max_length}}
+        if stream:
+            payload["stream"] = True
+        deadline = time.monotonic() + HF_TOTAL_TIMEOUT
+
+        attempt = 0
+        while True:
+            remaining = deadline - time.monotonic()
+            try:
+                resp = _session.post(
+                    HF_API_URL,
+                    headers=headers,
+                    json=payload,
+                    timeout=(HF_CONNECT_TIMEOUT, max(0.1, min(HF_READ_TIMEOUT, remaining))),
+                    stream=stream,
+                )
+                if resp.status_code not in RETRY_STATUSES:
+                    if resp.status_code < 500:
+                        _breaker.record_success()
+                    else:
+                        _breaker.record_failure()
+                    return resp
+                error = f"status {resp.status_code}"
+            except requests.RequestException as e:
+                resp, error = None, str(e)
+
+            delay = backoff_delay(attempt, HF_BACKOFF_BASE, HF_BACKOFF_MAX)
+            if attempt >= HF_MAX_RETRIES or time.monotonic() + delay >= deadline:
+                _breaker.record_failure()
+                if resp is not None:
+                    return resp
+                raise requests.ConnectionError(f"HF API unreachable after {attempt + 1} attempts: {error}")
+
+            if resp is not None:
+                resp.close()  # give a streamed response's connection back to the pool
+            logger.warning(f"HF API attempt {attempt + 1} failed ({error}); retrying in {delay:.2f}s")
+            time.sleep(delay)
+            attempt += 1
+    except BaseException:
+        # Cancelled (client gone) or failed outside the HTTP error paths: a
+        # half-open trial must not stay claimed, or the circuit never closes
+        _breaker.release_trial()
+        raise
+
+def _parse_generated(data) -> Optional[str]:
+    if isinstance(data, list) and data and "generated_text" in data[0]:
+        return data[0]["generated_text"].strip()
+    if isinstance(data, dict) and "generated_text" in data:
+        return data["generated_text"].strip()
+    return None
+
+
+def _get_local_pipeline() -> Pipeline:
     global _local_pipeline
+    if _local_pipeline is None:
+        logger.info(f"Loading local fallback model ({GENERATOR_MODEL}) on CPU...")
+        with span("generate.model_load"):
+            _local_pipeline = pipeline("text2text-generation", model=GENERATOR_MODEL, device=-1)
+    return _local_pipeline
+
+
+def _generate_local(prompt: str, max_length: int) -> str:
+    try:
+        generator = _get_local_pipeline()
+        with span("generate.local"):
+            out = generator(prompt, max_length=max_length)
+        if isinstance(out, list) and out and "generated_text" in out[0]:
+            return out[0]["generated_text"].strip()
+    except Exception as e:
+        logger.error(f"Local model inference failed: {e}")
+    return FAILED_REPLY
 
+
+def generate_answer(prompt: str, max_length: int = 200) -> str:
+    """Use HF API in production; fallback to local pipeline in dev."""
     # Prefer Hugging Face API
     try:
-        resp = _call_hf_api(prompt, max_length)
+        with span("generate.hf_api"):
+            resp = _call_hf_api(prompt, max_length)
         if resp.status_code == 200:
             data = resp.json()
-            if isinstance(data, list) and data and "generated_text" in data[0]:
-                return data[0]["generated_text"].strip()
-            if isinstance(data, dict) and "generated_text" in data:
-                return data["generated_text"].strip()
+            text = _parse_generated(data)
+            if text is not None:
+                return text
             logger.warning(f"HF API returned unexpected payload: {data}")
         else:
             logger.error(f"HF API returned status {resp.status_code}: {resp.text}")
@@ -37,16 +153,205 @@ def generate_answer(prompt: str, max_length: int = 200) -> str:
 
     # Fallback only in development
     if ENVIRONMENT == "production":
-        return "Service is warming up. Please try again later."
+        return WARMING_UP_REPLY
+
+    return _generate_local(prompt, max_length)
+
+
+def _stream_hf_api(resp: requests.Response) -> Iterator[str]:
+    """
+    Yield token texts from a streaming (SSE) HF response. Endpoints that don't
+    stream answer with plain JSON, which is yielded as a single piece.
+    """
+    if "text/event-stream" not in resp.headers.get("Content-Type", ""):
+        text = _parse_generated(resp.json())
+        if text is None:
+            raise ValueError("HF API returned unexpected payload")
+        yield text
+        return
+
+    for line in resp.iter_lines(decode_unicode=True):
+        if not line or not line.startswith("data:"):
+            continue
+        event = json.loads(line[len("data:"):].strip())
+        token = event.get("token") or {}
+        if token.get("special"):
+            continue
+        if token.get("text"):
+            yield token["text"]
+
+
+def _stream_local(prompt: str, max_length: int) -> Iterator[str]:
+    """
+    Run the local model's generate() in a thread and yield text as it decodes.
+    A generate() error is re-raised here; a stall longer than
+    LOCAL_STREAM_TIMEOUT between pieces raises queue.Empty.
+    """
+    from transformers import TextIteratorStreamer
+
+    pipe = _get_local_pipeline()
+    streamer = TextIteratorStreamer(
+        pipe.tokenizer, skip_prompt=True, skip_special_tokens=True, timeout=LOCAL_STREAM_TIMEOUT
+    )
+    inputs = pipe.tokenizer(prompt, return_tensors="pt", truncation=True)
+    errors = []
+
+    def generate():
+        try:
+            pipe.model.generate(**inputs, max_new_tokens=max_length, streamer=streamer)
+        except BaseException as e:
+            errors.append(e)
+        finally:
+            # Unblock the consumer even when generate() failed before finishing the stream
+            streamer.end()
+
+    thread = threading.Thread(target=generate, daemon=True)
+    thread.start()
+    for text in streamer:
+        if text:
+            yield text
+    thread.join()
+    if errors:
+        raise errors[0]
+
+
+def stream_answer(prompt: str, max_length: int = 200) -> Iterator[str]:
+    """
+    Streaming counterpart of generate_answer(): yields pieces of the reply as
+    they are produced. Same backend order and fallbacks.
+    """
+    started = False
+    try:
+        resp = _call_hf_api(prompt, max_length, stream=True)
+        with resp:  # release the connection however the stream ends
+            if resp.status_code == 200:
+                for piece in _stream_hf_api(resp):
+                    started = True
+                    yield piece
+                return
+            logger.error(f"HF API returned status {resp.status_code}: {resp.text}")
+    except Exception as e:
+        logger.error(f"HF API streaming request failed: {e}")
+        if started:
+            # Part of the answer is already out; don't splice a second one on
+            return
+
+    if ENVIRONMENT == "production":
+        yield WARMING_UP_REPLY
+        return
 
     try:
-        if _local_pipeline is None:
-            logger.info("Loading local fallback model (google/flan-t5-small) on CPU...")
-            _local_pipeline = pipeline("text2text-generation", model="google/flan-t5-small", device=-1)
-        out = _local_pipeline(prompt, max_length=max_length)
-        if isinstance(out, list) and out and "generated_text" in out[0]:
-            return out[0]["generated_text"].strip()
+        for piece in _stream_local(prompt, max_length):
+            started = True
+            yield piece
+        if started:
+            return
     except Exception as e:
-        logger.error(f"Local model inference failed: {e}")
+        logger.error(f"Local model streaming failed: {e}")
+        if started:
+            return
+
+    yield FAILED_REPLY
+
+
+# -----------------------------------------------------------------------------
+# Async path (ASGI): awaits the HF API instead of parking a thread on it
+# -----------------------------------------------------------------------------
+# One client per event loop: a client's pool is bound to the loop that opened it
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = (
+    weakref.WeakKeyDictionary()
+)
+# The loop only holds weak references to tasks; a parked closer with no other
+# reference can be garbage-collected before shutdown, leaving its client open
+_closers: Set["asyncio.Task[None]"] = set()
+
+
+async def _close_on_shutdown(client: httpx.AsyncClient) -> None:
+    """Park until the loop shuts down (asyncio.run and asgiref cancel leftover tasks), then close."""
+    try:
+        await asyncio.get_running_loop().create_future()
+    finally:
+        await client.aclose()
+
+
+def _get_async_client() -> httpx.AsyncClient:
+    """Pooled keep-alive client for the running event loop."""
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        client = _async_clients[loop] = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=HF_POOL_SIZE, max_keepalive_connections=HF_POOL_SIZE),
+            timeout=httpx.Timeout(HF_READ_TIMEOUT, connect=HF_CONNECT_TIMEOUT),
+        )
+        closer = loop.create_task(_close_on_shutdown(client))
+        _closers.add(closer)
+        closer.add_done_callback(_closers.discard)
+    return client
+
+
+async def _acall_hf_api(prompt: str, max_length: int) -> httpx.Response:
+    """Async twin of _call_hf_api: same retries, backoff and circuit breaker."""
+    if not _breaker.allow():
+        raise CircuitOpenError("HF API circuit is open")
+
+    try:
+        client = _get_async_client()
+        headers = {"Authorization": f"Bearer {HF_API_TOKEN}"} if HF_API_TOKEN else {}
+        payload = {"inputs": prompt, "parameters": {"max_new_tokens": max_length}}
+        deadline = time.monotonic() + HF_TOTAL_TIMEOUT
+
+        attempt = 0
+        while True:
+            remaining = deadline - time.monotonic()
+            try:
+                resp = await client.post(
+                    HF_API_URL,
+                    headers=headers,
+                    json=payload,
+                    timeout=httpx.Timeout(max(0.1, min(HF_READ_TIMEOUT, remaining)), connect=HF_CONNECT_TIMEOUT),
+                )
+                if resp.status_code not in RETRY_STATUSES:
+                    if resp.status_code < 500:
+                        _breaker.record_success()
+                    else:
+                        _breaker.record_failure()
+                    return resp
+                error = f"status {resp.status_code}"
+            except httpx.HTTPError as e:
+                resp, error = None, str(e)
+
+            delay = backoff_delay(attempt, HF_BACKOFF_BASE, HF_BACKOFF_MAX)
+            if attempt >= HF_MAX_RETRIES or time.monotonic() + delay >= deadline:
+                _breaker.record_failure()
+                if resp is not None:
+                    return resp
+                raise httpx.ConnectError(f"HF API unreachable after {attempt + 1} attempts: {error}")
+
+            logger.warning(f"HF API attempt {attempt + 1} failed ({error}); retrying in {delay:.2f}s")
+            await asyncio.sleep(delay)
+            attempt += 1
+    except BaseException:
+        _breaker.release_trial()  # e.g. CancelledError when the client disconnects
+        raise
+
+
+async def agenerate_answer(prompt: str, max_length: int = 200) -> str:
+    """Async generate_answer(): awaits the HF API; the local fallback runs on the RAG pool."""
+    try:
+        with span("generate.hf_api"):
+            resp = await _acall_hf_api(prompt, max_length)
+        if resp.status_code == 200:
+            data = resp.json()
+            text = _parse_generated(data)
+            if text is not None:
+                return text
+            logger.warning(f"HF API returned unexpected payload: {data}")
+        else:
+            logger.error(f"HF API returned status {resp.status_code}: {resp.text}")
+    except Exception as e:
+        logger.error(f"HF API request failed: {e}")
+
+    if ENVIRONMENT == "production":
+        return WARMING_UP_REPLY
 
-    return "Sorry, I couldn’t generate an answer right now."
+    return await run_blocking(_generate_local, prompt, max_length)
@@ -0,0 +1,92 @@
+# backend/chatbot/utils/model_registry.py
+#
+# One loaded embedding model per (model name, device) per process. Every
+# embedding caller goes through here, so a worker never holds two copies of
+# the same weights or silently loads a second model under another name.
+# The ONNX backend registers under device "onnx" / "onnx-int8".
+#
+# sentence_transformers (and with it torch) is imported on first use, so a
+# worker running the ONNX backend never pays for it.
+
+import os
+import logging
+import threading
+from typing import Any, Callable, Dict, Tuple
+
+logger = logging.getLogger(__name__)
+
+_models: Dict[Tuple[str, str], Any] = {}
+_lock = threading.Lock()
+
+
+def _get_or_load(key: Tuple[str, str], load: Callable[[], Any]) -> Any:
+    model = _models.get(key)
+    if model is not None:
+        return model
+    with _lock:
+        # Another thread may have finished loading while we waited
+        model = _models.get(key)
+        if model is None:
+            logger.info(f"Loading embedding model: {key[0]} ({key[1]})")
+            model = load()
+            _models[key] = model
+            logger.info(f"✓ Embedding model loaded: {key[0]} ({key[1]})")
+        return model
+
+
+def get_sentence_transformer(name: str, device: str = "cpu"):
+    def load():
+        from sentence_transformers import SentenceTransformer
+        return SentenceTransformer(name, device=device)
+
+    return _get_or_load((name, device), load)
+
+
+def get_onnx_encoder(name: str, quantized: bool = True):
+    def load():
+        from .onnx_backend import OnnxEncoder
+        return OnnxEncoder(name, quantized=quantized)
+
+    return _get_or_load((name, "onnx-int8" if quantized else "onnx"), load)
+
+
+def loaded_models() -> Dict[Tuple[str, str], Any]:
+    return dict(_models)
+
+
+def rss_bytes() -> int:
+    """Current resident set size of this process (Linux /proc, else peak RSS)."""
+    try:
+        with open("/proc/self/status", "r") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+_tokenizers: Dict[str, Any] = {}
+
+
+def get_tokenizer(name: str):
+    """
+    Tokenizer for an embedding model without loading its weights (used for
+    token counting, e.g. by the chunker in build_index pool workers).
+    """
+    def load():
+        from transformers import AutoTokenizer
+        from .onnx_backend import model_dir
+        path = model_dir(name)
+        if os.path.exists(os.path.join(path, "tokenizer_config.json")):
+            return AutoTokenizer.from_pretrained(path)
+        return AutoTokenizer.from_pretrained(name if "/" in name else f"sentence-transformers/{name}")
+
+    tokenizer = _tokenizers.get(name)
+    if tokenizer is None:
+        with _lock:
+            tokenizer = _tokenizers.get(name)
+            if tokenizer is None:
+                tokenizer = _tokenizers[name] = load()
+    return tokenizer
@@ -0,0 +1,141 @@
+# backend/chatbot/utils/onnx_backend.py
+#
+# ONNX Runtime embedding backend with dynamic int8 quantization, as a lighter
+# CPU alternative to running SentenceTransformer through PyTorch.
+#
+# `manage.py export_onnx_model` writes, per model:
+#   <ONNX_MODEL_DIR>/<model name>/model.onnx        fp32 export of the transformer
+#   <ONNX_MODEL_DIR>/<model name>/model.int8.onnx   dynamically quantized weights
+#   <ONNX_MODEL_DIR>/<model name>/onnx_config.json  pooling / normalize / max_seq_length
+#   plus the tokenizer files
+# OnnxEncoder reproduces the SentenceTransformer pooling on top, so vectors
+# match the torch backend within quantization tolerance.
+
+import os
+import json
+import logging
+from typing import List, Dict, Any
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+ONNX_MODEL_DIR = os.getenv("ONNX_MODEL_DIR", os.path.join(BASE_DIR, "onnx_models"))
+ONNX_QUANTIZED = os.getenv("ONNX_QUANTIZED", "true").lower() == "true"
+ONNX_THREADS = int(os.getenv("ONNX_THREADS", "0"))  # 0 = onnxruntime default
+
+
+def model_dir(model_name: str) -> str:
+    return os.path.join(ONNX_MODEL_DIR, model_name.replace("/", "__"))
+
+
+def export(model_name: str, opset: int = 14) -> Dict[str, Any]:
+    """Export a SentenceTransformer to ONNX and write an int8 copy next to it."""
+    import torch
+    from sentence_transformers import SentenceTransformer, models as st_models
+    from onnxruntime.quantization import quantize_dynamic, QuantType
+
+    out_dir = model_dir(model_name)
+    os.makedirs(out_dir, exist_ok=True)
+
+    st = SentenceTransformer(model_name, device="cpu")
+    transformer = st[0].auto_model.eval()
+    tokenizer = st.tokenizer
+    pooling = next((m for m in st if isinstance(m, st_models.Pooling)), None)
+    config = {
+        "model_name": model_name,
+        "pooling": "cls" if pooling is not None and pooling.get_pooling_mode_str() == "cls" else "mean",
+        "normalize": any(isinstance(m, st_models.Normalize) for m in st),
+        "max_seq_length": int(st.max_seq_length),
+    }
+
+    class _HiddenStates(torch.nn.Module):
+        def __init__(self, inner):
+            super().__init__()
+            self.inner = inner
+
+        def forward(self, input_ids, attention_mask, token_type_ids):
+            return self.inner(
+                input_ids=input_ids, attention_mask=attention_mask, token_type_ids=token_type_ids
+            ).last_hidden_state
+
+    dummy = tokenizer(["export sample"], return_tensors="pt")
+    token_type_ids = dummy.get("token_type_ids", torch.zeros_like(dummy["input_ids"]))
+    fp32_path = os.path.join(out_dir, "model.onnx")
+    axes = {0: "batch", 1: "sequence"}
+    torch.onnx.export(
+        _HiddenStates(transformer),
+        (dummy["input_ids"], dummy["attention_mask"], token_type_ids),
+        fp32_path,
+        input_names=["input_ids", "attention_mask", "token_type_ids"],
+        output_names=["last_hidden_state"],
+        dynamic_axes={"input_ids": axes, "attention_mask": axes, "token_type_ids": axes, "last_hidden_state": axes},
+        opset_version=opset,
+    )
+    quantize_dynamic(fp32_path, os.path.join(out_dir, "model.int8.onnx"), weight_type=QuantType.QInt8)
+
+    tokenizer.save_pretrained(out_dir)
+    with open(os.path.join(out_dir, "onnx_config.json"), "w", encoding="utf-8") as f:
+        json.dump(config, f, indent=2)
+    logger.info(f"✓ Exported {model_name} to {out_dir}")
+    return config
+
+
+class OnnxEncoder:
+    """Drop-in for the subset of SentenceTransformer.encode() the app uses."""
+
+    def __init__(self, model_name: str, quantized: bool = ONNX_QUANTIZED):
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        path = model_dir(model_name)
+        config_path = os.path.join(path, "onnx_config.json")
+        if not os.path.exists(config_path):
+            raise FileNotFoundError(
+                f"No ONNX export for '{model_name}' in {path}; run `manage.py export_onnx_model`"
+            )
+        with open(config_path, "r", encoding="utf-8") as f:
+            self.config = json.load(f)
+
+        options = ort.SessionOptions()
+        if ONNX_THREADS:
+            options.intra_op_num_threads = ONNX_THREADS
+        onnx_file = "model.int8.onnx" if quantized else "model.onnx"
+        self.session = ort.InferenceSession(
+            os.path.join(path, onnx_file), options, providers=["CPUExecutionProvider"]
+        )
+        self.input_names = {i.name for i in self.session.get_inputs()}
+        self.tokenizer = AutoTokenizer.from_pretrained(path)
+        self.max_seq_length = self.config["max_seq_length"]
+        self.quantized = quantized
+
+    def _encode_batch(self, texts: List[str]) -> np.ndarray:
+        enc = self.tokenizer(
+            texts, padding=True, truncation=True, max_length=self.max_seq_length, return_tensors="np"
+        )
+        feeds = {k: v.astype("int64") for k, v in enc.items() if k in self.input_names}
+        if "token_type_ids" in self.input_names and "token_type_ids" not in feeds:
+            feeds["token_type_ids"] = np.zeros_like(feeds["input_ids"])
+        hidden = self.session.run(["last_hidden_state"], feeds)[0]
+
+        if self.config["pooling"] == "cls":
+            pooled = hidden[:, 0]
+        else:
+            mask = enc["attention_mask"][..., None].astype("float32")
+            pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+
+        if self.config["normalize"]:
+            pooled = pooled / np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+        return pooled.astype("float32")
+
+    def encode(self, sentences, batch_size: int = 32, show_progress_bar: bool = False,
+               convert_to_numpy: bool = True, **kwargs) -> np.ndarray:
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        if not texts:
+            return np.empty((0, 0), dtype="float32")
+        out = np.vstack([
+            self._encode_batch(texts[i : i + batch_size]) for i in range(0, len(texts), batch_size)
+        ])
+        return out[0] if single else out
@@ -0,0 +1,290 @@
+# backend/chatbot/utils/prompt_context.py
+#
+# Context assembly between retrieval and generation. Retrieved chunks are
+# turned into a prompt that fits the generator:
+#   1. adjacent chunks of one document (chunk_index i, i+1, ...) are merged
+#      into a passage, dropping the overlap the chunker repeated between them
+#   2. passages that near-duplicate a better-ranked one (word-shingle Jaccard
+#      >= CONTEXT_DEDUP_THRESHOLD, e.g. the same file uploaded twice) are dropped
+#   3. passages are packed greedily, best-ranked first, until the context
+#      budget in generator tokens is spent; one that doesn't fit is skipped
+#      for smaller ones after it, and the best passage is truncated rather
+#      than sent without context
+# The budget is PROMPT_CONTEXT_TOKENS, capped so the whole prompt stays
+# within PROMPT_MAX_TOKENS (flan-t5 truncates its input at 512 tokens).
+# Prompt-token counts are logged per request and aggregated in stats().
+
+import os
+import logging
+import threading
+from collections import deque
+from typing import Any, Deque, Dict, List, NamedTuple, Optional, Sequence
+
+import numpy as np
+
+from .model_inference import GENERATOR_MODEL
+from .text_chunker import TokenCounter, approx_token_counts
+
+logger = logging.getLogger(__name__)
+
+PROMPT_CONTEXT_TOKENS = int(os.getenv("PROMPT_CONTEXT_TOKENS", "384"))
+PROMPT_MAX_TOKENS = int(os.getenv("PROMPT_MAX_TOKENS", "512"))
+CONTEXT_DEDUP_THRESHOLD = float(os.getenv("CONTEXT_DEDUP_THRESHOLD", "0.8"))
+
+SHINGLE_WORDS = 3
+MAX_OVERLAP_WORDS = 400  # longest repeated run looked for when merging neighbours
+STATS_WINDOW = 1000      # recent requests kept for percentiles
+
+PROMPT_TEMPLATE = (
+    "You are an assistant that answers questions about Sameer Shah’s company. "
+    "Use the provided context to answer briefly, accurately, and professionally.\n\n"
+    "Context:\n{context}\n\n"
+    "Question: {question}\nAnswer:"
+)
+
+
+class Passage(NamedTuple):
+    text: str
+    meta: Dict[str, Any]  # first chunk's meta, pages widened to the whole passage
+    rank: int             # best retrieval rank among its chunks
+    chunks: int
+
+
+class Prompt(NamedTuple):
+    prompt: str
+    passages: List[Passage]  # what made it into the context, in context order
+    prompt_tokens: int
+    context_tokens: int
+    budget: int
+    retrieved: int
+    merged: int              # chunks folded into a neighbour
+    duplicates: int          # passages dropped as near-duplicates
+    skipped: int             # passages left out for the budget
+
+
+# -----------------------------------------------------------------------------
+# Token counting with the generator's tokenizer
+# -----------------------------------------------------------------------------
+_counter: Optional[TokenCounter] = None
+_counter_lock = threading.Lock()
+
+
+def token_counter() -> TokenCounter:
+    """Batched token counts from the generator's tokenizer (approximate if unavailable)."""
+    global _counter
+    if _counter is None:
+        with _counter_lock:
+            if _counter is None:
+                _counter = _load_counter()
+    return _counter
+
+
+def _load_counter() -> TokenCounter:
+    try:
+        from .model_registry import get_tokenizer
+        tokenizer = get_tokenizer(GENERATOR_MODEL)
+    except Exception as e:
+        logger.warning(f"⚠ Generator tokenizer unavailable, approximating prompt tokens: {e}")
+        return approx_token_counts
+
+    def count(texts: List[str]) -> List[int]:
+        if not texts:
+            return []
+        return [len(ids) for ids in tokenizer(texts, add_special_tokens=False)["input_ids"]]
+
+    return count
+
+
+# -----------------------------------------------------------------------------
+# Assembly steps
+# -----------------------------------------------------------------------------
+def _join_overlapping(left: str, right: str) -> str:
+    """Concatenate two neighbouring chunks, dropping the words `right` repeats from the end of `left`."""
+    a, b = left.split(), right.split()
+    for n in range(min(len(a), len(b), MAX_OVERLAP_WORDS), 0, -1):
+        if a[-n:] == b[:n]:
+            return " ".join(a + b[n:])
+    return f"{left} {right}"
+
+
+def merge_adjacent(results: Sequence[Dict[str, Any]]) -> List[Passage]:
+    """
+    Fold runs of consecutive chunk_index of one doc_id into single passages,
+    ordered by their best retrieval rank. Chunks without both keys stay alone.
+    """
+    runs: Dict[Any, List[tuple]] = {}
+    passages: List[Passage] = []
+    for rank, r in enumerate(results):
+        meta = r.get("meta") or {}
+        if meta.get("doc_id") is None or meta.get("chunk_index") is None:
+            passages.append(Passage(r["text"], dict(meta), rank, 1))
+            continue
+        runs.setdefault(meta["doc_id"], []).append((int(meta["chunk_index"]), rank, r["text"], meta))
+
+    for chunks in runs.values():
+        chunks.sort(key=lambda c: c[0])
+        group = [chunks[0]]
+        for c in chunks[1:] + [None]:
+            if c is not None and c[0] == group[-1][0]:
+                continue  # same chunk twice (e.g. from two shards)
+            if c is not None and c[0] == group[-1][0] + 1:
+                group.append(c)
+                continue
+            text = group[0][2]
+            for _, _, t, _ in group[1:]:
+                text = _join_overlapping(text, t)
+            meta = dict(group[0][3])
+            pages = [g[3].get(k) for g in group for k in ("page", "page_end") if g[3].get(k) is not None]
+            if pages:
+                meta["page"], meta["page_end"] = min(pages), max(pages)
+            passages.append(Passage(text, meta, min(g[1] for g in group), len(group)))
+            group = [c] if c is not None else []
+
+    passages.sort(key=lambda p: p.rank)
+    return passages
+
+
+def _shingles(text: str) -> set:
+    words = text.lower().split()
+    if len(words) <= SHINGLE_WORDS:
+        return {tuple(words)}
+    return {tuple(words[i : i + SHINGLE_WORDS]) for i in range(len(words) - SHINGLE_WORDS + 1)}
+
+
+def drop_near_duplicates(passages: Sequence[Passage],
+                         threshold: float = CONTEXT_DEDUP_THRESHOLD) -> List[Passage]:
+    """Keep passages in order, dropping any whose shingles overlap a kept one by >= threshold (Jaccard)."""
+    kept: List[Passage] = []
+    kept_shingles: List[set] = []
+    for p in passages:
+        s = _shingles(p.text)
+        if any(len(s & k) / max(1, len(s | k)) >= threshold or s <= k for k in kept_shingles):
+            continue
+        kept.append(p)
+        kept_shingles.append(s)
+    return kept
+
+
+def _truncate(text: str, budget: int, count: TokenCounter) -> str:
+    """Longest word prefix of `text` within `budget` tokens."""
+    words = text.split()
+    lo, hi = 0, len(words)
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if count([" ".join(words[:mid])])[0] <= budget:
+            lo = mid
+        else:
+            hi = mid - 1
+    return " ".join(words[:lo])
+
+
+def pack(passages: Sequence[Passage], budget: int, count: TokenCounter) -> tuple:
+    """Greedy best-first packing into `budget` tokens. Returns (packed passages, tokens used, skipped)."""
+    sizes = count([p.text for p in passages])
+    separator = count(["\n"])[0] if passages else 0
+    packed: List[Passage] = []
+    used = skipped = 0
+    for p, size in zip(passages, sizes):
+        cost = size + (separator if packed else 0)
+        if used + cost <= budget:
+            packed.append(p)
+            used += cost
+        elif not packed and budget > 0:
+            # Nothing packed yet: the best passage, cut to fit, beats no context
+            text = _truncate(p.text, budget, count)
+            if text:
+                packed.append(p._replace(text=text))
+                used = count([text])[0]
+            else:
+                skipped += 1
+        else:
+            skipped += 1
+    return packed, used, skipped
+
+
+def context_budget(question: str, count: TokenCounter) -> int:
+    """PROMPT_CONTEXT_TOKENS, less whatever the template and question leave short of PROMPT_MAX_TOKENS."""
+    overhead = count([PROMPT_TEMPLATE.format(context="", question=question)])[0]
+    return max(0, min(PROMPT_CONTEXT_TOKENS, PROMPT_MAX_TOKENS - overhead))
+
+
+def build_prompt(question: str, results: Sequence[Dict[str, Any]]) -> Prompt:
+    """Assemble the generation prompt for `question` from retrieved `results` (best first)."""
+    count = token_counter()
+    passages = merge_adjacent(results)
+    merged = len(results) - len(passages)
+    unique = drop_near_duplicates(passages)
+    budget = context_budget(question, count)
+    packed, context_tokens, skipped = pack(unique, budget, count)
+
+    prompt = PROMPT_TEMPLATE.format(context="\n".join(p.text for p in packed), question=question)
+    result = Prompt(
+        prompt=prompt,
+        passages=packed,
+        prompt_tokens=count([prompt])[0],
+        context_tokens=context_tokens,
+        budget=budget,
+        retrieved=len(results),
+        merged=merged,
+        duplicates=len(passages) - len(unique),
+        skipped=skipped,
+    )
+    _stats.record(result)
+    logger.info(
+        f"Prompt: {result.prompt_tokens} tokens (context {context_tokens}/{budget}; "
+        f"{len(packed)} passages from {len(results)} chunks, {merged} merged, "
+        f"{result.duplicates} duplicates, {skipped} over budget)"
+    )
+    return result
+
+
+# -----------------------------------------------------------------------------
+# Prompt-token accounting
+# -----------------------------------------------------------------------------
+class _PromptStats:
+    def __init__(self, window: int = STATS_WINDOW):
+        self._lock = threading.Lock()
+        self._recent: Deque[int] = deque(maxlen=window)
+        self.requests = 0
+        self.prompt_tokens = 0
+        self.context_tokens = 0
+        self.skipped = 0
+        self.duplicates = 0
+        self.merged = 0
+
+    def record(self, p: Prompt) -> None:
+        with self._lock:
+            self.requests += 1
+            self.prompt_tokens += p.prompt_tokens
+            self.context_tokens += p.context_tokens
+            self.skipped += p.skipped
+            self.duplicates += p.duplicates
+            self.merged += p.merged
+            self._recent.append(p.prompt_tokens)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            recent = np.array(self._recent) if self._recent else np.zeros(1)
+            return {
+                "generator": GENERATOR_MODEL,
+                "context_budget": PROMPT_CONTEXT_TOKENS,
+                "max_prompt_tokens": PROMPT_MAX_TOKENS,
+                "requests": self.requests,
+                "prompt_tokens_total": self.prompt_tokens,
+                "prompt_tokens_mean": self.prompt_tokens / self.requests if self.requests else 0.0,
+                "prompt_tokens_p50": float(np.percentile(recent, 50)),
+                "prompt_tokens_p95": float(np.percentile(recent, 95)),
+                "prompt_tokens_max": int(recent.max()),
+                "context_tokens_total": self.context_tokens,
+                "chunks_merged": self.merged,
+                "duplicates_dropped": self.duplicates,
+                "passages_over_budget": self.skipped,
+            }
+
+
+_stats = _PromptStats()
+
+
+def stats() -> Dict[str, Any]:
+    """Prompt-token totals and recent percentiles for this process."""
+    return _stats.snapshot()
@@ -0,0 +1,84 @@
+# backend/chatbot/utils/query_batcher.py
+#
+# Micro-batching in front of the embedding model. Concurrent chat requests
+# each want one query embedded; encoding them one by one wastes the batched
+# throughput of SentenceTransformer on CPU. Requests arriving within a short
+# window (up to a max batch size) are encoded in a single call and each caller
+# gets its own row back.
+
+import os
+import time
+import queue
+import logging
+import threading
+from concurrent.futures import Future
+from typing import Callable, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+QUERY_BATCHING_ENABLED = os.getenv("QUERY_BATCHING_ENABLED", "true").lower() == "true"
+QUERY_BATCH_WINDOW_MS = float(os.getenv("QUERY_BATCH_WINDOW_MS", "5"))
+QUERY_BATCH_MAX_SIZE = int(os.getenv("QUERY_BATCH_MAX_SIZE", "32"))
+
+
+class QueryBatcher:
+    def __init__(self, encode_fn: Callable[[List[str]], np.ndarray],
+                 window_ms: float = QUERY_BATCH_WINDOW_MS, max_batch: int = QUERY_BATCH_MAX_SIZE):
+        self.encode_fn = encode_fn
+        self.window = window_ms / 1000.0
+        self.max_batch = max(1, max_batch)
+        self._queue: "queue.Queue[Tuple[str, Future]]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self.batches = 0
+        self.items = 0
+
+    def _ensure_started(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="query-batcher", daemon=True)
+                self._thread.start()
+
+    def _collect(self) -> List[Tuple[str, Future]]:
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.window
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            batch = self._collect()
+            texts = [t for t, _ in batch]
+            try:
+                embs = self.encode_fn(texts)
+            except Exception as e:
+                logger.error(f"✗ Batched query encode failed: {e}")
+                for _, fut in batch:
+                    fut.set_exception(e)
+                continue
+            self.batches += 1
+            self.items += len(batch)
+            for i, (_, fut) in enumerate(batch):
+                fut.set_result(embs[i : i + 1])
+
+    def encode(self, text: str, timeout: Optional[float] = None) -> np.ndarray:
+        """Embed one text as a (1, dim) array, sharing a model call with concurrent callers."""
+        self._ensure_started()
+        fut: Future = Future()
+        self._queue.put((text, fut))
+        return fut.result(timeout=timeout)
+
+    @property
+    def mean_batch_size(self) -> float:
+        return self.items / self.batches if self.batches else 0.0
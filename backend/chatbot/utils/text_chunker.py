@@ -1,21 +1,266 @@
-from typing import List
+# backend/chatbot/utils/text_chunker.py
+#
+# Token-aware streaming chunker. Text is read line by line, grouped into
+# paragraphs (blank-line separated) and sentences, and packed into chunks of
+# at most `chunk_tokens` embedding-model tokens (by default CHUNK_TOKENS,
+# capped at what the model reads before truncating; see chunk_token_limit()).
+# Each chunk starts with the last ~`overlap_tokens` tokens of the previous
+# one, cut at a sentence boundary where possible. Only the current paragraph and the chunk being
+# built are held in memory, so multi-hundred-MB inputs stream through.
+# iter_page_chunks() does the same over (page number, text) pairs from
+# text_extractor.iter_pages() and reports the pages each chunk came from.
 
-def chunk_text(text: str, chunk_size: int = 800, overlap: int = 200) -> List[str]:
+import io
+import os
+import re
+import logging
+from collections import deque
+from typing import Callable, Deque, Iterable, Iterator, List, NamedTuple, Optional, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+CHUNK_TOKENS = int(os.getenv("CHUNK_TOKENS", "200"))
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "40"))
+
+_token_limit: Optional[int] = None
+
+# A paragraph with no blank line for this long is cut at its last sentence end
+MAX_PARAGRAPH_CHARS = 64 * 1024
+
+_SENTENCE_SPLIT = re.compile(r"(?<=[.!?])\s+")
+_APPROX_TOKEN = re.compile(r"\w+|[^\w\s]")
+
+TokenCounter = Callable[[List[str]], List[int]]
+
+
+class _Unit(NamedTuple):
+    text: str
+    tokens: int
+    new_paragraph: bool
+    page: Optional[int]
+
+
+def approx_token_counts(texts: List[str]) -> List[int]:
+    """Word/punctuation count; a lower bound on WordPiece tokens."""
+    return [len(_APPROX_TOKEN.findall(t)) for t in texts]
+
+
+def model_token_counter() -> TokenCounter:
+    """Batched token counts from the embedding model's tokenizer (approximate if unavailable)."""
+    try:
+        from .embedding_store import _current_model_name
+        from .model_registry import get_tokenizer
+        tokenizer = get_tokenizer(_current_model_name())
+    except Exception as e:
+        logger.warning(f"⚠ Tokenizer unavailable, approximating token counts: {e}")
+        return approx_token_counts
+
+    def count(texts: List[str]) -> List[int]:
+        if not texts:
+            return []
+        return [len(ids) for ids in tokenizer(texts, add_special_tokens=False)["input_ids"]]
+
+    return count
+
+
+def chunk_token_limit() -> int:
+    """
+    CHUNK_TOKENS clamped to the embedding model's max_seq_length minus its
+    special tokens; anything past that would be truncated away when encoded.
+    Falls back to CHUNK_TOKENS when the model can't be loaded.
+    """
+    global _token_limit
+    if _token_limit is not None:
+        return _token_limit
+    try:
+        from .embedding_store import get_model
+        model = get_model()
+    except Exception as e:
+        logger.warning(f"⚠ Embedding model unavailable, using CHUNK_TOKENS={CHUNK_TOKENS} unchecked: {e}")
+        return CHUNK_TOKENS
+    max_seq_length = getattr(model, "max_seq_length", None)
+    if not max_seq_length:
+        return CHUNK_TOKENS
+    tokenizer = getattr(model, "tokenizer", None)
+    cap = max_seq_length - (tokenizer.num_special_tokens_to_add() if tokenizer is not None else 2)
+    if CHUNK_TOKENS > cap:
+        logger.warning(f"⚠ CHUNK_TOKENS={CHUNK_TOKENS} exceeds the model's {cap}-token input; using {cap}")
+    _token_limit = min(CHUNK_TOKENS, cap)
+    return _token_limit
+
+
+def _lines(pages: Iterable[Tuple[Optional[int], str]]) -> Iterator[Tuple[Optional[int], str]]:
+    for page, piece in pages:
+        # StringIO iterates lazily instead of materialising splitlines()
+        for line in io.StringIO(piece):
+            yield page, line.rstrip("\r\n")
+
+
+def _paragraphs(pages: Iterable[Tuple[Optional[int], str]]) -> Iterator[tuple]:
     """
-    Simple sliding-window chunking.
-    - chunk_size: number of characters per chunk
-    - overlap: characters to overlap between chunks
+    Yield (paragraph text, starts a new paragraph, page). A paragraph running
+    over a page break is yielded in two parts, the second as a continuation.
     """
+    buf: List[str] = []
+    size = 0
+    continued = False
+    current_page = None
+    for page, line in _lines(pages):
+        if page != current_page and buf:
+            yield " ".join(buf), not continued, current_page
+            buf, size, continued = [], 0, True
+        current_page = page
+        if not line.strip():
+            if buf:
+                yield " ".join(buf), not continued, page
+            buf, size, continued = [], 0, False
+            continue
+        buf.append(line.strip())
+        size += len(line)
+        if size > MAX_PARAGRAPH_CHARS:
+            text = " ".join(buf)
+            cut = max((m.end() for m in _SENTENCE_SPLIT.finditer(text)), default=len(text))
+            yield text[:cut].strip(), not continued, page
+            rest = text[cut:].strip()
+            buf, size, continued = ([rest] if rest else []), len(rest), True
+    if buf:
+        yield " ".join(buf), not continued, current_page
+
+
+def _split_long(text: str, limit: int, count: TokenCounter) -> List[str]:
+    """Split a sentence longer than `limit` tokens at word boundaries."""
+    words = text.split()
+    pieces, current, total = [], [], 0
+    for word, n in zip(words, count(words)):
+        if current and total + n > limit:
+            pieces.append(" ".join(current))
+            current, total = [], 0
+        current.append(word)
+        total += n
+    if current:
+        pieces.append(" ".join(current))
+    return pieces
+
+
+def _units(pages: Iterable[Tuple[Optional[int], str]], limit: int, piece_limit: int,
+           count: TokenCounter) -> Iterator[_Unit]:
+    """Sentences up to `limit` tokens; longer ones split into `piece_limit` pieces."""
+    for paragraph, new_paragraph, page in _paragraphs(pages):
+        sentences = [s for s in _SENTENCE_SPLIT.split(paragraph) if s]
+        for sentence, n in zip(sentences, count(sentences)):
+            if n <= limit:
+                yield _Unit(sentence, n, new_paragraph, page)
+            else:
+                pieces = _split_long(sentence, piece_limit, count)
+                for piece, m in zip(pieces, count(pieces)):
+                    yield _Unit(piece, m, new_paragraph, page)
+                    new_paragraph = False
+                continue
+            new_paragraph = False
+
+
+def _join(window: Iterable[_Unit]) -> str:
+    parts = []
+    for i, unit in enumerate(window):
+        if i:
+            parts.append("\n\n" if unit.new_paragraph else " ")
+        parts.append(unit.text)
+    return "".join(parts)
+
+
+def _tail(unit: _Unit, budget: int, count: TokenCounter) -> _Unit:
+    """The trailing words of `unit` that fit in `budget` tokens."""
+    words = unit.text.split()
+    kept, total = [], 0
+    for word, n in zip(reversed(words), reversed(count(words))):
+        if total + n > budget:
+            break
+        kept.append(word)
+        total += n
+    return _Unit(" ".join(reversed(kept)), total, False, unit.page)
+
+
+def _pages_of(window: Iterable[_Unit]) -> Tuple[Optional[int], Optional[int]]:
+    pages = [u.page for u in window if u.page is not None]
+    return (min(pages), max(pages)) if pages else (None, None)
+
+
+def _pack(pages: Iterable[Tuple[Optional[int], str]], chunk_tokens: Optional[int], overlap_tokens: int,
+          count_tokens: Optional[TokenCounter]) -> Iterator[Tuple[str, Optional[int], Optional[int]]]:
+    """Yield (chunk text, first page, last page); see iter_chunks() for the packing rules."""
+    if chunk_tokens is None:
+        chunk_tokens = chunk_token_limit()
+    if chunk_tokens <= 0:
+        raise ValueError("chunk_tokens must be positive")
+    if not 0 <= overlap_tokens < chunk_tokens:
+        raise ValueError("overlap_tokens must be >= 0 and smaller than chunk_tokens")
+    count = count_tokens or model_token_counter()
+
+    window: Deque[_Unit] = deque()
+    total = 0
+    fresh = False  # window holds text not yet emitted
+    # Pieces of over-long sentences leave room for the overlap in front of them
+    for unit in _units(pages, chunk_tokens, chunk_tokens - overlap_tokens, count):
+        if window and total + unit.tokens > chunk_tokens:
+            yield (_join(window), *_pages_of(window))
+            fresh = False
+            # Keep the longest run of trailing sentences within the overlap budget
+            carried: Deque[_Unit] = deque()
+            carried_tokens = 0
+            while window and carried_tokens + window[-1].tokens <= overlap_tokens:
+                last = window.pop()
+                carried.appendleft(last)
+                carried_tokens += last.tokens
+            if not carried and overlap_tokens and window:
+                # Last sentence alone exceeds the budget: carry its trailing words
+                part = _tail(window[-1], overlap_tokens, count)
+                if part.text:
+                    carried.append(part)
+                    carried_tokens = part.tokens
+            # Make room for the incoming unit, trimming rather than dropping the overlap
+            while carried and carried_tokens + unit.tokens > chunk_tokens:
+                first = carried.popleft()
+                carried_tokens -= first.tokens
+                room = chunk_tokens - unit.tokens - carried_tokens
+                if not carried and room > 0:
+                    part = _tail(first, room, count)
+                    if part.text:
+                        carried.append(part)
+                        carried_tokens = part.tokens
+            window, total = carried, carried_tokens
+        window.append(unit)
+        total += unit.tokens
+        fresh = True
+
+    if window and fresh:
+        yield (_join(window), *_pages_of(window))
+
+
+def iter_chunks(source: Union[str, Iterable[str]],
+                chunk_tokens: Optional[int] = None,
+                overlap_tokens: int = CHUNK_OVERLAP_TOKENS,
+                count_tokens: Optional[TokenCounter] = None) -> Iterator[str]:
+    """
+    Yield chunks of at most `chunk_tokens` tokens (summed per sentence, without
+    special tokens; chunk_token_limit() when None) from a string or an iterable of text pieces (lines, pages,
+    file objects). Consecutive chunks share up to `overlap_tokens` tokens.
+    """
+    pieces = [source] if isinstance(source, str) else source
+    for text, _, _ in _pack(((None, p) for p in pieces), chunk_tokens, overlap_tokens, count_tokens):
+        yield text
+
+
+def iter_page_chunks(pages: Iterable[Tuple[int, str]],
+                     chunk_tokens: Optional[int] = None,
+                     overlap_tokens: int = CHUNK_OVERLAP_TOKENS,
+                     count_tokens: Optional[TokenCounter] = None) -> Iterator[Tuple[str, int, int]]:
+    """Like iter_chunks() over (page, text) pairs; yields (chunk, first page, last page)."""
+    return _pack(pages, chunk_tokens, overlap_tokens, count_tokens)
+
+
+def chunk_text(text: str, chunk_tokens: Optional[int] = None,
+               overlap_tokens: int = CHUNK_OVERLAP_TOKENS) -> List[str]:
+    """List form of iter_chunks() for callers that need every chunk at once."""
     if not text:
         return []
-    text = text.replace("\r\n", "\n")
-    chunks = []
-    start = 0
-    length = len(text)
-    while start < length:
-        end = start + chunk_size
-        chunk = text[start:end].strip()
-        if chunk:
-            chunks.append(chunk)
-        start = max(end - overlap, end)  # ensure progress
-    return chunks
+    return list(iter_chunks(text, chunk_tokens, overlap_tokens))
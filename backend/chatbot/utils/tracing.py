@@ -0,0 +1,198 @@
+# backend/chatbot/utils/tracing.py
+#
+# Lightweight per-stage latency tracing for the RAG pipeline. Code wraps a
+# stage in `span("stage")`; every span feeds an in-process histogram for that
+# stage (exported by the metrics endpoint), and, inside `request_trace()`, is
+# also kept on the request's trace so a sampled response can carry a
+# `Server-Timing` header breaking its latency down by stage.
+#
+# The current trace lives in a ContextVar, so spans opened in helpers deep in
+# the stack (or on the RAG pool, see executor.run_blocking) attach to the
+# request without it being passed around. Histograms are per process: with
+# several workers, scrape each one (or sum them in the collector).
+
+import os
+import random
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, List, Optional, Tuple
+
+TRACE_ENABLED = os.getenv("TRACE_ENABLED", "true").lower() == "true"
+# Fraction of traced requests whose response gets a Server-Timing header
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "0.1"))
+ENVIRONMENT = os.getenv("ENVIRONMENT", "development").lower()
+# Bearer token the metrics endpoint requires (`Authorization: Bearer <token>`).
+# Unset, the endpoint is open in development and refused in production.
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+
+# Histogram bucket upper bounds in milliseconds (+Inf is implicit)
+BUCKETS_MS = (1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+
+
+class Histogram:
+    """Fixed-bucket latency histogram (milliseconds), safe to observe from any thread."""
+
+    def __init__(self, bounds: Tuple[float, ...] = BUCKETS_MS):
+        self.bounds = bounds
+        self._lock = threading.Lock()
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, ms: float) -> None:
+        with self._lock:
+            self.counts[bisect_left(self.bounds, ms)] += 1
+            self.count += 1
+            self.sum += ms
+            self.max = max(self.max, ms)
+
+    def _quantile(self, counts: List[int], count: int, maximum: float, q: float) -> float:
+        """Estimate by linear interpolation inside the bucket holding the q-th observation."""
+        rank = q * count
+        seen = 0
+        for i, n in enumerate(counts):
+            if n and seen + n >= rank:
+                lower = self.bounds[i - 1] if i > 0 else 0.0
+                upper = self.bounds[i] if i < len(self.bounds) else maximum
+                return min(lower + (upper - lower) * (rank - seen) / n, maximum)
+            seen += n
+        return maximum
+
+    def snapshot(self) -> Dict[str, object]:
+        with self._lock:
+            counts, count, total, maximum = list(self.counts), self.count, self.sum, self.max
+        return {
+            "count": count,
+            "sum_ms": total,
+            "mean_ms": total / count if count else 0.0,
+            "p50_ms": self._quantile(counts, count, maximum, 0.50),
+            "p95_ms": self._quantile(counts, count, maximum, 0.95),
+            "p99_ms": self._quantile(counts, count, maximum, 0.99),
+            "max_ms": maximum,
+            "buckets": list(zip(self.bounds, counts)),  # (upper bound ms, count); the rest is over the last
+        }
+
+
+_histograms: Dict[str, Histogram] = {}
+_histograms_lock = threading.Lock()
+
+
+def histogram(stage: str) -> Histogram:
+    h = _histograms.get(stage)
+    if h is None:
+        with _histograms_lock:
+            h = _histograms.setdefault(stage, Histogram())
+    return h
+
+
+class Trace:
+    """Spans recorded during one request, in completion order."""
+
+    def __init__(self, name: str, sampled: bool):
+        self.name = name
+        self.sampled = sampled
+        self.spans: List[Tuple[str, float]] = []
+        self._lock = threading.Lock()
+
+    def add(self, stage: str, ms: float) -> None:
+        with self._lock:
+            self.spans.append((stage, ms))
+
+    def durations(self) -> Dict[str, float]:
+        """Milliseconds per stage, repeated spans summed, in first-seen order."""
+        totals: Dict[str, float] = {}
+        with self._lock:
+            for stage, ms in self.spans:
+                totals[stage] = totals.get(stage, 0.0) + ms
+        return totals
+
+    def server_timing(self) -> str:
+        return ", ".join(f"{stage};dur={ms:.1f}" for stage, ms in self.durations().items())
+
+
+_current: ContextVar[Optional[Trace]] = ContextVar("rag_trace", default=None)
+
+
+def record(stage: str, ms: float) -> None:
+    """Add one timing to the stage's histogram and to the current request's trace."""
+    if not TRACE_ENABLED:
+        return
+    histogram(stage).observe(ms)
+    trace = _current.get()
+    if trace is not None:
+        trace.add(stage, ms)
+
+
+@contextmanager
+def span(stage: str) -> Iterator[None]:
+    """Time the enclosed block as `stage` (also when it raises)."""
+    if not TRACE_ENABLED:
+        yield
+        return
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(stage, (time.perf_counter() - t0) * 1000)
+
+
+@contextmanager
+def request_trace(name: str) -> Iterator[Trace]:
+    """
+    Collect the spans of one request; the whole block is recorded as stage
+    `name`. Only a TRACE_SAMPLE_RATE fraction of traces are `sampled` for the
+    Server-Timing header; all of them feed the histograms.
+    """
+    trace = Trace(name, sampled=TRACE_ENABLED and random.random() < TRACE_SAMPLE_RATE)
+    token = _current.set(trace)
+    try:
+        with span(name):
+            yield trace
+    finally:
+        _current.reset(token)
+
+
+def add_server_timing(response, trace: Trace):
+    """Attach the trace's Server-Timing header to a sampled response."""
+    if trace.sampled:
+        response["Server-Timing"] = trace.server_timing()
+    return response
+
+
+# -----------------------------------------------------------------------------
+# Export
+# -----------------------------------------------------------------------------
+def stages() -> Dict[str, Dict[str, object]]:
+    """Histogram snapshot per stage, by stage name."""
+    with _histograms_lock:
+        items = sorted(_histograms.items())
+    return {stage: h.snapshot() for stage, h in items}
+
+
+def reset() -> None:
+    with _histograms_lock:
+        _histograms.clear()
+
+
+def prometheus_text(extra: Optional[Dict[str, float]] = None) -> str:
+    """Stage histograms (in seconds) plus `extra` gauges, in the Prometheus text format."""
+    lines = [
+        "# HELP rag_stage_duration_seconds Time spent per RAG pipeline stage.",
+        "# TYPE rag_stage_duration_seconds histogram",
+    ]
+    for stage, snap in stages().items():
+        cumulative = 0
+        for bound, n in snap["buckets"]:
+            cumulative += n
+            lines.append(f'rag_stage_duration_seconds_bucket{{stage="{stage}",le="{bound / 1000:g}"}} {cumulative}')
+        lines.append(f'rag_stage_duration_seconds_bucket{{stage="{stage}",le="+Inf"}} {snap["count"]}')
+        lines.append(f'rag_stage_duration_seconds_sum{{stage="{stage}"}} {snap["sum_ms"] / 1000:.6f}')
+        lines.append(f'rag_stage_duration_seconds_count{{stage="{stage}"}} {snap["count"]}')
+    for name, value in (extra or {}).items():
+        lines.append(f"# TYPE {name} gauge")
+        lines.append(f"{name} {value:g}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,239 @@
+# backend/chatbot/utils/vector_file.py
+#
+# Raw float32 vector matrix + small JSON header.
+#
+# Layout:
+#   <name>.<epoch>.f32  row-major float32 matrix, no framing (count * dim * 4 bytes)
+#   <name>.json         {"version": 1, "dtype": "float32", "dim": d, "count": n,
+#                        "epoch": e, "data": "<name>.<e>.f32",
+#                        "metric": "ip" | "l2",
+#                        "deleted": tombstoned rows (optional)}
+#
+# The header is the generation manifest: readers read it once and map the
+# file it names, so they always see a matrix that matches it. A full rewrite
+# writes a new epoch's file and publishes it by replacing the header; the old
+# file is unlinked, which leaves existing mappings of it intact. Headers
+# written before epochs existed have neither field and name <name>.f32.
+# "ip" rows are L2-normalized and searched by inner product; headers without
+# a metric hold raw embeddings searched by L2 distance.
+#
+# The matrix is opened with np.memmap, so every worker on a host maps the same
+# page-cache copy instead of deserializing a private one, and opening is O(1).
+# The header's count is the visibility bound: rows past it are ignored, which
+# lets appends write the bytes first and publish them with one header replace.
+#
+# Rewrites are two-phase: prepare() writes the data file and a pending header
+# (<name>.json.next), the caller commits its own metadata, then publish()
+# swaps the pending header in. A crash in between leaves the pending header
+# for the next writer to roll forward or back (see embedding_store._recover).
+
+import os
+import json
+import itertools
+from typing import Dict, Any, Optional
+
+import numpy as np
+
+FORMAT_VERSION = 1
+DTYPE = "float32"
+
+_tmp_ids = itertools.count(1)
+
+
+def _write_json_atomic(path: str, payload: Dict[str, Any]) -> None:
+    tmp_path = f"{path}.tmp.{os.getpid()}"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(payload, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def read_header(header_path: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(header_path, "r", encoding="utf-8") as f:
+            header = json.load(f)
+    except FileNotFoundError:
+        return None
+    if header.get("version") != FORMAT_VERSION or header.get("dtype") != DTYPE:
+        raise ValueError(f"Unsupported vector file header: {header}")
+    return header
+
+
+def pending_path(header_path: str) -> str:
+    return f"{header_path}.next"
+
+
+def read_pending(header_path: str) -> Optional[Dict[str, Any]]:
+    """Header of a rewrite that was prepared but not published, if any."""
+    return read_header(pending_path(header_path))
+
+
+def epoch_of(header: Optional[Dict[str, Any]]) -> int:
+    return int(header.get("epoch", 0)) if header else 0
+
+
+def metric_of(header: Optional[Dict[str, Any]]) -> str:
+    return header.get("metric", "l2") if header else "l2"
+
+
+def data_path_for(data_path: str, header: Optional[Dict[str, Any]]) -> str:
+    """The matrix file a header describes (`data_path` itself for pre-epoch headers)."""
+    if header and header.get("data"):
+        return os.path.join(os.path.dirname(data_path), header["data"])
+    return data_path
+
+
+def epoch_data_path(data_path: str, epoch: int) -> str:
+    stem, ext = os.path.splitext(data_path)
+    return f"{stem}.{epoch}{ext}"
+
+
+class MatrixWriter:
+    """
+    Streams rows into a temp file and publishes them as a new epoch's matrix
+    on commit() (or prepare() + publish()). Files are never truncated in
+    place, so processes still mapping an older epoch keep a valid view of it.
+    """
+
+    def __init__(self, data_path: str, header_path: str):
+        self.data_path = data_path
+        self.header_path = header_path
+        self.tmp_path = f"{data_path}.tmp.{os.getpid()}.{next(_tmp_ids)}"
+        self.dim: Optional[int] = None
+        self.count = 0
+        self._f = open(self.tmp_path, "wb")
+
+    def write(self, vectors: np.ndarray) -> None:
+        vectors = np.ascontiguousarray(vectors, dtype=DTYPE)
+        if self.dim is None:
+            self.dim = int(vectors.shape[1])
+        elif vectors.shape[1] != self.dim:
+            raise ValueError(f"Dimension mismatch: got {vectors.shape[1]}, expected {self.dim}")
+        self._f.write(vectors.tobytes())
+        self.count += int(vectors.shape[0])
+
+    def prepare(self, epoch: int, **fields: Any) -> None:
+        """Make the rows durable as `epoch`'s data file and stage its header."""
+        self._f.flush()
+        os.fsync(self._f.fileno())
+        self._f.close()
+        final_path = epoch_data_path(self.data_path, epoch)
+        os.replace(self.tmp_path, final_path)
+        _write_json_atomic(pending_path(self.header_path), {
+            "version": FORMAT_VERSION,
+            "dtype": DTYPE,
+            "dim": self.dim or 0,
+            "count": self.count,
+            "epoch": epoch,
+            "data": os.path.basename(final_path),
+            **fields,
+        })
+
+    def publish(self) -> None:
+        publish_pending(self.data_path, self.header_path)
+
+    def commit(self, epoch: int, **fields: Any) -> None:
+        self.prepare(epoch, **fields)
+        self.publish()
+
+    def abort(self) -> None:
+        self._f.close()
+        if os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
+
+
+def publish_pending(data_path: str, header_path: str) -> None:
+    """Swap the pending header in, then unlink the matrix it superseded."""
+    old = data_path_for(data_path, read_header(header_path))
+    os.replace(pending_path(header_path), header_path)
+    new = data_path_for(data_path, read_header(header_path))
+    if old != new and os.path.exists(old):
+        os.remove(old)
+
+
+def discard_pending(data_path: str, header_path: str) -> None:
+    """Roll back a prepared rewrite: drop its pending header and data file."""
+    pending = read_pending(header_path)
+    if pending is None:
+        return
+    new = data_path_for(data_path, pending)
+    current = data_path_for(data_path, read_header(header_path))
+    if new != current and os.path.exists(new):
+        os.remove(new)
+    os.remove(pending_path(header_path))
+
+
+def remove_matrix(data_path: str, header_path: str) -> None:
+    """Delete the header (first, so readers stop seeing the matrix) and its data file."""
+    discard_pending(data_path, header_path)
+    current = data_path_for(data_path, read_header(header_path))
+    for path in (header_path, current, data_path):
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def write_matrix(data_path: str, header_path: str, vectors: np.ndarray, epoch: int = 0, **fields: Any) -> None:
+    """Write a full matrix in one go."""
+    writer = MatrixWriter(data_path, header_path)
+    try:
+        writer.write(vectors)
+    except Exception:
+        writer.abort()
+        raise
+    writer.commit(epoch, **fields)
+
+
+def append_rows(data_path: str, header_path: str, vectors: np.ndarray) -> int:
+    """Append rows in O(new rows); returns the new total count."""
+    header = read_header(header_path)
+    if header is None:
+        write_matrix(data_path, header_path, vectors)
+        return int(vectors.shape[0])
+
+    vectors = np.ascontiguousarray(vectors, dtype=DTYPE)
+    if vectors.shape[1] != header["dim"]:
+        raise ValueError(f"Dimension mismatch: got {vectors.shape[1]}, store has {header['dim']}")
+
+    row_bytes = header["dim"] * np.dtype(DTYPE).itemsize
+    # Readers only map rows below their header's count, so the bytes past it
+    # may be rewritten while they hold a mapping
+    with open(data_path_for(data_path, header), "r+b") as f:
+        # Drop any torn tail left by an interrupted append before writing
+        f.truncate(header["count"] * row_bytes)
+        f.seek(0, os.SEEK_END)
+        f.write(vectors.tobytes())
+        f.flush()
+        os.fsync(f.fileno())
+
+    header["count"] += int(vectors.shape[0])
+    _write_json_atomic(header_path, header)
+    return header["count"]
+
+
+def update_header(header_path: str, **fields: Any) -> Dict[str, Any]:
+    """Rewrite header fields atomically (e.g. the tombstone count) without touching the data."""
+    header = read_header(header_path)
+    if header is None:
+        raise FileNotFoundError(header_path)
+    header.update(fields)
+    _write_json_atomic(header_path, header)
+    return header
+
+
+def open_matrix(data_path: str, header_path: str,
+                header: Optional[Dict[str, Any]] = None) -> Optional[np.ndarray]:
+    """
+    Map the matrix read-only. Returns None when the store is missing or empty.
+    Pass a `header` already read to map exactly the epoch it describes.
+    """
+    if header is None:
+        header = read_header(header_path)
+    if header is None or header["count"] == 0:
+        return None
+    return np.memmap(
+        data_path_for(data_path, header),
+        dtype=DTYPE,
+        mode="r",
+        shape=(header["count"], header["dim"]),
+    )
@@ -0,0 +1,131 @@
+# backend/chatbot/utils/warmup.py
+#
+# Startup warm-up: load the embedding model, the vector store snapshot and
+# (optionally) the local generator before the first request needs them.
+#
+# WARMUP_MODE
+#   background  load in a daemon thread (default)
+#   sync        load inline; with gunicorn --preload this runs once in the
+#               master, and forked workers share the pages copy-on-write
+#   off         keep everything lazy
+#
+# Only serving processes warm up: AppConfig.ready() starts it for runserver
+# and standalone ASGI servers, not for migrate and other manage.py commands.
+# gunicorn.conf.py defaults WARMUP_MODE=sync with preload_app, runs it inline
+# from when_ready in the master (whatever the mode, since a background thread
+# would not survive the fork) and calls after_fork() in each worker to drop
+# state that must not cross a fork.
+
+import os
+import time
+import logging
+import threading
+from typing import Dict, Any
+
+logger = logging.getLogger(__name__)
+
+WARMUP_MODE = os.getenv("WARMUP_MODE", "background").lower()
+WARMUP_LOCAL_GENERATOR = os.getenv("WARMUP_LOCAL_GENERATOR", "false").lower() == "true"
+
+_lock = threading.Lock()
+_state: Dict[str, Any] = {
+    "status": "pending",  # pending -> running -> ready | failed; "skipped" when off
+    "steps": {},
+    "error": None,
+    "started_at": None,
+    "finished_at": None,
+    "pid": os.getpid(),
+}
+
+
+def _step(name: str, fn) -> None:
+    t0 = time.perf_counter()
+    fn()
+    _state["steps"][name] = round(time.perf_counter() - t0, 3)
+    logger.info(f"✓ Warm-up: {name} in {_state['steps'][name]:.2f}s")
+
+
+def _load_model() -> None:
+    from .embedding_store import get_model
+    model = get_model()
+    if model is not None:
+        # First encode initialises tokenizer / kernels; do it here, not on a request
+        model.encode(["warm up"], show_progress_bar=False, convert_to_numpy=True)
+
+
+def _load_index() -> None:
+    from .embedding_store import get_store
+    get_store().snapshot()
+
+
+def _load_prompt_tokenizer() -> None:
+    from .prompt_context import token_counter
+    token_counter()
+
+
+def _load_generator() -> None:
+    from .model_inference import _get_local_pipeline
+    _get_local_pipeline()
+
+
+def run() -> Dict[str, Any]:
+    """Run the warm-up once per process; later calls return the recorded status."""
+    with _lock:
+        if _state["status"] != "pending":
+            return status()
+        _state["status"] = "running"
+        _state["started_at"] = time.time()
+
+    try:
+        _step("embedding_model", _load_model)
+        _step("vector_index", _load_index)
+        _step("prompt_tokenizer", _load_prompt_tokenizer)
+        if WARMUP_LOCAL_GENERATOR:
+            _step("local_generator", _load_generator)
+        _state["status"] = "ready"
+    except Exception as e:
+        logger.error(f"✗ Warm-up failed: {e}")
+        _state["status"] = "failed"
+        _state["error"] = str(e)
+    _state["finished_at"] = time.time()
+    return status()
+
+
+def start() -> None:
+    """Entry point for server startup, honouring WARMUP_MODE."""
+    if WARMUP_MODE == "off":
+        _state["status"] = "skipped"
+        return
+    if WARMUP_MODE == "sync":
+        run()
+        return
+    threading.Thread(target=run, name="warmup", daemon=True).start()
+
+
+def after_fork() -> None:
+    """
+    Per-worker fix-ups after gunicorn forks the preloaded master. Models and
+    the index stay shared; SQLite connections and write-lock state opened in
+    the master do not.
+    """
+    from .embedding_store import loaded_stores, get_embedding_cache
+    from .file_lock import forget_all
+
+    for store in loaded_stores():
+        store.chunks.forget_connections()
+    forget_all()
+    cache = get_embedding_cache()
+    if cache is not None:
+        cache.forget_connections()
+    _state["pid"] = os.getpid()
+
+
+def status() -> Dict[str, Any]:
+    snapshot = dict(_state)
+    snapshot["steps"] = dict(_state["steps"])
+    return snapshot
+
+
+def is_ready() -> bool:
+    """True once warm-up finished, or when WARMUP_MODE=off keeps loading lazy."""
+    return _state["status"] in ("ready", "skipped")
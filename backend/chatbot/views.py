@@ -1,64 +1,189 @@
-import os
+import hmac
+import json
+from asgiref.sync import sync_to_async
+from django.db import transaction
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_POST
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import generics, permissions, status
+from rest_framework.exceptions import AuthenticationFailed
 from rest_framework.permissions import AllowAny
-from docx import Document as DocxDocument
+from users.authentication import CookieJWTAuthentication
 
 from .models import UploadedDocument
-from .serializers import DocumentSerializer
-from .utils.text_extractor import extract_text_from_pdf
-from .utils.text_chunker import chunk_text
-from .utils.embedding_store import add_documents, query
-from .utils.model_inference import generate_answer
-from .utils.embedder import get_model
+from .serializers import DocumentSerializer, DocumentStatusSerializer
+from .tasks import enqueue
+from .utils.embedding_store import query, encode_query, index_generation, get_model
+from .utils.model_inference import generate_answer, agenerate_answer, stream_answer, FALLBACK_REPLIES
+from .utils.executor import run_blocking
+from .utils.answer_cache import get_answer_cache
+from .utils.prompt_context import build_prompt
+from .utils.tracing import span
+from .utils import prompt_context, tracing, warmup
 
 
 class DocumentUploadView(generics.CreateAPIView):
     """
-    Handles file uploads and automatically extracts + indexes their text.
+    Handles file uploads and queues their text for background indexing.
+    Returns 202 straight away; poll the status endpoint for progress.
     """
     queryset = UploadedDocument.objects.all()
     serializer_class = DocumentSerializer
     permission_classes = [permissions.AllowAny]
 
     def perform_create(self, serializer):
-        instance = serializer.save()
-        file_path = instance.file.path
-        ext = os.path.splitext(file_path)[1].lower()
-        extracted_text = ""
+        # Documents from a signed-in user are indexed into that user's own shard
+        owner = self.request.user if self.request.user.is_authenticated else None
+        with span("upload.save"):
+            instance = serializer.save(status=UploadedDocument.STATUS_PENDING, user=owner)
 
-        try:
-            # --- Extract text based on file type ---
-            if ext == ".pdf":
-                extracted_text = extract_text_from_pdf(file_path)
-            elif ext in [".txt", ".md"]:
-                with open(file_path, "r", encoding="utf-8", errors="ignore") as f:
-                    extracted_text = f.read()
-            elif ext == ".docx":
-                doc = DocxDocument(file_path)
-                extracted_text = "\n".join([p.text for p in doc.paragraphs])
-            else:
-                extracted_text = f"Unsupported file type: {ext}"
+        def queue():
+            with span("upload.enqueue"):
+                enqueue(instance)
 
-            # --- Save text in database ---
-            instance.content = extracted_text
-            instance.save()
+        # Wake the worker only once the row is visible to other connections
+        transaction.on_commit(queue)
 
-            # --- Create text chunks and metadata ---
-            chunks = chunk_text(extracted_text, chunk_size=800, overlap=200)
-            metadatas = [
-                {"doc_id": instance.id, "filename": os.path.basename(file_path), "chunk_index": i}
-                for i, _ in enumerate(chunks)
-            ]
+    def create(self, request, *args, **kwargs):
+        with tracing.request_trace("upload") as trace:
+            response = super().create(request, *args, **kwargs)
+        response.status_code = status.HTTP_202_ACCEPTED
+        return tracing.add_server_timing(response, trace)
 
-            # --- Add chunks to FAISS index ---
-            add_documents(chunks, metadatas)
 
-        except Exception as e:
-            print(f"[ERROR] Error processing uploaded document: {e}")
-            instance.content = f"Error: {e}"
-            instance.save()
+class DocumentStatusView(generics.RetrieveAPIView):
+    """
+    Reports where an uploaded document is in the ingestion pipeline. Signed-in
+    users see their own documents, anonymous callers only anonymous uploads;
+    anything else is a 404.
+    """
+    serializer_class = DocumentStatusSerializer
+    permission_classes = [permissions.AllowAny]
+
+    def get_queryset(self):
+        owner_id = _owner_id(self.request)
+        if owner_id is None:
+            return UploadedDocument.objects.filter(user__isnull=True)
+        return UploadedDocument.objects.filter(user_id=owner_id)
+
+
+NO_RESULTS_REPLY = "I couldn’t find relevant company information to answer that yet."
+
+
+def _source_label(meta):
+    """Filename plus the pages the chunk came from, e.g. "pricing.pdf (pp. 3-4)"."""
+    label = meta.get("filename", "unknown")
+    first, last = meta.get("page"), meta.get("page_end")
+    if first is None:
+        return label
+    if last is None or last == first:
+        return f"{label} (p. {first})"
+    return f"{label} (pp. {first}-{last})"
+
+
+def _owner_id(request):
+    """Whose private shard the caller may search (None: public shard only)."""
+    user = getattr(request, "user", None)
+    return user.id if user is not None and user.is_authenticated else None
+
+
+def _jwt_owner_id(request):
+    """
+    _owner_id for plain Django views, which DRF's JWT authentication doesn't
+    cover. Raises AuthenticationFailed (InvalidToken is one) for credentials
+    DRF would reject.
+    """
+    auth = CookieJWTAuthentication().authenticate(request)
+    return auth[0].id if auth else None
+
+
+def _auth_failed(request, exc):
+    """The 401 DRF returns for AuthenticationFailed, for plain Django views."""
+    data = exc.detail if isinstance(exc.detail, dict) else {"detail": exc.detail}
+    response = JsonResponse(data, status=exc.status_code)
+    response["WWW-Authenticate"] = CookieJWTAuthentication().authenticate_header(request)
+    return response
+
+
+def _prepare_chat(user_message, owner_id=None):
+    """
+    Shared retrieval steps of the chat endpoints. Returns a dict with either a
+    ready "reply" (answer cache hit / nothing found) or a "prompt" to generate
+    from, plus "sources" and what's needed to cache the generated reply.
+    Retrieval covers the public shard plus `owner_id`'s documents.
+    """
+    # --- Step 0: Serve near-duplicate questions from the answer cache ---
+    scope = "public" if owner_id is None else f"tenant:{owner_id}"
+    answer_cache = get_answer_cache(scope)
+    q_emb = encode_query(user_message) if answer_cache is not None else None
+    generation = index_generation(owner_id)
+    if q_emb is not None:
+        with span("answer_cache.lookup"):
+            cached = answer_cache.lookup(q_emb, generation)
+        if cached:
+            return {"reply": cached["reply"], "sources": cached["sources"]}
+
+    # --- Step 1: Retrieve relevant document chunks ---
+    with span("retrieve"):
+        results = query(user_message, q_emb=q_emb, owner_id=owner_id)
+    if not results:
+        return {"reply": NO_RESULTS_REPLY, "sources": []}
+
+    # --- Step 2: Merge, dedupe and pack the chunks into a token-budgeted context ---
+    # --- Step 3: Create the model prompt ---
+    with span("prompt.build"):
+        assembled = build_prompt(user_message, results)
+    sources = list(dict.fromkeys(_source_label(p.meta) for p in assembled.passages))
+    return {
+        "prompt": assembled.prompt, "prompt_tokens": assembled.prompt_tokens, "sources": sources,
+        "q_emb": q_emb, "generation": generation, "scope": scope,
+    }
+
+
+def _cache_reply(chat, reply):
+    if chat.get("q_emb") is not None and reply and reply not in FALLBACK_REPLIES:
+        get_answer_cache(chat["scope"]).store(chat["q_emb"], chat["generation"], reply, chat["sources"])
+
+
+class ReadinessView(APIView):
+    """
+    200 once the startup warm-up has loaded the embedding model and index (or
+    WARMUP_MODE=off), 503 before it starts, while it runs, or if it failed.
+    """
+    permission_classes = [AllowAny]
+
+    def get(self, request):
+        ready = warmup.is_ready()
+        return Response(warmup.status(), status=200 if ready else 503)
+
+
+@require_GET
+def metrics(request):
+    """
+    Per-stage latency histograms of this process plus prompt-token totals:
+    Prometheus text by default, JSON with ?format=json. When METRICS_TOKEN is
+    set the caller must send `Authorization: Bearer <token>`; without one the
+    endpoint is refused in production.
+    """
+    if tracing.METRICS_TOKEN:
+        sent = request.headers.get("Authorization", "").removeprefix("Bearer ").strip()
+        if not hmac.compare_digest(sent.encode(), tracing.METRICS_TOKEN.encode()):
+            return JsonResponse({"error": "Unauthorized"}, status=401)
+    elif tracing.ENVIRONMENT == "production":
+        return JsonResponse({"error": "Metrics are disabled; set METRICS_TOKEN to enable them"}, status=403)
+
+    prompts = prompt_context.stats()
+    if request.GET.get("format") == "json":
+        return JsonResponse({"stages": tracing.stages(), "prompt": prompts})
+    extra = {
+        "rag_prompt_requests": prompts["requests"],
+        "rag_prompt_tokens_sum": prompts["prompt_tokens_total"],
+        "rag_prompt_tokens_p95": prompts["prompt_tokens_p95"],
+        "rag_prompt_context_budget_tokens": prompts["context_budget"],
+    }
+    return HttpResponse(tracing.prometheus_text(extra), content_type="text/plain; version=0.0.4")
 
 
 class ChatView(APIView):
@@ -68,33 +193,24 @@ class ChatView(APIView):
     permission_classes = [AllowAny]
 
     def post(self, request):
+        with tracing.request_trace("chat") as trace:
+            response = self._answer(request)
+        return tracing.add_server_timing(response, trace)
+
+    def _answer(self, request):
         user_message = request.data.get("message", "").strip()
         if not user_message:
             return Response({"error": "No message provided"}, status=400)
 
-        # --- Step 1: Retrieve relevant document chunks ---
-        results = query(user_message)
-        if not results:
-            return Response({
-                "reply": "I couldn’t find relevant company information to answer that yet.",
-                "sources": []
-            }, status=200)
-
-        # --- Step 2: Build context from retrieved chunks ---
-        context = "\n".join([r["text"] for r in results])
-        sources = list({r["meta"].get("filename", "unknown") for r in results})
-
-        # --- Step 3: Create the model prompt ---
-        prompt = (
-            "You are an assistant that answers questions about Sameer Shah’s company. "
-            "Use the provided context to answer briefly, accurately, and professionally.\n\n"
-            f"Context:\n{context}\n\n"
-            f"Question: {user_message}\nAnswer:"
-        )
+        chat = _prepare_chat(user_message, _owner_id(request))
+        sources = chat["sources"]
+        if "reply" in chat:
+            return Response({"reply": chat["reply"], "sources": sources}, status=200)
 
         # --- Step 4: Generate the answer via Hugging Face ---
         try:
-            reply = generate_answer(prompt)
+            with span("generate"):
+                reply = generate_answer(chat["prompt"])
         except Exception as e:
             print(f"[ERROR] Failed to generate answer: {e}")
             return Response({
@@ -103,12 +219,121 @@ class ChatView(APIView):
             }, status=500)
 
         # --- Step 5: Return clean JSON response ---
+        reply = reply.strip()
+        _cache_reply(chat, reply)
         return Response({
-            "reply": reply.strip(),
+            "reply": reply,
             "sources": sources
         }, status=200)
 
 
+@csrf_exempt
+@require_POST
+async def chat_async(request):
+    """
+    Async twin of ChatView for the ASGI stack. Embedding and search run on
+    the bounded RAG pool and the inference call is awaited, so a slow model
+    holds no worker thread while it waits. Same request/response shape.
+
+    csrf_exempt like ChatView (DRF exempts APIViews and its JWT classes don't
+    check CSRF): a forged cross-site POST only gets a reply computed, it
+    changes no state, and the browser won't let the forging page read it.
+    """
+    with tracing.request_trace("chat_async") as trace:
+        response = await _answer_async(request)
+    return tracing.add_server_timing(response, trace)
+
+
+async def _answer_async(request):
+    try:
+        body = json.loads(request.body or b"{}")
+    except ValueError:
+        return JsonResponse({"error": "Invalid JSON body"}, status=400)
+    user_message = str(body.get("message", "")).strip()
+    if not user_message:
+        return JsonResponse({"error": "No message provided"}, status=400)
+
+    try:
+        owner_id = await run_blocking(_jwt_owner_id, request)
+    except AuthenticationFailed as e:
+        return _auth_failed(request, e)
+    chat = await run_blocking(_prepare_chat, user_message, owner_id)
+    sources = chat["sources"]
+    if "reply" in chat:
+        return JsonResponse({"reply": chat["reply"], "sources": sources}, status=200)
+
+    try:
+        with span("generate"):
+            reply = await agenerate_answer(chat["prompt"])
+    except Exception as e:
+        print(f"[ERROR] Failed to generate answer: {e}")
+        return JsonResponse({
+            "reply": "Sorry, there was an error generating an answer.",
+            "sources": sources
+        }, status=500)
+
+    reply = reply.strip()
+    _cache_reply(chat, reply)
+    return JsonResponse({"reply": reply, "sources": sources}, status=200)
+
+
+def _sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+async def _aiter_in_thread(iterator):
+    """Drive a blocking iterator from a worker thread so the event loop stays free."""
+    sentinel = object()
+    next_item = sync_to_async(lambda: next(iterator, sentinel), thread_sensitive=False)
+    while True:
+        item = await next_item()
+        if item is sentinel:
+            return
+        yield item
+
+
+class ChatStreamView(APIView):
+    """
+    Streaming chat endpoint (server-sent events). Emits a `sources` event
+    first, then one `token` event per generated piece, then `done`.
+    Serve through the ASGI app (backend/asgi.py) so events are flushed as they
+    are produced; ChatView keeps the plain JSON response.
+    """
+    permission_classes = [AllowAny]
+
+    def post(self, request):
+        user_message = request.data.get("message", "").strip()
+        if not user_message:
+            return Response({"error": "No message provided"}, status=400)
+
+        owner_id = _owner_id(request)
+
+        def events():
+            chat = _prepare_chat(user_message, owner_id)
+            yield _sse("sources", {"sources": chat["sources"]})
+
+            if "reply" in chat:
+                yield _sse("token", {"text": chat["reply"]})
+            else:
+                pieces = []
+                try:
+                    for piece in stream_answer(chat["prompt"]):
+                        pieces.append(piece)
+                        yield _sse("token", {"text": piece})
+                except Exception as e:
+                    print(f"[ERROR] Failed to stream answer: {e}")
+                    yield _sse("error", {"reply": "Sorry, there was an error generating an answer."})
+                    return
+                _cache_reply(chat, "".join(pieces).strip())
+
+            yield _sse("done", {})
+
+        response = StreamingHttpResponse(_aiter_in_thread(events()), content_type="text/event-stream")
+        response["Cache-Control"] = "no-cache"
+        response["X-Accel-Buffering"] = "no"
+        return response
+
+
 
 def embed_text(text):
     model = get_model()
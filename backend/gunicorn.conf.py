@@ -0,0 +1,48 @@
+# gunicorn.conf.py
+#
+# Load the Django app (and, in when_ready, the embedding model and vector
+# index) once in the master, then fork workers that share those pages
+# copy-on-write instead of each loading its own copy on the first request.
+#
+# Workers run the ASGI app (backend.asgi:application) under uvicorn, so
+# ChatStreamView's events are flushed as produced and chat_async awaits the HF
+# API instead of parking a thread on it; sync views run in per-request threads.
+
+import gc
+import os
+
+os.environ.setdefault("WARMUP_MODE", "sync")
+
+preload_app = True
+worker_class = "uvicorn_worker.UvicornWorker"
+workers = int(os.getenv("WEB_CONCURRENCY", "2"))
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))
+
+
+def when_ready(server):
+    # Warm up once in the master (ChatbotConfig.ready only does it for servers
+    # it recognises), before the workers are forked. Inline even when
+    # WARMUP_MODE=background: a warm-up thread would not be forked, leaving
+    # every worker's status at "running"
+    from django.apps import apps
+    if apps.is_installed("chatbot"):
+        from chatbot.utils import warmup
+        if warmup.WARMUP_MODE == "off":
+            warmup.start()  # records "skipped"
+        else:
+            warmup.run()
+
+    # Move everything loaded so far out of the GC's reach so collections in the
+    # workers don't write to (and un-share) the inherited pages
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    from chatbot.utils import warmup
+    warmup.after_fork()
+
+    # Threads don't survive the fork, so each worker starts its own ingest thread
+    from django.apps import apps
+    if apps.is_installed("chatbot"):
+        from chatbot.tasks import start_worker
+        start_worker()